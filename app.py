@@ -1,14 +1,30 @@
+import time
+ARRANQUE = time.monotonic()  # Referencia para medir el arranque en frío
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from typing import Optional
+import asyncio
 import threading
 import os
 import datetime
 import traceback
 
-from generate import generar
-from auto_train import should_train, auto_train
+from response_cache import cache as cache_respuestas
+from auto_train import should_train, pendientes, TRAIN_LOG
+from training_worker import worker as entrenador
+from chat_log_writer import ChatLogWriter
+from conversation_store import store, PENDIENTE, DATASET
+from tokenizer import VOCAB_PATH
+from checkpoint_store import checkpoints
+from status_service import servicio as servicio_estado
+from status_events import difusor, evento_sse
+from log_files import leer_cola, leer_desde, iterar, archivos_rotados
+from metrics import (metricas, PETICIONES, LATENCIA_CHAT, ETAPAS, ENTRENAMIENTOS, DURACION_ENTRENAMIENTO,
+                     LOSS, TOKENS_S, EPOCAS)
 
 app = FastAPI()
 
@@ -22,25 +38,94 @@ app.add_middleware(
 class ChatReq(BaseModel):
     message: str
 
+# Pares para un corpus vacío (antes el data.txt básico)
+PARES_BASICOS = [("hola", "como estas"), ("bien", "que haces"), ("nada", "adios")]
+
 # Variable global para controlar entrenamiento
 entrenamiento_activo = False
 
+# Espera máxima de /chat por su respuesta antes de devolver 503
+CHAT_TIMEOUT_S = float(os.environ.get("CHAT_TIMEOUT_S", "30"))
+
+# /logs y /ver_archivo devuelven trozos: por defecto las últimas LINEAS_LOG líneas
+LINEAS_LOG = 200
+MAX_LINEAS_LOG = 5000
+# Archivos de texto antiguos que ahora son vistas del almacén
+ARCHIVOS_ALMACEN = {"chat_logs.txt": PENDIENTE, "data.txt": DATASET}
+
+# Motor de inferencia: torch y el modelo se cargan en un hilo al arrancar, así el
+# servidor y /health responden enseguida; /ready indica cuándo se puede chatear
+inferencia = None
+registro = None
+cache_estados = None
+ColaLlena = None
+motor_cargado = threading.Event()
+arranque = {"fase": "iniciando", "error": None, "tiempos": {}}
+
+# Única vía para registrar conversaciones: escritura por lotes en segundo plano
+escritor = ChatLogWriter(store, al_escribir=lambda pares: al_guardar_conversaciones(pares))
+
+# Valores que /metrics lee en el momento
+metricas.medidor("inferencia_en_cola", "Peticiones esperando en la cola de inferencia",
+                 funcion=lambda: inferencia.cola.qsize() if motor_cargado.is_set() else 0)
+metricas.medidor("motor_listo", "1 si hay un modelo cargado para responder",
+                 funcion=lambda: estado_motor() == "listo")
+metricas.medidor("eventos_clientes", "Conexiones abiertas a /eventos",
+                 funcion=lambda: len(difusor.suscritos))
+
 @app.get("/")
 def home():
     return FileResponse("static/index.html")
 
-@app.post("/chat")
-def chat(req: ChatReq):
-    global entrenamiento_activo
-    
-    user_msg = req.message.strip()
-    
-    if not user_msg:
-        return {"respuesta": "Por favor, escribe un mensaje"}
-    
-    # Generar respuesta
-    respuesta = generar(user_msg.lower())
-    
+def respuesta_saturado(mensaje):
+    """503 rápido con Retry-After cuando la inferencia no da abasto"""
+    reintento = inferencia.sugerir_reintento()
+    return JSONResponse(
+        {"error": mensaje, "status": "saturado", "en_cola": inferencia.cola.qsize()},
+        status_code=503,
+        headers={"Retry-After": str(reintento)},
+    )
+
+def estado_motor():
+    """iniciando/importando/cargando → listo, sin_modelo o error"""
+    if arranque["error"]:
+        return "error"
+    if not motor_cargado.is_set():
+        return arranque["fase"]
+    return "listo" if registro.actual() is not None else "sin_modelo"
+
+def respuesta_calentando():
+    """503 con un mensaje claro mientras no hay modelo con el que responder"""
+    estado = estado_motor()
+    if estado == "sin_modelo":
+        mensaje = "Todavía no tengo un modelo entrenado. Usa /forzar_entrenamiento para entrenarme"
+    elif estado == "error":
+        mensaje = "No pude arrancar mi red neuronal, revisa los logs del servidor"
+    else:
+        mensaje = "Me estoy despertando, dame unos segundos y vuelve a escribirme"
+    return JSONResponse(
+        {"respuesta": mensaje, "status": "calentando", "estado": estado},
+        status_code=503,
+        headers={"Retry-After": "2"},
+    )
+
+def encolar(endpoint, seed, **opciones):
+    """(Future, None) con la respuesta en camino, o (None, respuesta HTTP) si no se puede generar"""
+    if estado_motor() != "listo":
+        PETICIONES.inc(endpoint=endpoint, resultado="calentando")
+        return None, respuesta_calentando()
+    try:
+        return inferencia.enviar(seed, **opciones), None
+    except ColaLlena as e:
+        PETICIONES.inc(endpoint=endpoint, resultado="saturado")
+        return None, respuesta_saturado(str(e))
+
+def registrar_conversacion(user_msg, respuesta):
+    """
+    Revisar la respuesta, guardarla si es corta y comprobar el autoentrenamiento
+    - Bloquea (vaciar el escritor en SQLite, lanzar el proceso de entrenamiento,
+      rotar train.log): los handlers async la llaman con run_in_executor
+    """
     # Verificar que la respuesta no esté vacía
     if not respuesta or not respuesta.strip():
         respuesta = "No tengo una respuesta para eso ahora mismo"
@@ -55,11 +140,10 @@ def chat(req: ChatReq):
     puede_guardar = (1 <= palabras_usuario <= 6) and (1 <= palabras_respuesta <= 6) and respuesta.strip()
     
     if puede_guardar:
-        # SOLO guardar en chat_logs.txt
+        # SOLO guardar como pendiente (el escritor lo vuelca en segundo plano)
         try:
-            with open("chat_logs.txt", "a", encoding="utf-8") as f:
-                f.write(f"usuario: {user_msg}\n")
-                f.write(f"ia: {respuesta}\n")
+            with ETAPAS.medir(etapa="registrar"):
+                escritor.registrar(user_msg, respuesta)
             print(f"Guardado en chat_logs: '{user_msg}' -> '{respuesta}'")
         except Exception as e:
             print(f"Error guardando en chat_logs: {e}")
@@ -68,110 +152,256 @@ def chat(req: ChatReq):
         print(f"   (Solo guardo conversaciones de 1-6 palabras)")
     
     # Verificar y ejecutar autoentrenamiento
+    with ETAPAS.medir(etapa="revisar_entrenamiento"):
+        revisar_entrenamiento()
+    
+    return respuesta
+
+@app.post("/chat")
+async def chat(req: ChatReq):
+    inicio = time.perf_counter()
+    user_msg = req.message.strip()
+    
+    if not user_msg:
+        return {"respuesta": "Por favor, escribe un mensaje"}
+    
+    # Generar respuesta en el ejecutor de inferencia (agrupa peticiones en lotes)
+    # sin ocupar un hilo del servidor mientras espera
+    futuro, rechazo = encolar("/chat", user_msg.lower())
+    if rechazo is not None:
+        return rechazo
+    
+    try:
+        respuesta = await asyncio.wait_for(asyncio.wrap_future(futuro), CHAT_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        # wait_for cancela el Future: si seguía en cola, el worker lo descarta
+        PETICIONES.inc(endpoint="/chat", resultado="timeout")
+        return respuesta_saturado(f"Sin respuesta en {CHAT_TIMEOUT_S:.0f} s")
+    
+    respuesta = await asyncio.get_running_loop().run_in_executor(None, registrar_conversacion, user_msg, respuesta)
+    PETICIONES.inc(endpoint="/chat", resultado="ok")
+    LATENCIA_CHAT.observar(time.perf_counter() - inicio, endpoint="/chat")
+    return {"respuesta": respuesta}
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatReq):
+    """
+    Igual que /chat pero enviando cada subpalabra en cuanto se genera (Server-Sent Events)
+    - event: token  → {"texto": "..."} (trae su espacio delante si empieza palabra)
+    - event: fin    → {"respuesta": "..."} texto final, ya revisado y guardado como en /chat
+    - event: error  → {"error": "..."}
+    - Si el cliente se desconecta, la generación de su fila se corta en el siguiente paso
+    """
+    inicio = time.perf_counter()
+    user_msg = req.message.strip()
+
+    if not user_msg:
+        return respuesta_sse(iter([evento_sse("error", {"error": "Por favor, escribe un mensaje"})]))
+
+    loop = asyncio.get_running_loop()
+    eventos = asyncio.Queue()
+    desconectado = threading.Event()
+
+    def al_token(texto):
+        # Se llama desde el hilo del worker de inferencia
+        loop.call_soon_threadsafe(eventos.put_nowait, texto)
+
+    futuro, rechazo = encolar("/chat/stream", user_msg.lower(), al_token=al_token, cancelado=desconectado.is_set)
+    if rechazo is not None:
+        return rechazo
+    # Marca de fin: los tokens encolados antes salen primero
+    futuro.add_done_callback(lambda _: loop.call_soon_threadsafe(eventos.put_nowait, None))
+
+    async def emitir():
+        resultado = "desconectado"
+        try:
+            while True:
+                texto = await asyncio.wait_for(eventos.get(), CHAT_TIMEOUT_S)
+                if texto is None:
+                    break
+                yield evento_sse("token", {"texto": texto})
+
+            if futuro.cancelled():
+                resultado = "cancelado"
+                yield evento_sse("error", {"error": "Generación cancelada"})
+                return
+            if futuro.exception() is not None:
+                resultado = "error"
+                yield evento_sse("error", {"error": str(futuro.exception())})
+                return
+
+            respuesta = await loop.run_in_executor(None, registrar_conversacion, user_msg, futuro.result())
+            resultado = "ok"
+            LATENCIA_CHAT.observar(time.perf_counter() - inicio, endpoint="/chat/stream")
+            yield evento_sse("fin", {"respuesta": respuesta})
+        except asyncio.TimeoutError:
+            resultado = "timeout"
+            yield evento_sse("error", {"error": f"Sin respuesta en {CHAT_TIMEOUT_S:.0f} s"})
+        finally:
+            PETICIONES.inc(endpoint="/chat/stream", resultado=resultado)
+            # Cliente desconectado o tiempo agotado: el worker deja de generar esta fila
+            desconectado.set()
+            futuro.cancel()
+
+    return respuesta_sse(emitir())
+
+def respuesta_sse(eventos):
+    """StreamingResponse de Server-Sent Events a partir de un iterable de eventos"""
+    return StreamingResponse(
+        eventos,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def revisar_entrenamiento():
+    """Lanzar el autoentrenamiento si los contadores superan el umbral (sin I/O)"""
     try:
         if should_train() and not entrenamiento_activo:
-            entrenamiento_activo = True
             print("Suficientes datos! Iniciando autoentrenamiento...")
-            threading.Thread(target=ejecutar_entrenamiento, daemon=True).start()
+            lanzar_entrenamiento()
     except Exception as e:
         print(f"Error verificando entrenamiento: {e}")
-    
-    return {"respuesta": respuesta}
 
-def ejecutar_entrenamiento():
+def al_guardar_conversaciones(pares):
+    """El escritor ya guardó estas conversaciones en el almacén"""
+    pendientes.registrar(len(pares))
+    servicio_estado.agregar(PENDIENTE, pares)
+    revisar_entrenamiento()
+
+def lanzar_entrenamiento():
+    """Encolar un trabajo en el worker de entrenamiento (proceso dedicado)"""
     global entrenamiento_activo
-    try:
-        print("Hilo de entrenamiento iniciado")
-        auto_train()
-    except Exception as e:
-        print(f"Error en entrenamiento: {e}")
-        traceback.print_exc()
-    finally:
-        entrenamiento_activo = False
-        print("Hilo de entrenamiento finalizado")
+    # Que el worker vea en el almacén todas las conversaciones aceptadas
+    escritor.vaciar()
+    job = entrenador.enviar()
+    if job is not None:
+        entrenamiento_activo = True
+        difusor.avisar()
+        print(f"Trabajo de entrenamiento {job} encolado")
+    return job
 
-@app.get("/estado")
-def get_estado():
-    """Ver estado completo del sistema"""
-    estado = {
-        "modelo_existe": os.path.exists("model.pth"),
-        "chat_logs_existe": os.path.exists("chat_logs.txt"),
-        "data_txt_existe": os.path.exists("data.txt"),
-        "entrenamiento_activo": entrenamiento_activo,
-        "timestamp": datetime.datetime.now().isoformat()
-    }
-    
-    try:
-        estado["debe_entrenar"] = should_train()
-    except Exception as e:
-        estado["debe_entrenar"] = False
-        estado["error_should_train"] = str(e)
-    
-    # Contar líneas en chat_logs.txt
-    if os.path.exists("chat_logs.txt"):
-        try:
-            with open("chat_logs.txt", "r", encoding="utf-8") as f:
-                lineas = f.readlines()
-                estado["lineas_chat_logs"] = len(lineas)
-                estado["conversaciones_chat"] = len([l for l in lineas if l.startswith("usuario:")])
-                
-                # Verificar calidad de los datos
-                lineas_validas = 0
-                for linea in lineas:
-                    if linea.strip() and len(linea.split()) <= 8:
-                        lineas_validas += 1
-                estado["lineas_validas_chat"] = lineas_validas
-                
-                # Contar caracteres totales
-                estado["caracteres_chat"] = sum(len(l) for l in lineas)
-        except Exception as e:
-            estado["error_chat_logs"] = str(e)
-    else:
-        estado["lineas_chat_logs"] = 0
-        estado["conversaciones_chat"] = 0
+def al_evento_entrenamiento(evento):
+    """Recibir los eventos de progreso que envía el worker de entrenamiento"""
+    global entrenamiento_activo
+    if evento.get("tipo") != "listo":
+        # Progreso para las pestañas abiertas; el estado se recalcula una vez por ráfaga
+        difusor.publicar("entrenamiento", evento)
+        difusor.avisar()
+    if evento.get("tipo") == "logs_rotados":
+        # El worker pasó las pendientes al corpus: recontar (las que lleguen después siguen pendientes)
+        pendientes.reconstruir()
+        servicio_estado.invalidar()
+    if evento.get("tipo") != "fin":
+        return
     
-    # Contar líneas en data.txt
-    if os.path.exists("data.txt"):
-        try:
-            with open("data.txt", "r", encoding="utf-8") as f:
-                lineas = f.readlines()
-                estado["lineas_data_txt"] = len(lineas)
-                
-                # Analizar longitud promedio
-                longitudes = []
-                for linea in lineas:
-                    linea_limpia = linea.strip()
-                    if linea_limpia:
-                        palabras = len(linea_limpia.split())
-                        longitudes.append(palabras)
-                
-                if longitudes:
-                    estado["promedio_palabras_data"] = sum(longitudes) / len(longitudes)
-                    estado["max_palabras_data"] = max(longitudes)
-                    estado["lineas_largas_data"] = len([l for l in longitudes if l > 6])
-                    estado["lineas_validas_data"] = len([l for l in longitudes if 1 <= l <= 6])
-                else:
-                    estado["promedio_palabras_data"] = 0
-                    estado["max_palabras_data"] = 0
-        except Exception as e:
-            estado["error_data_txt"] = str(e)
+    entrenamiento_activo = False
+    servicio_estado.invalidar_modelo()
+    registrar_metricas_entrenamiento(evento)
+    if evento.get("ok"):
+        print(f"Entrenamiento {evento.get('job')} finalizado: {evento.get('resumen')}")
+        # Activar el checkpoint recién entrenado sin reiniciar el servidor
+        # (si el motor aún está cargando, lo encontrará él mismo)
+        if motor_cargado.is_set():
+            registro.recargar()
     else:
-        estado["lineas_data_txt"] = 0
+        print(f"Entrenamiento {evento.get('job')} sin éxito: {evento.get('error')}")
+
+def registrar_metricas_entrenamiento(evento):
+    """Duración de cada paso y loss del trabajo que acaba de terminar (evento fin)"""
+    ENTRENAMIENTOS.inc(resultado="ok" if evento.get("ok") else "error")
+    resumen = evento.get("resumen") or {}
+    for etapa, segundos in resumen.get("etapas", {}).items():
+        DURACION_ENTRENAMIENTO.observar(segundos, etapa=etapa)
+    if "loss" in resumen:
+        LOSS.fijar(resumen["loss"])
+        TOKENS_S.fijar(resumen["tokens_s"])
+        EPOCAS.fijar(resumen["epocas"])
+
+def estado_dinamico():
+    """Partes de /estado que cambian solas y son baratas de leer (nada de disco)"""
+    try:
+        debe_entrenar = should_train()
+    except Exception:
+        debe_entrenar = False
+    return {
+        "entrenamiento_activo": entrenamiento_activo,
+        "progreso_entrenamiento": entrenador.progreso,
+        "debe_entrenar": debe_entrenar,
+        "lock_file_existe": os.path.exists("training.lock"),
+        "motor": estado_motor(),
+        "inferencia": inferencia.metricas() if motor_cargado.is_set() else None,
+        "cache_respuestas": cache_respuestas.metricas(),
+        "cache_estados": cache_estados.metricas() if motor_cargado.is_set() else None,
+    }
+
+@app.get("/estado")
+def get_estado(request: Request):
+    """Ver estado completo del sistema (instantánea en memoria, con ETag)"""
+    cuerpo, etag = servicio_estado.instantanea(estado_dinamico())
+    cabeceras = {"ETag": etag, "Cache-Control": "no-cache"}
     
-    # Ver tamaño del modelo
-    if os.path.exists("model.pth"):
-        try:
-            tamano = os.path.getsize("model.pth")
-            estado["tamano_modelo_bytes"] = tamano
-            estado["tamano_modelo_kb"] = tamano / 1024
-            estado["tamano_modelo_mb"] = tamano / (1024 * 1024)
-        except Exception as e:
-            estado["error_tamano_modelo"] = str(e)
+    # Sondeo sin cambios: 304 sin cuerpo
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=cabeceras)
+    return Response(content=cuerpo, media_type="application/json", headers=cabeceras)
+
+@app.get("/eventos")
+def eventos(request: Request):
+    """
+    Cambios de estado empujados por el servidor (Server-Sent Events), en lugar de sondear /estado
+    - event: estado         → mismo cuerpo que /estado, solo cuando cambia (id: su ETag)
+    - event: entrenamiento  → cada evento del worker (inicio, paso, época, fin...)
+    """
+    return respuesta_sse(difusor.clientes(request.headers.get("last-event-id")))
+
+@app.get("/metrics")
+def get_metrics():
+    """Latencias por etapa, tokens, fallbacks, OOV y entrenamiento en formato de Prometheus"""
+    return Response(content=metricas.exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/modelo")
+def get_modelo():
+    """Versión del modelo activo y cuándo se cargó"""
+    if not motor_cargado.is_set():
+        return JSONResponse({"cargado": False, "estado": estado_motor()})
+    return JSONResponse(registro.info())
+
+@app.post("/recargar_modelo")
+def recargar_modelo():
+    """Avisar de que hay un checkpoint nuevo y cargarlo en segundo plano"""
+    if not motor_cargado.is_set():
+        return respuesta_calentando()
+    if not checkpoints.existe():
+        return JSONResponse({"mensaje": "No hay ningún checkpoint del modelo", "status": "error"}, status_code=404)
     
-    # Verificar si hay archivo de lock
-    estado["lock_file_existe"] = os.path.exists("training.lock")
+    registro.recargar()
+    return JSONResponse({
+        "mensaje": "Recarga del modelo iniciada en segundo plano",
+        "status": "iniciado",
+        "version_actual": registro.info().get("version")
+    })
+
+@app.get("/versiones_modelo")
+def versiones_modelo():
+    """Versiones del checkpoint guardadas (para volver a una anterior)"""
+    return JSONResponse({"versiones": checkpoints.versiones(), "conservar": checkpoints.conservar})
+
+@app.post("/restaurar_modelo/{nombre}")
+def restaurar_modelo(nombre: str):
+    """Activar una versión anterior del checkpoint (rollback) y cargarla"""
+    try:
+        manifiesto = checkpoints.activar(nombre)
+    except FileNotFoundError as e:
+        return JSONResponse({"mensaje": str(e), "status": "error"}, status_code=404)
+    servicio_estado.invalidar_modelo()
     
-    return JSONResponse(estado)
+    if motor_cargado.is_set():
+        registro.recargar()
+    return JSONResponse({
+        "mensaje": f"Versión {nombre} activada, cargándose en segundo plano",
+        "status": "iniciado",
+        "version": manifiesto["version"],
+    })
 
 @app.post("/forzar_entrenamiento")
 def forzar_entrenamiento():
@@ -182,7 +412,7 @@ def forzar_entrenamiento():
         return JSONResponse({"mensaje": "Ya hay un entrenamiento en curso", "status": "ocupado"})
     
     # Verificar archivos necesarios
-    archivos_necesarios = ["build_dataset.py", "train.py", "model.py", "tokenizer.py"]
+    archivos_necesarios = ["build_dataset.py", "train.py", "model.py", "tokenizer.py", "conversation_store.py"]
     faltantes = []
     for archivo in archivos_necesarios:
         if not os.path.exists(archivo):
@@ -195,25 +425,25 @@ def forzar_entrenamiento():
         }, status_code=500)
     
     # Asegurar que hay datos mínimos
-    if not os.path.exists("chat_logs.txt") or os.path.getsize("chat_logs.txt") == 0:
-        with open("chat_logs.txt", "w", encoding="utf-8") as f:
-            f.write("usuario: hola\n")
-            f.write("ia: hola como estas\n")
-            f.write("usuario: que tal\n")
-            f.write("ia: bien gracias\n")
-        print("chat_logs.txt inicializado con datos básicos")
+    with escritor.exclusivo():
+        if store.contar(PENDIENTE) == 0:
+            store.agregar([("hola", "hola como estas"), ("que tal", "bien gracias")], origen="semilla")
+            pendientes.reconstruir()
+            print("Conversaciones pendientes inicializadas con datos básicos")
     
-    if not os.path.exists("data.txt") or os.path.getsize("data.txt") == 0:
-        with open("data.txt", "w", encoding="utf-8") as f:
-            f.write("hola\ncomo estas\nbien\nque haces\nnada\nadios\n")
-        print("data.txt inicializado con datos básicos")
+    if store.contar(DATASET) == 0:
+        store.agregar(PARES_BASICOS, estado=DATASET, origen="semilla")
+        print("Corpus inicializado con datos básicos")
+    servicio_estado.invalidar()
     
-    entrenamiento_activo = True
-    threading.Thread(target=ejecutar_entrenamiento, daemon=True).start()
+    job = lanzar_entrenamiento()
+    if job is None:
+        return JSONResponse({"mensaje": "Ya hay un entrenamiento en curso", "status": "ocupado"})
     
     return JSONResponse({
         "mensaje": "Entrenamiento forzado iniciado en segundo plano",
         "status": "iniciado",
+        "job": job,
         "timestamp": datetime.datetime.now().isoformat(),
         "nota": "El entrenamiento puede tardar varios minutos"
     })
@@ -224,41 +454,18 @@ def limpiar_datos():
     try:
         eliminadas_total = 0
         
-        # 1. Limpiar chat_logs.txt (mantener solo líneas cortas)
-        if os.path.exists("chat_logs.txt"):
-            with open("chat_logs.txt", "r", encoding="utf-8") as f:
-                lineas_originales = f.readlines()
-            
-            lineas_limpias = []
-            for linea in lineas_originales:
-                linea = linea.strip()
-                if linea and len(linea.split()) <= 8:  # Máximo 8 palabras
-                    lineas_limpias.append(linea + "\n")
-            
-            with open("chat_logs.txt", "w", encoding="utf-8") as f:
-                f.writelines(lineas_limpias)
-            
-            eliminadas = len(lineas_originales) - len(lineas_limpias)
-            eliminadas_total += eliminadas
-            print(f"chat_logs.txt limpiado: {eliminadas} líneas largas eliminadas")
+        # 1. Limpiar conversaciones pendientes (mantener solo líneas cortas)
+        with escritor.exclusivo():
+            eliminadas = store.borrar(PENDIENTE, max_palabras=8)  # Máximo 8 palabras
+            pendientes.reconstruir()
+        eliminadas_total += eliminadas * 2
+        print(f"Pendientes limpiadas: {eliminadas} conversaciones largas eliminadas")
         
-        # 2. Limpiar data.txt (mantener solo frases cortas)
-        if os.path.exists("data.txt"):
-            with open("data.txt", "r", encoding="utf-8") as f:
-                lineas_originales = f.readlines()
-            
-            lineas_limpias = []
-            for linea in lineas_originales:
-                linea = linea.strip()
-                if linea and 1 <= len(linea.split()) <= 6:  # 1-6 palabras
-                    lineas_limpias.append(linea + "\n")
-            
-            with open("data.txt", "w", encoding="utf-8") as f:
-                f.writelines(lineas_limpias)
-            
-            eliminadas = len(lineas_originales) - len(lineas_limpias)
-            eliminadas_total += eliminadas
-            print(f"data.txt limpiado: {eliminadas} líneas largas eliminadas")
+        # 2. Limpiar corpus (mantener solo frases cortas)
+        eliminadas = store.borrar(DATASET, max_palabras=6, min_palabras=1)  # 1-6 palabras
+        eliminadas_total += eliminadas * 2
+        print(f"Corpus limpiado: {eliminadas} pares largos eliminados")
+        servicio_estado.invalidar()
         
         return JSONResponse({
             "mensaje": f"Datos limpiados exitosamente ({eliminadas_total} líneas eliminadas)",
@@ -278,25 +485,30 @@ def limpiar_datos():
 def reiniciar_modelo():
     """Borrar modelo y empezar desde cero"""
     try:
-        if os.path.exists("model.pth"):
-            os.remove("model.pth")
-            print("Modelo anterior eliminado")
+        if checkpoints.existe():
+            checkpoints.borrar()
+            print("Modelo anterior eliminado (todas sus versiones)")
+        
+        from export_model import INFERENCIA_PATH
+        if os.path.exists(INFERENCIA_PATH):
+            os.remove(INFERENCIA_PATH)
+        
+        # Sin modelo no hace falta conservar los ids del vocabulario
+        if os.path.exists(VOCAB_PATH):
+            os.remove(VOCAB_PATH)
         
-        # Crear data.txt básico si está vacío
-        if not os.path.exists("data.txt") or os.path.getsize("data.txt") == 0:
-            with open("data.txt", "w", encoding="utf-8") as f:
-                f.write("hola\n")
-                f.write("como estas\n")
-                f.write("bien\n")
-                f.write("que haces\n")
-                f.write("nada\n")
-                f.write("adios\n")
-            print("data.txt básico creado")
+        # Crear corpus básico si está vacío
+        if store.contar(DATASET) == 0:
+            store.agregar(PARES_BASICOS, estado=DATASET, origen="semilla")
+            print("Corpus básico creado")
         
-        # Limpiar chat_logs.txt para empezar fresco
-        if os.path.exists("chat_logs.txt"):
-            open("chat_logs.txt", "w").close()
-            print("chat_logs.txt limpiado")
+        # Borrar conversaciones pendientes para empezar fresco
+        with escritor.exclusivo():
+            store.borrar(PENDIENTE)
+            pendientes.reiniciar()
+            print("Conversaciones pendientes borradas")
+        servicio_estado.invalidar()
+        servicio_estado.invalidar_modelo()
         
         return JSONResponse({
             "mensaje": "Modelo reiniciado. Ejecuta /forzar_entrenamiento para entrenar",
@@ -319,18 +531,25 @@ def startup_event():
         print("Chatbot Autoentrenable Iniciando")
         print("=" * 50)
         
-        # Crear directorio de backups si no existe
-        os.makedirs("backups", exist_ok=True)
+        # torch, el modelo y la inferencia por lotes se cargan sin bloquear el arranque
+        threading.Thread(target=cargar_motor, name="arranque-motor", daemon=True).start()
         
-        # Crear archivos si no existen
-        if not os.path.exists("data.txt"):
-            with open("data.txt", "w", encoding="utf-8") as f:
-                f.write("hola\ncomo estas\nbien\nque haces\nnada\nadios\n")
-            print("data.txt creado con datos básicos")
+        # Arrancar el worker de entrenamiento (un proceso, reutilizado entre trabajos)
+        entrenador.suscribir(al_evento_entrenamiento)
+        entrenador.iniciar()
         
-        if not os.path.exists("chat_logs.txt"):
-            open("chat_logs.txt", "w").close()
-            print("chat_logs.txt creado vacío")
+        # Canal de eventos: el estado se calcula una vez por cambio, no una vez por pestaña
+        servicio_estado.suscribir(difusor.avisar)
+        difusor.iniciar(lambda: servicio_estado.instantanea(estado_dinamico()))
+        
+        # Abrir el almacén (la primera vez importa chat_logs.txt y data.txt)
+        if store.contar(DATASET) == 0:
+            store.agregar(PARES_BASICOS, estado=DATASET, origen="semilla")
+            print("Corpus creado con datos básicos")
+        
+        # Contar una sola vez las conversaciones pendientes; luego se actualiza en memoria
+        pendientes.reconstruir()
+        escritor.iniciar()
         
         # Verificar si hay datos para entrenar
         if should_train():
@@ -341,57 +560,187 @@ def startup_event():
             print("Chatea un poco y luego usa /forzar_entrenamiento")
         
         print("=" * 50)
-        print("Servidor listo en http://localhost:8000")
-        print("Estado disponible en /estado")
+        print(f"Servidor listo en http://localhost:8000 ({time.monotonic() - ARRANQUE:.2f} s)")
+        print("Estado disponible en /estado, modelo cargándose (ver /ready)")
         print("=" * 50)
         
     except Exception as e:
         print(f"Error en startup: {e}")
         traceback.print_exc()
 
+def cargar_motor():
+    """Importar torch, cargar el modelo y arrancar la inferencia (hilo de arranque)"""
+    global inferencia, registro, cache_estados, ColaLlena
+    tiempos = arranque["tiempos"]
+    try:
+        arranque["fase"] = "importando"
+        difusor.avisar()
+        inicio = time.monotonic()
+        import generate
+        import inference_worker
+        tiempos["importar_s"] = round(time.monotonic() - inicio, 2)
+        
+        arranque["fase"] = "cargando"
+        difusor.avisar()
+        inicio = time.monotonic()
+        if checkpoints.existe():
+            try:
+                generate.registro.cargar()
+                # Primera generación: paga aquí la inicialización perezosa de torch
+                generate.generar("hola")
+            except Exception as e:
+                # Se reintenta cuando se active otra versión
+                print(f"Error cargando modelo: {e}")
+        else:
+            print("Modelo no encontrado: usa /forzar_entrenamiento para entrenar")
+        tiempos["modelo_s"] = round(time.monotonic() - inicio, 2)
+        
+        inferencia, ColaLlena = inference_worker.worker, inference_worker.ColaLlena
+        registro, cache_estados = generate.registro, generate.estados
+        registro.suscribir(difusor.avisar)
+        
+        # Arrancar el worker de inferencia por lotes
+        inferencia.iniciar()
+        print(f"Inferencia por lotes: máx {inferencia.max_lote} peticiones, espera {inferencia.max_espera * 1000:.0f} ms, "
+              f"cola {inferencia.max_cola}, {inferencia.num_hilos} hilo(s), {inferencia.torch_hilos} hilo(s) de torch")
+        
+        # Vigilar el checkpoint para recargar el modelo cuando cambie (o cuando aparezca)
+        registro.vigilar()
+        motor_cargado.set()
+        difusor.avisar()
+        
+        tiempos["arranque_s"] = round(time.monotonic() - ARRANQUE, 2)
+        print(f"Arranque en frío: {tiempos['arranque_s']} s hasta {estado_motor()} "
+              f"(torch {tiempos['importar_s']} s, modelo {tiempos['modelo_s']} s)")
+    except Exception as e:
+        arranque["error"] = str(e)
+        difusor.avisar()
+        print(f"Error arrancando el motor de inferencia: {e}")
+        traceback.print_exc()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    # Escribir las conversaciones que sigan en memoria antes de salir
+    difusor.detener()
+    escritor.detener()
+    entrenador.detener()
+
 # Página de administración
 @app.get("/admin")
 def admin_panel():
     return FileResponse("static/admin.html")
 
-# Endpoint de salud
+# Endpoint de salud (responde aunque el modelo siga cargando)
 @app.get("/health")
 def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.datetime.now().isoformat(),
-        "service": "chatbot-autoentrenable"
+        "service": "chatbot-autoentrenable",
+        "motor": estado_motor(),
+    }
+
+# Preparado para chatear: 200 con el modelo cargado, 503 mientras tanto
+@app.get("/ready")
+def ready_check():
+    estado = estado_motor()
+    return JSONResponse({
+        "listo": estado == "listo",
+        "estado": estado,
+        "error": arranque["error"],
+        "tiempos": arranque["tiempos"],
+        "desde_arranque_s": round(time.monotonic() - ARRANQUE, 2),
+    }, status_code=200 if estado == "listo" else 503)
+
+def leer_texto(nombre, lineas, desde):
+    """
+    Trozo de train.log, chat_logs.txt o data.txt sin cargar el archivo entero
+    - train.log: `desde` es un offset en bytes; sin él, las últimas `lineas`
+      leídas desde el final
+    - chat_logs.txt y data.txt viven en el almacén: `desde` es el id del último
+      par visto y cada par son dos líneas
+    - `hasta` es el `desde` de la página siguiente (o de lo que se escriba después)
+    """
+    lineas = min(max(lineas, 1), MAX_LINEAS_LOG)
+    if nombre in ARCHIVOS_ALMACEN:
+        estado = ARCHIVOS_ALMACEN[nombre]
+        cantidad = (lineas + 1) // 2
+        pares = store.ultimos(estado, cantidad) if desde is None else store.pares(estado, desde_id=desde, limite=cantidad)
+        return {
+            "contenido": store.como_texto(estado, pares),
+            "desde": pares[0][0] - 1 if pares else desde or 0,
+            "hasta": pares[-1][0] if pares else desde or 0,
+            "pares": len(pares),
+            "total_pares": store.contar(estado),
+        }
+    
+    if desde is None:
+        contenido, inicio, fin = leer_cola(nombre, lineas)
+    else:
+        contenido, inicio, fin = leer_desde(nombre, desde, lineas)
+    return {
+        "contenido": contenido,
+        "desde": inicio,
+        "hasta": fin,
+        "tamano": os.path.getsize(nombre),
+        "archivados": [os.path.basename(r) for r in archivos_rotados(nombre)],
     }
 
+def stream_texto(nombre, desde):
+    """
+    El archivo entero (o desde `desde`) como text/plain, por bloques
+    - Mismos cursores que leer_texto (bytes en train.log, id de par en el almacén)
+    - La cabecera X-Hasta trae el `desde` de la petición siguiente: lo que se
+      escriba mientras se envía queda para ella
+    - Un `desde` más allá del final de train.log es de antes de una rotación:
+      se envía el archivo nuevo desde el principio (X-Desde: 0)
+    """
+    if nombre in ARCHIVOS_ALMACEN:
+        estado = ARCHIVOS_ALMACEN[nombre]
+        ultimo = store.ultimos(estado, 1)
+        hasta = max(ultimo[0][0] if ultimo else 0, desde or 0)
+        contenido = store.iterar_texto(estado, desde_id=desde or 0, hasta_id=hasta)
+    else:
+        hasta = os.path.getsize(nombre)
+        if (desde or 0) > hasta:
+            desde = 0
+        contenido = iterar(nombre, desde or 0, hasta)
+    return StreamingResponse(contenido, media_type="text/plain; charset=utf-8",
+                             headers={"X-Desde": str(desde or 0), "X-Hasta": str(hasta)})
+
 # Nuevo endpoint para ver logs
 @app.get("/logs")
-def get_logs():
-    """Ver los logs de entrenamiento"""
+def get_logs(lineas: int = LINEAS_LOG, desde: Optional[int] = None, stream: bool = False):
+    """
+    Ver los logs de entrenamiento
+    - Por defecto las últimas `lineas`; desde=<byte> para paginar hacia delante
+    - stream=true: el log completo (o desde=<byte>) por bloques; X-Hasta trae el cursor
+      siguiente (los archivados van en train.log.N.gz)
+    """
     try:
-        if os.path.exists("train.log"):
-            with open("train.log", "r", encoding="utf-8") as f:
-                contenido = f.read()
-            return {"logs": contenido, "status": "ok"}
-        else:
+        if not os.path.exists(TRAIN_LOG):
             return {"logs": "No hay logs aún", "status": "no_logs"}
+        if stream:
+            return stream_texto(TRAIN_LOG, desde)
+        trozo = leer_texto(TRAIN_LOG, lineas, desde)
+        return {"logs": trozo.pop("contenido"), **trozo, "status": "ok"}
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
 # Nuevo endpoint para ver archivo específico
 @app.get("/ver_archivo/{nombre}")
-def ver_archivo(nombre: str):
-    """Ver contenido de archivo específico"""
+def ver_archivo(nombre: str, lineas: int = LINEAS_LOG, desde: Optional[int] = None, stream: bool = False):
+    """Ver contenido de archivo específico (por trozos o en stream, como /logs; en el almacén `desde` es un id)"""
     archivos_permitidos = ["chat_logs.txt", "data.txt", "train.log"]
     
     if nombre not in archivos_permitidos:
         return JSONResponse({"error": "Archivo no permitido"}, status_code=403)
     
     try:
-        if os.path.exists(nombre):
-            with open(nombre, "r", encoding="utf-8") as f:
-                contenido = f.read()
-            return {"archivo": nombre, "contenido": contenido, "status": "ok"}
-        else:
+        if nombre not in ARCHIVOS_ALMACEN and not os.path.exists(nombre):
             return {"archivo": nombre, "contenido": "", "status": "no_existe"}
+        if stream:
+            return stream_texto(nombre, desde)
+        return {"archivo": nombre, **leer_texto(nombre, lineas, desde), "status": "ok"}
     except Exception as e:
-        return JSONResponse({"error": str(e)}, status_code=500)
\ No newline at end of file
+        return JSONResponse({"error": str(e)}, status_code=500)
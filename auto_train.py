@@ -1,12 +1,19 @@
 import os
-import subprocess
 import datetime
+import threading
 import time
 
+from build_dataset import build_dataset
+from conversation_store import store, PENDIENTE, DATASET
+from log_files import rotar
+
 THRESHOLD = 6  # Reducir para probar más fácil
 LOCK_FILE = "training.lock"
-CHAT_LOGS = "chat_logs.txt"
 TRAIN_LOG = "train.log"
+TIMEOUT_ENTRENAMIENTO = 300  # Segundos máximos por trabajo de entrenamiento
+# Al pasar de este tamaño train.log se comprime en train.log.1.gz (se guardan TRAIN_LOG_ARCHIVOS)
+TRAIN_LOG_MAX_BYTES = int(os.environ.get("TRAIN_LOG_MAX_BYTES", str(1024 * 1024)))
+TRAIN_LOG_ARCHIVOS = int(os.environ.get("TRAIN_LOG_ARCHIVOS", "5"))
 
 def log(msg):
     """Registrar en log con timestamp"""
@@ -15,37 +22,97 @@ def log(msg):
     print(log_msg)  # Mostrar en consola también
     with open(TRAIN_LOG, "a", encoding="utf-8") as f:
         f.write(log_msg + "\n")
+        tamano = f.tell()
+    
+    if TRAIN_LOG_MAX_BYTES > 0 and tamano >= TRAIN_LOG_MAX_BYTES:
+        try:
+            rotar(TRAIN_LOG, TRAIN_LOG_ARCHIVOS)
+        except Exception as e:
+            print(f"Error rotando {TRAIN_LOG}: {e}")
 
-def should_train():
-    """Verificar si hay suficientes datos para entrenar"""
-    if not os.path.exists(CHAT_LOGS):
-        log(f"❌ {CHAT_LOGS} no existe")
-        return False
+class ContadorConversaciones:
+    """
+    Contador en memoria de las conversaciones pendientes de entrenar
+    - reconstruir(): un COUNT indexado en el almacén (al arrancar o tras borrar)
+    - registrar(): sumar las conversaciones que se acaban de guardar
+    - reiniciar(): volver a cero cuando auto_train las pasa al corpus
+    - listo(): comparar con el umbral sin tocar disco
+    """
+    def __init__(self, umbral=THRESHOLD):
+        self.umbral = umbral  # En líneas de conversación: cada par son dos (usuario + ia)
+        self.conversaciones = 0
+        self.inicializado = False
+        self.ultimo_estado = None
+        self.lock = threading.Lock()
     
-    try:
-        with open(CHAT_LOGS, "r", encoding="utf-8") as f:
-            lines = [l.strip() for l in f if l.strip()]
-        
-        # Contar líneas que son conversación real
-        conv_lines = [l for l in lines if l.startswith(("usuario:", "ia:"))]
-        
-        log(f"📊 Líneas en chat_logs.txt: {len(lines)}")
-        log(f"📊 Líneas de conversación: {len(conv_lines)}")
-        log(f"📊 Umbral necesario: {THRESHOLD}")
-        
-        return len(conv_lines) >= THRESHOLD
+    @property
+    def lineas_conversacion(self):
+        return self.conversaciones * 2
+    
+    def reconstruir(self):
+        """Recontar con una consulta al almacén"""
+        total = store.contar(PENDIENTE)
+        with self.lock:
+            self.conversaciones = total
+            self.inicializado = True
+        self._registrar_estado()
+    
+    def registrar(self, cantidad):
+        """Sumar las conversaciones recién guardadas"""
+        with self.lock:
+            self.conversaciones += cantidad
+        self._registrar_estado()
+    
+    def reiniciar(self):
+        with self.lock:
+            self.conversaciones = 0
+            self.inicializado = True
+        self._registrar_estado()
+    
+    def listo(self):
+        """¿Hay suficientes líneas de conversación para entrenar?"""
+        if not self.inicializado:
+            self.reconstruir()
+        return self.lineas_conversacion >= self.umbral
     
+    def _registrar_estado(self):
+        """Escribir en train.log solo cuando cambia el estado respecto al umbral"""
+        estado = self.lineas_conversacion >= self.umbral
+        if estado == self.ultimo_estado:
+            return
+        self.ultimo_estado = estado
+        log(f"📊 Conversaciones pendientes: {self.conversaciones}")
+        log(f"📊 Líneas de conversación: {self.lineas_conversacion}")
+        log(f"📊 Umbral necesario: {self.umbral}")
+
+pendientes = ContadorConversaciones()
+
+def should_train():
+    """Verificar si hay suficientes datos para entrenar (sin leer disco)"""
+    try:
+        return pendientes.listo()
     except Exception as e:
         log(f"❌ Error en should_train: {e}")
         return False
 
-def auto_train():
-    """Función principal de autoentrenamiento"""
+def auto_train(progreso=None):
+    """
+    Función principal de autoentrenamiento
+    - Se ejecuta en el proceso actual (normalmente el worker de training_worker.py)
+    - progreso: función opcional que recibe eventos (dict) de cada paso y época
+    """
+    # torch solo hace falta aquí: importar este módulo (servidor) sigue siendo ligero
+    from train import entrenar
+    from export_model import exportar, EXPORTAR
+    
+    emitir = progreso or (lambda evento: None)
+    resumen = None
+    etapas = {}  # Segundos de cada paso (van en el resumen para las métricas del servidor)
     
     # 🔒 Evitar múltiples entrenamientos simultáneos
     if os.path.exists(LOCK_FILE):
         log("⏸️ Entrenamiento ya en curso (lock file existe)")
-        return
+        return None
     
     # Crear archivo de bloqueo
     with open(LOCK_FILE, "w") as f:
@@ -61,81 +128,65 @@ def auto_train():
         for archivo in archivos_necesarios:
             if not os.path.exists(archivo):
                 log(f"❌ Falta archivo: {archivo}")
-                return
+                return None
         
         # 2. Verificar que hay datos
-        if not os.path.exists(CHAT_LOGS):
-            log("❌ No hay chat_logs.txt para entrenar")
-            return
+        if store.contar(PENDIENTE) == 0 and store.contar(DATASET) == 0:
+            log("❌ No hay conversaciones para entrenar")
+            return None
         
-        # 3. Construir dataset (transferir de chat_logs.txt a data.txt)
+        # 3. Construir dataset (pasar las conversaciones pendientes al corpus)
         log("📦 Paso 1: Construyendo dataset...")
+        emitir({"tipo": "paso", "paso": "dataset"})
+        tiempo_inicio = time.time()
         try:
-            resultado = subprocess.run(
-                ["python", "build_dataset.py"],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            log(f"✅ Dataset construido: {resultado.stdout[:100]}...")
-        except subprocess.CalledProcessError as e:
+            pares = build_dataset()
+            etapas["dataset"] = round(time.time() - tiempo_inicio, 3)
+            pendientes.reiniciar()
+            emitir({"tipo": "logs_rotados"})
+            log(f"✅ Dataset construido: {pares} pares nuevos")
+        except Exception as e:
             log(f"❌ Error construyendo dataset: {e}")
-            log(f"Salida de error: {e.stderr}")
-            return
+            return None
+        
+        # 4. Verificar que el corpus tiene contenido
+        pares_corpus = store.contar(DATASET)
+        log(f"📊 El corpus tiene {pares_corpus} pares")
         
-        # 4. Verificar que data.txt tiene contenido
-        if os.path.exists("data.txt"):
-            with open("data.txt", "r", encoding="utf-8") as f:
-                lineas_data = len(f.readlines())
-            log(f"📊 data.txt tiene {lineas_data} líneas")
-            
-            if lineas_data < 10:
-                log("⚠️ Poco contenido en data.txt, entrenamiento puede ser pobre")
+        if pares_corpus < 5:
+            log("⚠️ Poco contenido en el corpus, entrenamiento puede ser pobre")
         
-        # 5. Entrenar modelo
+        # 5. Entrenar modelo (train.entrenar respeta su propio presupuesto de tiempo)
         log("🚀 Paso 2: Entrenando modelo...")
+        emitir({"tipo": "paso", "paso": "entrenamiento"})
         tiempo_inicio = time.time()
         
         try:
-            resultado = subprocess.run(
-                ["python", "train.py"],
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minutos máximo
-            )
-            
+            resumen = entrenar(progreso=emitir)
             tiempo_total = time.time() - tiempo_inicio
-            
-            if resultado.returncode == 0:
-                log(f"✅ Entrenamiento exitoso en {tiempo_total:.1f} segundos")
-                if "Loss:" in resultado.stdout:
-                    log(f"📈 Salida del entrenamiento: {resultado.stdout[-200:]}")
+            etapas["entrenamiento"] = round(tiempo_total, 3)
+            if resumen["parada"] == "sin_pares_nuevos":
+                log("⏭️ Nada que ajustar: el modelo actual sigue vigente")
             else:
-                log(f"⚠️ Entrenamiento completado con código: {resultado.returncode}")
-                log(f"Salida: {resultado.stdout[-500:]}")
-                
-        except subprocess.TimeoutExpired:
-            log("⏰ Entrenamiento excedió el tiempo límite (5 minutos)")
+                log(f"✅ Entrenamiento exitoso en {tiempo_total:.1f} segundos")
+                log(f"📈 Loss final: {resumen['loss']:.4f} ({resumen['epocas']} épocas, {resumen['tokens_s']} tokens/s)")
+                log(f"🎯 Modo {resumen['modo']}: {resumen['pares_nuevos']} pares nuevos, "
+                    f"{resumen['pares_repaso']} de repaso, parada por {resumen['parada']}")
         except Exception as e:
             log(f"❌ Error en entrenamiento: {e}")
         
-        # 6. Limpiar y respaldar
-        log("🧹 Paso 3: Limpiando logs...")
-        if os.path.exists(CHAT_LOGS):
-            # Crear respaldo
-            fecha = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = f"backups/chat_logs_{fecha}.txt"
-            
-            # Crear directorio de backups si no existe
-            os.makedirs("backups", exist_ok=True)
-            
-            import shutil
-            shutil.copy2(CHAT_LOGS, backup_file)
-            log(f"📁 Backup creado: {backup_file}")
-            
-            # Limpiar archivo actual (no borrar, solo vaciar)
-            open(CHAT_LOGS, "w").close()
-            log("✅ chat_logs.txt limpiado")
+        # 6. Exportar el artefacto de inferencia (sin dropout, int8) para el servidor
+        if resumen is not None and EXPORTAR:
+            log("📦 Paso 3: Exportando modelo de inferencia...")
+            emitir({"tipo": "paso", "paso": "exportacion"})
+            try:
+                exportado = exportar()
+                etapas["exportacion"] = exportado['segundos']
+                log(f"✅ Modelo int8 exportado: {exportado['bytes_fp32'] // 1024} KB → "
+                    f"{exportado['bytes_int8'] // 1024} KB en {exportado['segundos']} s")
+            except Exception as e:
+                # El servidor sigue con el modelo fp32
+                log(f"❌ Error exportando modelo de inferencia: {e}")
         
         log("=" * 50)
         log("🎉 AUTOENTRENAMIENTO COMPLETADO")
@@ -151,6 +202,10 @@ def auto_train():
         if os.path.exists(LOCK_FILE):
             os.remove(LOCK_FILE)
             log("🔓 Lock file removido")
+    
+    if resumen is not None:
+        resumen["etapas"] = etapas
+    return resumen
 
 if __name__ == "__main__":
     print("🔍 Verificando si hay que entrenar...")
@@ -159,4 +214,4 @@ if __name__ == "__main__":
         auto_train()
     else:
         print("⏸️ No hay suficientes datos para entrenar")
-        print(f"Revisa {CHAT_LOGS}")
\ No newline at end of file
+        print(f"Conversaciones pendientes: {pendientes.conversaciones}")
\ No newline at end of file
@@ -0,0 +1,9 @@
+# benchmarks - Rendimiento de generación, entrenamiento y /chat sobre corpus sintéticos
+#
+#   python -m benchmarks                         todo, con los tamaños por defecto
+#   python -m benchmarks --rapido                tamaños pequeños (comprobar que funciona)
+#   python -m benchmarks --comparar anterior.json
+#   python -m benchmarks.comparar anterior.json nuevo.json
+#
+# Cada caso corre en un proceso aparte dentro de un directorio temporal (almacén,
+# corpus, checkpoints y vocabulario propios): no toca los datos del servidor.
@@ -0,0 +1,144 @@
+# benchmarks/__main__.py - python -m benchmarks: correr la suite y guardar el resultado en JSON
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+from benchmarks.comparar import comparar, imprimir, TOLERANCIA
+from benchmarks.entorno import RAIZ, ejecutar
+
+DIRECTORIO = os.path.join(RAIZ, "benchmarks", "resultados")
+
+# Tamaños por defecto y los de --rapido (para comprobar que todo corre)
+COMPLETO = {
+    "generacion": {"vocab_max": [250, 1000, 2000], "pares": 3000, "palabras": 2500,
+                   "largos": [1, 4, 8, 16], "repeticiones": 200},
+    "entrenamiento": {"pares": [500, 2000, 8000], "palabras": 2500, "epocas": 11},
+    "chat": {"pares": 2000, "palabras": 1500, "concurrencias": [1, 8, 32], "peticiones": 400},
+}
+RAPIDO = {
+    "generacion": {"vocab_max": [250, 1000], "pares": 500, "palabras": 800,
+                   "largos": [1, 8], "repeticiones": 50},
+    "entrenamiento": {"pares": [200, 800], "palabras": 800, "epocas": 11},
+    "chat": {"pares": 500, "palabras": 800, "concurrencias": [1, 8], "peticiones": 100},
+}
+
+
+def _lista(texto):
+    return [int(x) for x in texto.split(",")]
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _entorno():
+    import torch
+    return {
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def correr(config, grupos, semilla=0):
+    resultado = {"meta": {**_entorno(), "semilla": semilla, "config": {g: config[g] for g in grupos}}}
+
+    if "generacion" in grupos:
+        print("⏱️ Generación")
+        c = config["generacion"]
+        resultado["generacion"] = []
+        for vocab_max in c["vocab_max"]:
+            resultado["generacion"] += ejecutar("generacion", {
+                "vocab_max": vocab_max, "pares": c["pares"], "palabras": c["palabras"],
+                "largos": c["largos"], "repeticiones": c["repeticiones"], "semilla": semilla,
+            }, env={"TOKENIZER_VOCAB_MAX": str(vocab_max)})
+
+    if "entrenamiento" in grupos:
+        print("🏋️ Entrenamiento")
+        c = config["entrenamiento"]
+        resultado["entrenamiento"] = [
+            ejecutar("entrenamiento", {"pares": pares, "palabras": c["palabras"], "epocas": c["epocas"],
+                                       "semilla": semilla})
+            for pares in c["pares"]
+        ]
+
+    if "chat" in grupos:
+        print("💬 /chat")
+        c = config["chat"]
+        # Sin caché de respuestas: cada petición pasa por el modelo
+        resultado["chat"] = ejecutar("chat", {
+            "pares": c["pares"], "palabras": c["palabras"], "concurrencias": c["concurrencias"],
+            "peticiones": c["peticiones"], "semilla": semilla,
+        }, env={"RESPUESTAS_CACHE_MAX": "0"})
+
+    return resultado
+
+
+def imprimir_resultado(resultado):
+    print("=" * 60)
+    for fila in resultado.get("generacion", []):
+        print(f"⏱️ generar vocab {fila['vocabulario']:>4} ({fila['inferencia']}), prompt {fila['largo_prompt']:>2} palabras: "
+              f"p50 {fila['p50_ms']:.2f} ms | p99 {fila['p99_ms']:.2f} ms | {fila['us_por_token']:.0f} µs/token")
+    for fila in resultado.get("entrenamiento", []):
+        print(f"🏋️ {fila['pares']:>5} pares: {fila['tokens_s']} tokens/s | {fila['s_por_epoca']:.3f} s/época "
+              f"| preparación {fila['preparacion_s']} s")
+    for fila in resultado.get("chat", []):
+        print(f"💬 /chat x{fila['concurrencia']:<3}: {fila['rps']} pet/s | p50 {fila['p50_ms']:.1f} ms | "
+              f"p99 {fila['p99_ms']:.1f} ms | lote medio {fila['lote_medio']} | errores {fila['errores']}")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks de generación, entrenamiento y /chat")
+    parser.add_argument("--rapido", action="store_true", help="tamaños pequeños")
+    parser.add_argument("--solo", default="generacion,entrenamiento,chat", help="grupos separados por comas")
+    parser.add_argument("--salida", help="archivo JSON (por defecto benchmarks/resultados/<fecha>.json)")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior para detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--vocab", type=_lista, help="TOKENIZER_VOCAB_MAX de generación, p. ej. 250,1000,2000")
+    parser.add_argument("--largos", type=_lista, help="palabras por prompt, p. ej. 1,4,8,16")
+    parser.add_argument("--pares-entrenamiento", type=_lista, help="tamaños del corpus, p. ej. 500,2000,8000")
+    parser.add_argument("--concurrencia", type=_lista, help="peticiones en vuelo, p. ej. 1,8,32")
+    parser.add_argument("--peticiones", type=int, help="peticiones por nivel de concurrencia")
+    args = parser.parse_args()
+
+    config = json.loads(json.dumps(RAPIDO if args.rapido else COMPLETO))
+    for valor, grupo, clave in ((args.vocab, "generacion", "vocab_max"), (args.largos, "generacion", "largos"),
+                                (args.pares_entrenamiento, "entrenamiento", "pares"),
+                                (args.concurrencia, "chat", "concurrencias"), (args.peticiones, "chat", "peticiones")):
+        if valor is not None:
+            config[grupo][clave] = valor
+    grupos = [g for g in args.solo.split(",") if g in config]
+
+    resultado = correr(config, grupos, args.semilla)
+    imprimir_resultado(resultado)
+
+    salida = args.salida
+    if salida is None:
+        os.makedirs(DIRECTORIO, exist_ok=True)
+        salida = os.path.join(DIRECTORIO, datetime.datetime.now().strftime("%Y%m%d_%H%M%S") + ".json")
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"💾 Resultado en {salida}")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            anterior = json.load(f)
+        if imprimir(comparar(anterior, resultado, args.tolerancia), args.tolerancia):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/chat.py - Throughput de /chat de punta a punta con clientes concurrentes
+import asyncio
+import collections
+import time
+
+from benchmarks.corpus import poblar, preparar_modelo
+from benchmarks.entorno import caso, percentiles
+
+
+async def _carga(aplicacion, prompts, concurrencia):
+    """Enviar todos los prompts con `concurrencia` peticiones en vuelo como máximo"""
+    import httpx
+
+    tiempos = []
+    codigos = collections.Counter()
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=aplicacion), base_url="http://bench",
+                                 timeout=60) as cliente:
+        async def una(prompt):
+            async with semaforo:
+                inicio = time.perf_counter()
+                respuesta = await cliente.post("/chat", json={"message": prompt})
+                tiempos.append(time.perf_counter() - inicio)
+                codigos[respuesta.status_code] += 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(una(prompt) for prompt in prompts))
+        duracion = time.perf_counter() - inicio
+
+    return tiempos, codigos, duracion
+
+
+def medir(pares, palabras, concurrencias, peticiones, semilla=0):
+    """
+    El servidor completo en este proceso (startup, worker de inferencia por lotes,
+    escritor de conversaciones) con un cliente ASGI en memoria, sin red
+    - Necesita httpx (no está en requirements.txt: solo hace falta para medir)
+    - Sin autoentrenamiento durante la medición: el umbral de pendientes se anula
+    - La caché de respuestas se controla con RESPUESTAS_CACHE_MAX (0 por defecto aquí)
+    """
+    corpus = poblar(pares, palabras, semilla)
+    preparar_modelo()
+
+    import app
+    from auto_train import pendientes
+
+    pendientes.umbral = float("inf")
+    app.startup_event()
+    while app.estado_motor() not in ("listo", "sin_modelo", "error"):
+        time.sleep(0.05)
+    if app.estado_motor() != "listo":
+        raise RuntimeError(f"El motor no arrancó: {app.estado_motor()} {app.arranque['error']}")
+
+    resultados = []
+    try:
+        for concurrencia in concurrencias:
+            prompts = [corpus.frase(corpus.azar.randint(1, 6)) for _ in range(peticiones)]
+            asyncio.run(_carga(app.app, prompts[:concurrencia * 2], concurrencia))  # Calentamiento
+            antes = app.inferencia.metricas()
+            tiempos, codigos, duracion = asyncio.run(_carga(app.app, prompts, concurrencia))
+            despues = app.inferencia.metricas()
+            lotes = despues["lotes"] - antes["lotes"]
+            resultados.append({
+                "concurrencia": concurrencia,
+                "peticiones": peticiones,
+                "rps": round(codigos[200] / duracion, 1),
+                **percentiles(tiempos),
+                "errores": sum(cantidad for codigo, cantidad in codigos.items() if codigo != 200),
+                "lote_medio": round((despues["peticiones"] - antes["peticiones"]) / max(lotes, 1), 2),
+            })
+    finally:
+        app.shutdown_event()
+    return resultados
+
+
+if __name__ == "__main__":
+    caso(medir)
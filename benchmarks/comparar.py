@@ -0,0 +1,74 @@
+# benchmarks/comparar.py - Detectar regresiones entre dos resultados de benchmarks
+import json
+import sys
+
+# Parámetros que identifican cada caso dentro de su grupo
+PARAMETROS = {
+    "generacion": ("vocab_max", "largo_prompt"),
+    "entrenamiento": ("pares",),
+    "chat": ("concurrencia",),
+}
+# Métricas comparadas: "menor" o "mayor" es mejor
+METRICAS = {
+    "p50_ms": "menor",
+    "p99_ms": "menor",
+    "us_por_token": "menor",
+    "s_por_epoca": "menor",
+    "tokens_s": "mayor",
+    "rps": "mayor",
+}
+# Empeoramiento relativo a partir del cual se marca una regresión
+TOLERANCIA = 0.15
+
+
+def _casos(resultado):
+    for grupo, claves in PARAMETROS.items():
+        for fila in resultado.get(grupo, []):
+            yield (grupo,) + tuple(fila.get(clave) for clave in claves), fila
+
+
+def comparar(anterior, actual, tolerancia=TOLERANCIA):
+    """Lista de diferencias [{caso, metrica, anterior, actual, cambio, regresion}] de los casos comunes"""
+    previos = dict(_casos(anterior))
+    diferencias = []
+    for caso, fila in _casos(actual):
+        previa = previos.get(caso)
+        if previa is None:
+            continue
+        for metrica, mejor in METRICAS.items():
+            if metrica not in fila or not previa.get(metrica):
+                continue
+            cambio = (fila[metrica] - previa[metrica]) / previa[metrica]
+            empeora = cambio if mejor == "menor" else -cambio
+            diferencias.append({
+                "caso": caso,
+                "metrica": metrica,
+                "anterior": previa[metrica],
+                "actual": fila[metrica],
+                "cambio": round(cambio, 4),
+                "regresion": empeora > tolerancia,
+            })
+    return diferencias
+
+
+def imprimir(diferencias, tolerancia=TOLERANCIA):
+    regresiones = [d for d in diferencias if d["regresion"]]
+    for d in diferencias:
+        marca = "❌" if d["regresion"] else "  "
+        print(f"{marca} {' '.join(map(str, d['caso'])):<28} {d['metrica']:<14} "
+              f"{d['anterior']:>12} → {d['actual']:<12} ({d['cambio']:+.1%})")
+    if regresiones:
+        print(f"⚠️ {len(regresiones)} regresiones de más del {tolerancia:.0%}")
+    else:
+        print(f"✅ Sin regresiones de más del {tolerancia:.0%} ({len(diferencias)} métricas comparadas)")
+    return regresiones
+
+
+if __name__ == "__main__":
+    # python -m benchmarks.comparar anterior.json nuevo.json [tolerancia]
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        anterior = json.load(f)
+    with open(sys.argv[2], "r", encoding="utf-8") as f:
+        actual = json.load(f)
+    tolerancia = float(sys.argv[3]) if len(sys.argv) > 3 else TOLERANCIA
+    exit(1 if imprimir(comparar(anterior, actual, tolerancia), tolerancia) else 0)
@@ -0,0 +1,53 @@
+# benchmarks/corpus.py - Corpus sintético reproducible y modelo mínimo sobre él
+import random
+
+SILABAS = [c + v for c in "bcdfglmnprstv" for v in "aeiou"] + list("aeiou")
+
+
+def vocabulario(palabras, semilla=0):
+    """`palabras` palabras distintas de 1 a 4 sílabas (siempre las mismas para una semilla)"""
+    azar = random.Random(semilla)
+    vistas = set()
+    while len(vistas) < palabras:
+        vistas.add("".join(azar.choices(SILABAS, k=azar.randint(1, 4))))
+    return sorted(vistas)
+
+
+class CorpusSintetico:
+    """
+    Pares pregunta-respuesta de 1 a 6 palabras, con frecuencias tipo Zipf
+    (unas pocas palabras muy comunes y una cola larga, como un chat real)
+    """
+    def __init__(self, palabras, semilla=0):
+        self.palabras = vocabulario(palabras, semilla)
+        self.pesos = [1 / (rango + 1) for rango in range(len(self.palabras))]
+        self.azar = random.Random(semilla + 1)
+
+    def frase(self, largo):
+        return " ".join(self.azar.choices(self.palabras, weights=self.pesos, k=largo))
+
+    def pares(self, n, max_palabras=6):
+        return [(self.frase(self.azar.randint(1, max_palabras)), self.frase(self.azar.randint(1, max_palabras)))
+                for _ in range(n)]
+
+    def prompts(self, n, largo):
+        return [self.frase(largo) for _ in range(n)]
+
+
+def poblar(pares, palabras, semilla=0):
+    """Llenar el corpus del almacén (del directorio actual) con `pares` pares sintéticos"""
+    from conversation_store import store, DATASET
+
+    sintetico = CorpusSintetico(palabras, semilla)
+    store.agregar(sintetico.pares(pares), estado=DATASET, origen="benchmark")
+    return sintetico
+
+
+def preparar_modelo(epocas=1):
+    """Entrenar y exportar un modelo sobre el corpus actual (lo que sirve el servidor)"""
+    from train import entrenar
+    from export_model import exportar
+
+    resumen = entrenar(epochs=epocas, modo="completo")
+    exportar()
+    return resumen
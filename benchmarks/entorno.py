@@ -0,0 +1,69 @@
+# benchmarks/entorno.py - Ejecutar cada caso aislado y resumir tiempos
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentiles(tiempos):
+    """p50/p99/media en milisegundos de una lista de segundos"""
+    ordenados = sorted(tiempos)
+    p99 = ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.99))]
+    return {
+        "p50_ms": round(statistics.median(ordenados) * 1000, 3),
+        "p99_ms": round(p99 * 1000, 3),
+        "media_ms": round(statistics.fmean(ordenados) * 1000, 3),
+    }
+
+
+def ejecutar(modulo, parametros, env=None, timeout=1800):
+    """
+    Correr benchmarks.<modulo> en un proceso nuevo con un directorio de trabajo vacío
+    - Todas las rutas del proyecto son relativas (conversaciones.db, corpus/,
+      checkpoints/, vocab.json...): así cada caso tiene las suyas
+    - env: variables que se leen al importar (TOKENIZER_VOCAB_MAX...)
+    - La salida del proceso va a un log que se muestra si el caso falla
+    """
+    directorio = tempfile.mkdtemp(prefix=f"bench-{modulo}-")
+    ruta_resultado = os.path.join(directorio, "resultado.json")
+    entorno = dict(os.environ, PYTHONPATH=RAIZ, PYTHONHASHSEED="0", **(env or {}))
+
+    inicio = time.time()
+    try:
+        with open(os.path.join(directorio, "salida.log"), "w", encoding="utf-8") as log:
+            proceso = subprocess.run(
+                [sys.executable, "-m", f"benchmarks.{modulo}", json.dumps(parametros), ruta_resultado],
+                cwd=directorio, env=entorno, stdout=log, stderr=subprocess.STDOUT, timeout=timeout,
+            )
+        if proceso.returncode != 0 or not os.path.exists(ruta_resultado):
+            with open(os.path.join(directorio, "salida.log"), "r", encoding="utf-8") as log:
+                cola = log.read()[-4000:]
+            raise RuntimeError(f"benchmarks.{modulo} {parametros} terminó con código {proceso.returncode}:\n{cola}")
+        with open(ruta_resultado, "r", encoding="utf-8") as f:
+            resultado = json.load(f)
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    print(f"  {modulo} {parametros}: {time.time() - inicio:.1f} s")
+    return resultado
+
+
+def caso(medir):
+    """Punto de entrada de un módulo de benchmark: python -m benchmarks.x '<json>' salida.json"""
+    import random
+    import torch
+
+    parametros = json.loads(sys.argv[1])
+    semilla = parametros.get("semilla", 0)
+    random.seed(semilla)
+    torch.manual_seed(semilla)
+
+    resultado = medir(**parametros)
+    with open(sys.argv[2], "w", encoding="utf-8") as f:
+        json.dump(resultado, f)
@@ -0,0 +1,57 @@
+# benchmarks/entrenamiento.py - Throughput de las épocas de train.py según el tamaño del corpus
+import time
+
+import torch
+from benchmarks.corpus import poblar
+from benchmarks.entorno import caso
+
+
+def medir(pares, palabras, epocas, hilos=0, semilla=0):
+    """
+    Entrenamiento completo desde cero sobre `pares` pares sintéticos
+    - preparacion_s: tokenizador BPE y corpus pre-tokenizado (solo la primera vez)
+    - tokens_s y s_por_epoca se miden entre los eventos de la primera y la última
+      época: sin la preparación, la primera época ni el guardado del checkpoint
+    """
+    from corpus_cache import corpus
+    from train import entrenar, crear_lotes, BATCH_SIZE
+
+    if hilos:
+        torch.set_num_threads(hilos)
+    poblar(pares, palabras, semilla)
+
+    epocas_vistas = {}
+
+    def progreso(evento):
+        if evento.get("tipo") == "epoca":
+            epocas_vistas[evento["epoca"]] = time.perf_counter()
+
+    inicio = time.perf_counter()
+    resumen = entrenar(epochs=epocas, modo="completo", tiempo_max=float("inf"), progreso=progreso)
+    total = time.perf_counter() - inicio
+
+    tokens, offsets, _ = corpus.cargar()
+    tokens_por_epoca = sum(t for _, _, _, t in crear_lotes(tokens, offsets, BATCH_SIZE))
+    # train.py emite una época de cada 10 y la última: hacen falta al menos dos
+    primera, ultima = min(epocas_vistas), max(epocas_vistas)
+    if ultima == primera:
+        raise ValueError(f"Hacen falta al menos 2 épocas para medir (se pidieron {epocas})")
+    medido = epocas_vistas[ultima] - epocas_vistas[primera]
+
+    return {
+        "pares": pares,
+        "epocas": resumen["epocas"],
+        "epocas_medidas": ultima - primera,
+        "vocabulario": resumen["vocabulario"],
+        "tokens_por_epoca": tokens_por_epoca,
+        "tokens_s": round(tokens_por_epoca * (ultima - primera) / medido),
+        "s_por_epoca": round(medido / (ultima - primera), 4),
+        "preparacion_s": round(total - resumen["segundos"], 2),
+        "total_s": round(total, 2),
+        "loss": resumen["loss"],
+        "hilos_torch": torch.get_num_threads(),
+    }
+
+
+if __name__ == "__main__":
+    caso(medir)
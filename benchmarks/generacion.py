@@ -0,0 +1,55 @@
+# benchmarks/generacion.py - Latencia de generar() según vocabulario y largo del prompt
+import statistics
+import time
+
+import torch
+from benchmarks.corpus import poblar, preparar_modelo
+from benchmarks.entorno import caso, percentiles
+
+
+def medir(vocab_max, pares, palabras, largos, repeticiones, hilos=1, semilla=0):
+    """
+    Un modelo recién entrenado (1 época) y exportado sobre un corpus sintético;
+    después generar() para cada largo de prompt
+    - vocab_max llega como TOKENIZER_VOCAB_MAX (se lee al importar el tokenizador)
+    - Sin caché de estados: cada prompt se codifica entero
+    - La longitud de las respuestas depende del modelo: us_por_token normaliza
+    """
+    import generate
+    from metrics import TOKENS_GENERADOS
+
+    torch.set_num_threads(hilos)
+    corpus = poblar(pares, palabras, semilla)
+    preparar_modelo()
+    activo = generate.registro.cargar()
+    generate.estados.max_bytes = 0
+
+    resultados = []
+    for largo in largos:
+        prompts = corpus.prompts(repeticiones, largo)
+        for prompt in prompts[:10]:
+            generate.generar(prompt)  # Calentamiento
+
+        tiempos = []
+        antes = TOKENS_GENERADOS.valor()
+        for prompt in prompts:
+            inicio = time.perf_counter()
+            generate.generar(prompt)
+            tiempos.append(time.perf_counter() - inicio)
+        generados = TOKENS_GENERADOS.valor() - antes
+
+        resultados.append({
+            "vocab_max": vocab_max,
+            "largo_prompt": largo,
+            "vocabulario": len(activo.tokenizer),
+            "inferencia": activo.inferencia,
+            "subpalabras_prompt": round(statistics.fmean(len(activo.tokenizer.encode(p)) for p in prompts), 2),
+            **percentiles(tiempos),
+            "tokens_por_respuesta": round(generados / len(prompts), 2),
+            "us_por_token": round(sum(tiempos) / max(generados, 1) * 1e6, 1),
+        })
+    return resultados
+
+
+if __name__ == "__main__":
+    caso(medir)
@@ -1,20 +1,10 @@
-def build_dataset():
-    with open("data.txt", "a", encoding="utf-8") as base, \
-         open("chat_logs.txt", "r", encoding="utf-8") as logs:
-        
-        lines = [l.strip() for l in logs if l.strip()]  # Filtrar líneas vacías
-        
-        i = 0
-        while i < len(lines) - 1:
-            if lines[i].startswith("usuario:") and lines[i + 1].startswith("ia:"):
-                pregunta = lines[i].replace("usuario:", "").strip()
-                respuesta = lines[i + 1].replace("ia:", "").strip()
-                
-                if pregunta and respuesta:  # Solo si no están vacías
-                    base.write(pregunta + "\n")
-                    base.write(respuesta + "\n")
-                    i += 2
-                else:
-                    i += 1
-            else:
-                i += 1  # Saltar línea mal formada
\ No newline at end of file
+from conversation_store import store
+
+def build_dataset(hasta_id=None):
+    """Pasar las conversaciones pendientes al corpus de entrenamiento; devuelve cuántas se añadieron"""
+    # Antes se copiaban los pares usuario/ia de chat_logs.txt a data.txt;
+    # ahora es un UPDATE indexado sobre el almacén de conversaciones
+    return store.mover_a_dataset(hasta_id)
+
+if __name__ == "__main__":
+    print(f"Pares añadidos al corpus: {build_dataset()}")
\ No newline at end of file
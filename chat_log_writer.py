@@ -0,0 +1,103 @@
+# chat_log_writer.py - Registro de conversaciones por lotes en segundo plano
+import os
+import threading
+from contextlib import contextmanager
+
+from metrics import ETAPAS
+
+# Umbrales de vaciado: número de conversaciones en memoria o segundos
+MAX_REGISTROS = int(os.environ.get("CHAT_LOG_MAX_REGISTROS", "64"))
+INTERVALO_S = float(os.environ.get("CHAT_LOG_INTERVALO_S", "0.5"))
+
+
+class ChatLogWriter:
+    """
+    Escritor de solo-añadir para las conversaciones del chat
+    - registrar() guarda la conversación en memoria (no toca disco)
+    - Un hilo vacía el buffer al llegar a MAX_REGISTROS o cada INTERVALO_S,
+      insertando todo el lote en el almacén en una sola transacción
+    - Cada conversación es un registro (pregunta, respuesta) completo, así
+      dos peticiones concurrentes nunca se mezclan
+    - al_escribir recibe los pares que se guardaron (para contadores y estadísticas)
+    """
+    def __init__(self, store, max_registros=MAX_REGISTROS,
+                 intervalo=INTERVALO_S, al_escribir=None):
+        self.store = store
+        self.max_registros = max(1, max_registros)
+        self.intervalo = intervalo
+        self.al_escribir = al_escribir
+        self.buffer = []
+        self.lock = threading.Lock()
+        # Un solo lote hacia el almacén a la vez (y exclusivo() lo retiene)
+        self.lock_lote = threading.RLock()
+        self.despertar = threading.Event()
+        self.parar = threading.Event()
+        self.hilo = None
+
+    @staticmethod
+    def _una_linea(texto):
+        # Los textos se guardan en una sola línea, como en el formato usuario:/ia:
+        return " ".join(texto.split())
+
+    def registrar(self, usuario, ia):
+        """Encolar una conversación para guardarla en el próximo vaciado"""
+        par = (self._una_linea(usuario), self._una_linea(ia))
+        with self.lock:
+            self.buffer.append(par)
+            lleno = len(self.buffer) >= self.max_registros
+        if lleno:
+            self.despertar.set()
+
+    def pendientes(self):
+        with self.lock:
+            return len(self.buffer)
+
+    def vaciar(self):
+        """Guardar ahora todo lo que haya en memoria"""
+        with self.lock_lote:
+            with self.lock:
+                pares, self.buffer = self.buffer, []
+            if not pares:
+                return 0
+
+            try:
+                with ETAPAS.medir(etapa="volcado"):
+                    self.store.agregar(pares)
+            except Exception as e:
+                # Devolver los pares al buffer para reintentar en el próximo vaciado
+                with self.lock:
+                    self.buffer[:0] = pares
+                print(f"Error guardando conversaciones: {e}")
+                return 0
+
+        if self.al_escribir:
+            self.al_escribir(pares)
+        return len(pares)
+
+    @contextmanager
+    def exclusivo(self):
+        """Vaciar el buffer y retener la escritura mientras otro código modifica las pendientes"""
+        with self.lock_lote:
+            self.vaciar()
+            yield
+
+    def iniciar(self):
+        if self.hilo is not None and self.hilo.is_alive():
+            return
+        self.parar.clear()
+        self.hilo = threading.Thread(target=self._bucle, name="chat-log-writer", daemon=True)
+        self.hilo.start()
+
+    def detener(self):
+        """Parar el hilo y escribir lo pendiente (apagado del servidor)"""
+        self.parar.set()
+        self.despertar.set()
+        if self.hilo is not None:
+            self.hilo.join(timeout=5)
+        self.vaciar()
+
+    def _bucle(self):
+        while not self.parar.is_set():
+            self.despertar.wait(self.intervalo)
+            self.despertar.clear()
+            self.vaciar()
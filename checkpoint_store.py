@@ -0,0 +1,230 @@
+# checkpoint_store.py - Checkpoints versionados: pesos mapeables, vocabulario y manifiesto
+import datetime
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from tokenizer import Tokenizer
+
+DIRECTORIO = os.environ.get("CHECKPOINTS_DIR", "checkpoints")
+# Versiones que se conservan para poder volver atrás (la activa nunca se borra)
+CONSERVAR = int(os.environ.get("CHECKPOINTS_CONSERVAR", "3"))
+# Checkpoint de un solo archivo anterior a este formato (se sigue pudiendo leer)
+LEGADO = "model.pth"
+
+FORMATO = 1
+PESOS = "pesos.pt"
+VOCAB = "vocab.json"
+MANIFIESTO = "manifest.json"
+ACTUAL = "ACTUAL"
+
+
+def _sha1_archivo(ruta):
+    sha1 = hashlib.sha1()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(bloque)
+    return sha1.hexdigest()
+
+
+class CheckpointStore:
+    """
+    Checkpoints del modelo, uno por directorio: checkpoints/v000001/, v000002/...
+    - pesos.pt: solo tensores (state_dict); se lee con weights_only=True y mmap=True,
+      sin unpickle de objetos arbitrarios y sin copiar el archivo a memoria
+    - vocab.json: estado del tokenizador (stoi/itos se reconstruyen de él)
+    - manifest.json: versión (hash de los pesos), vocabulario, último par visto...
+    - guardar() escribe en un directorio temporal, lo renombra y después cambia
+      ACTUAL con os.replace: un lector nunca ve un checkpoint a medias
+    - Se conservan las últimas CONSERVAR versiones; activar() vuelve a una anterior
+    - torch solo se importa al leer o escribir pesos: consultar el almacén
+      (el servidor mientras arranca) no lo necesita
+    """
+    def __init__(self, directorio=DIRECTORIO, conservar=CONSERVAR, legado=LEGADO):
+        self.directorio = directorio
+        self.conservar = max(1, conservar)
+        self.legado = legado
+        self.ruta_actual = os.path.join(directorio, ACTUAL)
+
+    def _ruta(self, nombre, archivo=""):
+        return os.path.join(self.directorio, nombre, archivo)
+
+    def _leer_json(self, ruta):
+        with open(ruta, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _escribir_actual(self, nombre):
+        temporal = self.ruta_actual + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            f.write(nombre)
+        os.replace(temporal, self.ruta_actual)
+
+    def nombre_actual(self):
+        """Directorio de la versión activa, o None si no hay checkpoint en este formato"""
+        try:
+            with open(self.ruta_actual, "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def nombres(self):
+        """Versiones guardadas, de la más antigua a la más nueva"""
+        try:
+            return sorted(n for n in os.listdir(self.directorio)
+                          if n.startswith("v") and os.path.exists(self._ruta(n, MANIFIESTO)))
+        except FileNotFoundError:
+            return []
+
+    def existe(self):
+        return self.nombre_actual() is not None or os.path.exists(self.legado)
+
+    def firma(self):
+        """Cambia cuando se activa otra versión (para la vigilancia del registro)"""
+        for ruta in (self.ruta_actual, self.legado):
+            try:
+                return ruta, os.stat(ruta).st_mtime_ns
+            except FileNotFoundError:
+                pass
+        return None
+
+    def manifiesto(self, nombre=None):
+        nombre = nombre or self.nombre_actual()
+        if nombre is None:
+            return None
+        return self._leer_json(self._ruta(nombre, MANIFIESTO))
+
+    def versiones(self):
+        activa = self.nombre_actual()
+        return [dict(self.manifiesto(n), activa=n == activa) for n in self.nombres()]
+
+    def tamano(self, nombre=None):
+        """Bytes de la versión activa o `nombre` (o del checkpoint antiguo)"""
+        nombre = nombre or self.nombre_actual()
+        if nombre is None or nombre == self.legado:
+            return os.path.getsize(self.legado) if os.path.exists(self.legado) else 0
+        return sum(datos["bytes"] for datos in self.manifiesto(nombre)["archivos"].values())
+
+    def guardar(self, model_state, tokenizer_estado, **extra):
+        """Publicar una versión nueva y activarla; devuelve su manifiesto"""
+        import torch
+        os.makedirs(self.directorio, exist_ok=True)
+        nombres = self.nombres()
+        siguiente = int(nombres[-1][1:]) + 1 if nombres else 1
+        nombre = f"v{siguiente:06d}"
+
+        temporal = tempfile.mkdtemp(prefix=".tmp-", dir=self.directorio)
+        try:
+            torch.save(model_state, os.path.join(temporal, PESOS))
+            with open(os.path.join(temporal, VOCAB), "w", encoding="utf-8") as f:
+                json.dump(tokenizer_estado, f, ensure_ascii=False, separators=(",", ":"))
+
+            archivos = {
+                archivo: {"bytes": os.path.getsize(os.path.join(temporal, archivo)),
+                          "sha1": _sha1_archivo(os.path.join(temporal, archivo))}
+                for archivo in (PESOS, VOCAB)
+            }
+            manifiesto = {
+                "formato": FORMATO,
+                "nombre": nombre,
+                "version": archivos[PESOS]["sha1"][:12],
+                "creado_en": datetime.datetime.now().isoformat(),
+                "vocab_size": len(tokenizer_estado["tokens"]),
+                "tokenizador": tokenizer_estado.get("modo", "bpe"),
+                "archivos": archivos,
+                **extra,
+            }
+            with open(os.path.join(temporal, MANIFIESTO), "w", encoding="utf-8") as f:
+                json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+
+            os.rename(temporal, self._ruta(nombre))
+        except Exception:
+            shutil.rmtree(temporal, ignore_errors=True)
+            raise
+
+        self._escribir_actual(nombre)
+        self._podar()
+        return manifiesto
+
+    def _podar(self):
+        """Borrar las versiones más antiguas por encima de CONSERVAR"""
+        nombres = self.nombres()
+        conservadas = set(nombres[-self.conservar:]) | {self.nombre_actual()}
+        for nombre in nombres:
+            if nombre not in conservadas:
+                # Un lector con los pesos mapeados los sigue viendo hasta soltarlos
+                shutil.rmtree(self._ruta(nombre), ignore_errors=True)
+
+    def activar(self, nombre):
+        """Volver a una versión guardada (rollback)"""
+        if nombre not in self.nombres():
+            raise FileNotFoundError(f"No existe la versión {nombre}")
+        self._escribir_actual(nombre)
+        return self.manifiesto(nombre)
+
+    def borrar(self):
+        """Eliminar todas las versiones y el checkpoint antiguo"""
+        shutil.rmtree(self.directorio, ignore_errors=True)
+        if os.path.exists(self.legado):
+            os.remove(self.legado)
+
+    def cargar(self, nombre=None):
+        """
+        Checkpoint como dict {manifest, model_state_dict, tokenizer}, o None si no hay
+        - Los tensores quedan mapeados sobre pesos.pt (solo lectura, sin copia);
+          para entrenar sobre ellos hay que copiarlos (load_state_dict normal)
+        """
+        import torch
+        nombre = nombre or self.nombre_actual()
+        if nombre is None:
+            return self._cargar_legado()
+
+        manifiesto = self.manifiesto(nombre)
+        if manifiesto.get("formato", FORMATO) > FORMATO:
+            raise ValueError(f"Checkpoint {nombre} en un formato más nuevo ({manifiesto['formato']})")
+        pesos = torch.load(self._ruta(nombre, PESOS), map_location="cpu", weights_only=True, mmap=True)
+        return {
+            "manifest": manifiesto,
+            "model_state_dict": pesos,
+            "tokenizer": self._leer_json(self._ruta(nombre, VOCAB)),
+        }
+
+    def _cargar_legado(self):
+        """model.pth de un solo archivo (dict o tupla pickleados)"""
+        import torch
+        if not os.path.exists(self.legado):
+            return None
+        with open(self.legado, "rb") as f:
+            datos = f.read()
+        # Tensores, dicts y tuplas con stoi/itos: también se lee sin unpickle de objetos arbitrarios
+        checkpoint = torch.load(io.BytesIO(datos), map_location="cpu", weights_only=True)
+
+        # Formato antiguo (tupla)
+        if isinstance(checkpoint, tuple) and len(checkpoint) == 3:
+            model_state, stoi, itos = checkpoint
+            checkpoint = {'model_state_dict': model_state, 'stoi': stoi, 'itos': itos}
+        if not isinstance(checkpoint, dict) or 'stoi' not in checkpoint:
+            raise ValueError("Formato de modelo no reconocido")
+
+        # Checkpoints de vocabulario por palabras (anteriores al tokenizador BPE)
+        tokenizer = checkpoint.get('tokenizer')
+        if tokenizer is None:
+            tokenizer = Tokenizer.por_palabras(checkpoint['stoi']).estado()
+
+        return {
+            "manifest": {
+                "formato": 0,
+                "nombre": self.legado,
+                "version": hashlib.sha1(datos).hexdigest()[:12],
+                "vocab_size": len(tokenizer["tokens"]),
+                "tokenizador": tokenizer.get("modo", "bpe"),
+                "ultimo_id": checkpoint.get('ultimo_id'),
+            },
+            "model_state_dict": checkpoint['model_state_dict'],
+            "tokenizer": tokenizer,
+        }
+
+
+checkpoints = CheckpointStore()
@@ -0,0 +1,146 @@
+# compare_models.py - Modelo fp32 frente al artefacto int8: latencia, tamaño y concordancia
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import torch
+from model import NeuralChat
+from tokenizer import Tokenizer
+from conversation_store import store, DATASET
+from checkpoint_store import checkpoints
+from export_model import INFERENCIA_PATH, exportar, cargar_artefacto
+
+PROMPTS_DEFECTO = ["hola", "como estas", "que haces", "bien", "adios"]
+MAX_PROMPTS = 200
+PASOS = 12  # Tokens generados por prompt en la decodificación voraz
+REPETICIONES = 200  # Pasos cronometrados por tamaño de lote
+
+
+def cargar_fp32(almacen, nombre=None):
+    """Modelo tal como se sirve sin artefacto, tokenizador y manifiesto del checkpoint"""
+    checkpoint = almacen.cargar(nombre)
+    if checkpoint is None:
+        raise FileNotFoundError(f"No hay checkpoint en {almacen.directorio}")
+    tokenizer = Tokenizer.desde_estado(checkpoint['tokenizer'])
+
+    model = NeuralChat(len(tokenizer))
+    model.load_state_dict(checkpoint['model_state_dict'])
+    model.eval()
+    return model, tokenizer, checkpoint['manifest']
+
+
+def voraz(model, ids, pasos=PASOS):
+    """Decodificación sin muestreo (argmax) para comparar salidas de forma determinista"""
+    logits, h = model.paso(torch.tensor([ids]))
+    salida = []
+    for _ in range(pasos):
+        siguiente = int(logits[0].argmax())
+        salida.append(siguiente)
+        logits, h = model.paso(torch.tensor([[siguiente]]), h=h)
+    return salida
+
+
+def cronometrar_paso(model, vocab_size, lote, repeticiones=REPETICIONES):
+    """Mediana en microsegundos de un paso incremental con `lote` filas"""
+    hidden = model.rnn.hidden_size
+    capas = model.rnn.num_layers
+    x = torch.randint(0, vocab_size, (lote, 1))
+    h = torch.zeros(capas, lote, hidden)
+    for _ in range(10):
+        model.paso(x, h=h)
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        model.paso(x, h=h)
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos) * 1e6
+
+
+def comparar(nombre=None, ruta_artefacto=INFERENCIA_PATH, almacen=None):
+    almacen = almacen or checkpoints
+    fp32, tokenizer, manifiesto = cargar_fp32(almacen, nombre)
+    version = manifiesto['version']
+    vocab_size = len(tokenizer)
+
+    temporal = None
+    int8 = cargar_artefacto(version, vocab_size, ruta_artefacto, compilar=False)
+    if int8 is None:
+        # Sin artefacto (o de otro checkpoint): exportar uno temporal para medir
+        temporal = ruta_artefacto = os.path.join(tempfile.mkdtemp(), "model_int8.pt")
+        exportar(almacen, ruta_artefacto, nombre=manifiesto['nombre'])
+        int8 = cargar_artefacto(version, vocab_size, ruta_artefacto, compilar=False)
+
+    prompts = [p for _, p, _ in store.pares(DATASET, limite=MAX_PROMPTS)] or PROMPTS_DEFECTO
+    secuencias = [ids for ids in tokenizer.encode_lote(prompts) if ids]
+
+    resultado = {
+        "version": version,
+        "vocabulario": vocab_size,
+        "prompts": len(secuencias),
+        "bytes": {"fp32": almacen.tamano(manifiesto['nombre']), "int8": os.path.getsize(ruta_artefacto)},
+        "paso_us": {},
+        "prompt_ms_p50": {},
+    }
+
+    with torch.inference_mode():
+        for nombre, model in (("fp32", fp32), ("int8", int8)):
+            resultado["paso_us"][nombre] = {
+                lote: round(cronometrar_paso(model, vocab_size, lote), 1) for lote in (1, 16)
+            }
+
+        # Latencia por prompt completo (codificar + PASOS tokens) y salidas voraces
+        salidas = {}
+        for nombre, model in (("fp32", fp32), ("int8", int8)):
+            tiempos = []
+            salidas[nombre] = []
+            for ids in secuencias:
+                inicio = time.perf_counter()
+                salidas[nombre].append(voraz(model, ids))
+                tiempos.append(time.perf_counter() - inicio)
+            resultado["prompt_ms_p50"][nombre] = round(statistics.median(tiempos) * 1000, 3)
+
+        # Concordancia del siguiente token con el prompt como contexto (teacher forcing)
+        coinciden = total = 0
+        dif_max = 0.0
+        for ids in secuencias:
+            x = torch.tensor([ids])
+            a, b = fp32(x)[0], int8(x)[0]
+            coinciden += int((a.argmax(-1) == b.argmax(-1)).sum())
+            total += len(ids)
+            dif_max = max(dif_max, float((a - b).abs().max()))
+
+    iguales = sum(s == t for s, t in zip(salidas["fp32"], salidas["int8"]))
+    resultado["concordancia"] = {
+        "top1": round(coinciden / max(total, 1), 4),
+        "voraz_identica": round(iguales / max(len(secuencias), 1), 4),
+        "logits_dif_max": round(dif_max, 4),
+    }
+
+    if temporal:
+        os.remove(temporal)
+        os.rmdir(os.path.dirname(temporal))
+    return resultado
+
+
+def imprimir(resultado):
+    print("=" * 60)
+    print(f"🔬 Modelo {resultado['version']} ({resultado['vocabulario']} tokens, {resultado['prompts']} prompts)")
+    bytes_ = resultado["bytes"]
+    print(f"💾 Tamaño: fp32 {bytes_['fp32'] / 1024:.0f} KB | int8 {bytes_['int8'] / 1024:.0f} KB "
+          f"(x{bytes_['fp32'] / max(bytes_['int8'], 1):.2f})")
+    for lote in (1, 16):
+        a, b = resultado["paso_us"]["fp32"][lote], resultado["paso_us"]["int8"][lote]
+        print(f"⚡ Paso lote {lote:>2}: fp32 {a:.0f} µs | int8 {b:.0f} µs (x{a / max(b, 1e-9):.2f})")
+    a, b = resultado["prompt_ms_p50"]["fp32"], resultado["prompt_ms_p50"]["int8"]
+    print(f"⏱️ Prompt + {PASOS} tokens (p50): fp32 {a:.2f} ms | int8 {b:.2f} ms")
+    concordancia = resultado["concordancia"]
+    print(f"🎯 Top-1 igual: {concordancia['top1']:.1%} | salida voraz idéntica: "
+          f"{concordancia['voraz_identica']:.1%} | máx. dif. logits: {concordancia['logits_dif_max']}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    # python compare_models.py [versión, p. ej. v000003] [model_int8.pt]
+    imprimir(comparar(*sys.argv[1:3]))
@@ -0,0 +1,3 @@
+# conftest.py - Configuración de pytest
+# test_auto.py es un script (crea datos y entrena en el directorio actual): se corre a mano
+collect_ignore = ["test_auto.py"]
@@ -0,0 +1,248 @@
+# conversation_store.py - Almacén único de conversaciones (SQLite en modo WAL)
+import os
+import sqlite3
+import threading
+import time
+
+from tokenizer import tokenize
+
+DB_PATH = os.environ.get("CONVERSACIONES_DB", "conversaciones.db")
+
+# Archivos de texto que se importan una sola vez
+CHAT_LOGS_TXT = "chat_logs.txt"
+DATA_TXT = "data.txt"
+
+# Conversaciones pendientes (antes chat_logs.txt) y corpus de entrenamiento (antes data.txt)
+PENDIENTE = 0
+DATASET = 1
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS conversaciones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pregunta TEXT NOT NULL,
+    respuesta TEXT NOT NULL,
+    creado_en REAL NOT NULL,
+    tokens_pregunta INTEGER NOT NULL,
+    tokens_respuesta INTEGER NOT NULL,
+    origen TEXT NOT NULL DEFAULT 'chat',
+    estado INTEGER NOT NULL DEFAULT 0,
+    en_dataset_desde REAL
+);
+CREATE INDEX IF NOT EXISTS idx_conversaciones_estado ON conversaciones(estado, id);
+CREATE TABLE IF NOT EXISTS meta (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+
+def parsear_chat_logs(lineas):
+    """Convertir líneas alternas 'usuario:'/'ia:' en pares (pregunta, respuesta)"""
+    lines = [l.strip() for l in lineas if l.strip()]  # Filtrar líneas vacías
+    pares = []
+
+    i = 0
+    while i < len(lines) - 1:
+        if lines[i].startswith("usuario:") and lines[i + 1].startswith("ia:"):
+            pregunta = lines[i].replace("usuario:", "").strip()
+            respuesta = lines[i + 1].replace("ia:", "").strip()
+
+            if pregunta and respuesta:  # Solo si no están vacías
+                pares.append((pregunta, respuesta))
+                i += 2
+            else:
+                i += 1
+        else:
+            i += 1  # Saltar línea mal formada
+
+    return pares
+
+
+def parsear_data_txt(lineas):
+    """Convertir líneas alternas pregunta/respuesta (formato de data.txt) en pares"""
+    lines = [l.strip() for l in lineas if l.strip()]
+    return [(lines[i], lines[i + 1]) for i in range(0, len(lines) - 1, 2)]
+
+
+class ConversationStore:
+    """
+    Pares pregunta/respuesta con id, fecha y número de tokens
+    - estado PENDIENTE: conversaciones nuevas del chat (lo que era chat_logs.txt)
+    - estado DATASET: corpus de entrenamiento (lo que era data.txt)
+    - SQLite en modo WAL: el servidor y el worker de entrenamiento leen y
+      escriben a la vez; contar y leer lo nuevo son consultas indexadas
+    - Una conexión por hilo
+    """
+    def __init__(self, ruta=DB_PATH):
+        self.ruta = ruta
+        self.local = threading.local()
+        self.lock_init = threading.Lock()
+        self.inicializado = False
+
+    def _conexion(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            with self.lock_init:
+                if not self.inicializado:
+                    conn.executescript(ESQUEMA)
+                    self.inicializado = True
+                    self._importar_textos(conn)
+        return conn
+
+    def _importar_textos(self, conn):
+        """Importar chat_logs.txt y data.txt la primera vez que se abre la base"""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM meta WHERE clave = 'importado'").fetchone():
+                conn.execute("COMMIT")
+                return
+
+            importados = {}
+            for archivo, parsear, estado in ((DATA_TXT, parsear_data_txt, DATASET),
+                                             (CHAT_LOGS_TXT, parsear_chat_logs, PENDIENTE)):
+                pares = []
+                if os.path.exists(archivo):
+                    with open(archivo, "r", encoding="utf-8") as f:
+                        pares = parsear(f.readlines())
+                self._insertar(conn, pares, estado, origen="importado")
+                importados[archivo] = len(pares)
+
+            conn.execute("INSERT INTO meta (clave, valor) VALUES ('importado', ?)", (str(time.time()),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if any(importados.values()):
+            print(f"Conversaciones importadas a {self.ruta}: {importados}")
+
+    @staticmethod
+    def _insertar(conn, pares, estado, origen):
+        ahora = time.time()
+        conn.executemany(
+            "INSERT INTO conversaciones (pregunta, respuesta, creado_en, tokens_pregunta, "
+            "tokens_respuesta, origen, estado, en_dataset_desde) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(p, r, ahora, len(tokenize(p)), len(tokenize(r)), origen, estado,
+              ahora if estado == DATASET else None) for p, r in pares],
+        )
+
+    def agregar(self, pares, estado=PENDIENTE, origen="chat"):
+        """Insertar varios pares en una sola transacción"""
+        if not pares:
+            return 0
+        conn = self._conexion()
+        with conn:
+            conn.execute("BEGIN")
+            self._insertar(conn, pares, estado, origen)
+        return len(pares)
+
+    def contar(self, estado):
+        return self._conexion().execute(
+            "SELECT COUNT(*) FROM conversaciones WHERE estado = ?", (estado,)).fetchone()[0]
+
+    def pares(self, estado, desde_id=0, limite=None):
+        """Devolver [(id, pregunta, respuesta)] con id > desde_id, en orden"""
+        return self._conexion().execute(
+            "SELECT id, pregunta, respuesta FROM conversaciones WHERE estado = ? AND id > ? ORDER BY id LIMIT ?",
+            (estado, desde_id, -1 if limite is None else limite)).fetchall()
+
+    def huella(self, estado, hasta_id):
+        """(cantidad, suma de ids) de los pares con id <= hasta_id: detecta borrados o reordenamientos"""
+        return tuple(self._conexion().execute(
+            "SELECT COUNT(*), COALESCE(SUM(id), 0) FROM conversaciones WHERE estado = ? AND id <= ?",
+            (estado, hasta_id)).fetchone())
+
+    def mover_a_dataset(self, hasta_id=None):
+        """Pasar las conversaciones pendientes al corpus; devuelve cuántas se movieron"""
+        conn = self._conexion()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if hasta_id is None:
+                hasta_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM conversaciones").fetchone()[0]
+            cursor = conn.execute(
+                "UPDATE conversaciones SET estado = ?, en_dataset_desde = ? WHERE estado = ? AND id <= ?",
+                (DATASET, time.time(), PENDIENTE, hasta_id))
+        return cursor.rowcount
+
+    def borrar(self, estado, max_palabras=None, min_palabras=None, contiene=None):
+        """Borrar pares del estado indicado; sin filtros borra todos"""
+        condiciones = ["estado = ?"]
+        args = [estado]
+        if max_palabras is not None:
+            condiciones.append("(tokens_pregunta > ? OR tokens_respuesta > ?)")
+            args += [max_palabras, max_palabras]
+        if min_palabras is not None:
+            condiciones.append("(tokens_pregunta < ? OR tokens_respuesta < ?)")
+            args += [min_palabras, min_palabras]
+        if contiene is not None:
+            condiciones.append("(LOWER(pregunta) LIKE ? OR LOWER(respuesta) LIKE ?)")
+            args += [f"%{contiene}%", f"%{contiene}%"]
+
+        if len(condiciones) > 1:
+            condiciones = [condiciones[0], "(" + " OR ".join(condiciones[1:]) + ")"]
+
+        conn = self._conexion()
+        with conn:
+            conn.execute("BEGIN")
+            cursor = conn.execute("DELETE FROM conversaciones WHERE " + " AND ".join(condiciones), args)
+        return cursor.rowcount
+
+    def estadisticas(self, estado):
+        """Conteos y longitudes por línea (cada par son dos líneas) con una sola consulta"""
+        fila = self._conexion().execute("""
+            SELECT COUNT(*),
+                   COALESCE(SUM(tokens_pregunta + tokens_respuesta), 0),
+                   COALESCE(MAX(MAX(tokens_pregunta, tokens_respuesta)), 0),
+                   COALESCE(SUM((tokens_pregunta > 6) + (tokens_respuesta > 6)), 0),
+                   COALESCE(SUM((tokens_pregunta BETWEEN 1 AND 6) + (tokens_respuesta BETWEEN 1 AND 6)), 0),
+                   COALESCE(SUM((tokens_pregunta <= 8) + (tokens_respuesta <= 8)), 0),
+                   COALESCE(SUM(LENGTH(pregunta) + LENGTH(respuesta)), 0)
+            FROM conversaciones WHERE estado = ?
+        """, (estado,)).fetchone()
+        pares, palabras, maximo, largas, validas, cortas, caracteres = fila
+        return {
+            "pares": pares,
+            "lineas": pares * 2,
+            "palabras": palabras,
+            "promedio_palabras": palabras / (pares * 2) if pares else 0,
+            "max_palabras": maximo,
+            "lineas_largas": largas,
+            "lineas_validas": validas,
+            "lineas_hasta_8": cortas,
+            "caracteres": caracteres,
+        }
+
+    def ultimos(self, estado, limite):
+        """Los `limite` pares más recientes [(id, pregunta, respuesta)], en orden"""
+        filas = self._conexion().execute(
+            "SELECT id, pregunta, respuesta FROM conversaciones WHERE estado = ? ORDER BY id DESC LIMIT ?",
+            (estado, limite)).fetchall()
+        return filas[::-1]
+
+    def como_texto(self, estado, pares):
+        """Pares en el formato de texto antiguo (chat_logs.txt o data.txt)"""
+        if estado == PENDIENTE:
+            return "".join(f"usuario: {p}\nia: {r}\n" for _, p, r in pares)
+        return "".join(f"{p}\n{r}\n" for _, p, r in pares)
+
+    def iterar_texto(self, estado, desde_id=0, hasta_id=None, lote=1000):
+        """exportar_texto() de los pares con id en (desde_id, hasta_id], por lotes, sin tener el estado entero en memoria"""
+        while True:
+            pares = self.pares(estado, desde_id=desde_id, limite=lote)
+            if hasta_id is not None:
+                pares = [par for par in pares if par[0] <= hasta_id]
+            if not pares:
+                break
+            desde_id = pares[-1][0]
+            yield self.como_texto(estado, pares)
+
+    def exportar_texto(self, estado):
+        """Representación en el formato de texto antiguo (para /ver_archivo)"""
+        return self.como_texto(estado, self.pares(estado))
+
+
+store = ConversationStore()
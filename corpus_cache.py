@@ -0,0 +1,168 @@
+# corpus_cache.py - Corpus de entrenamiento pre-tokenizado y mapeado en memoria
+import array
+import json
+import os
+
+import torch
+from conversation_store import store as store_global, DATASET
+
+DIRECTORIO = os.environ.get("CORPUS_DIR", "corpus")
+
+
+class CorpusCache:
+    """
+    Corpus compilado en disco
+    - tokens.i32: ids de todas las secuencias (pregunta + respuesta) seguidos
+    - offsets.i64: inicio de cada secuencia (n + 1 valores)
+    - ids.i64: id del par en el almacén de cada secuencia (en orden creciente)
+    - meta.json: huella del tokenizador y de los pares incluidos
+    - sincronizar() solo tokeniza los pares nuevos del almacén y los añade al final;
+      el tokenizador puede ampliarse sin cambiar lo ya tokenizado (ver _pares_fijos);
+      si se borró algo o el tokenizador no es ampliación del anterior se reconstruye entero
+    - cargar() mapea los archivos en memoria: las secuencias son vistas, sin copias
+    """
+    def __init__(self, directorio=DIRECTORIO, store=None):
+        self.directorio = directorio
+        self.store = store or store_global
+        self.ruta_tokens = os.path.join(directorio, "tokens.i32")
+        self.ruta_offsets = os.path.join(directorio, "offsets.i64")
+        self.ruta_ids = os.path.join(directorio, "ids.i64")
+        self.ruta_meta = os.path.join(directorio, "meta.json")
+
+    def _leer_meta(self):
+        try:
+            with open(self.ruta_meta, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _escribir_meta(self, meta):
+        temporal = self.ruta_meta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(temporal, self.ruta_meta)
+
+    def _recortar(self, meta):
+        """Descartar lo que quedó escrito tras meta.json (un añadido interrumpido)"""
+        for ruta, tamano in ((self.ruta_tokens, meta["tokens"] * 4),
+                             (self.ruta_offsets, (meta["pares"] + 1) * 8),
+                             (self.ruta_ids, meta["pares"] * 8)):
+            if not os.path.exists(ruta) or os.path.getsize(ruta) < tamano:
+                return False
+            if os.path.getsize(ruta) > tamano:
+                os.truncate(ruta, tamano)
+        return True
+
+    def _vaciar(self):
+        for ruta in (self.ruta_tokens, self.ruta_ids):
+            with open(ruta, "wb"):
+                pass
+        with open(self.ruta_offsets, "wb") as f:
+            f.write(array.array("q", [0]).tobytes())
+        meta = {"tokenizer": None, "ultimo_id": 0, "pares": 0, "suma_ids": 0, "tokens": 0}
+        self._escribir_meta(meta)
+        return meta
+
+    def _pares_fijos(self, tokenizer, meta):
+        """
+        Pares de símbolos que ya aparecen seguidos dentro de una palabra del corpus
+        - Una fusión nueva de uno de estos pares re-segmentaría palabras ya tokenizadas
+          (y entrenadas); sin ellos, las fusiones nuevas solo afectan a palabras nuevas
+        """
+        if meta["tokens"] < 2:
+            return set()
+        tokens = self.cargar()[0].long()
+        # Dentro de una palabra: el segundo token no empieza palabra (las secuencias empiezan con ▁)
+        inicios = torch.tensor(tokenizer.inicios(), dtype=torch.bool)
+        internos = ~inicios[tokens[1:]]
+        codigos = torch.unique(tokens[:-1][internos] * len(tokenizer) + tokens[1:][internos]).tolist()
+        return {(tokenizer.itos[c // len(tokenizer)], tokenizer.itos[c % len(tokenizer)]) for c in codigos}
+
+    def sincronizar(self, tokenizer, aprender=True):
+        """
+        Poner el corpus al día con el almacén; devuelve (meta, pares tokenizados)
+        - aprender: el tokenizador aprende subpalabras de los pares nuevos antes
+          de codificarlos, sin fusiones que cambien lo ya tokenizado
+        - Al reconstruir con un tokenizador ya entrenado no se aprende nada: las fusiones
+          nuevas podrían re-segmentar palabras que el modelo ya conoce
+        """
+        os.makedirs(self.directorio, exist_ok=True)
+        meta = self._leer_meta()
+
+        valido = (
+            meta is not None
+            and "vocabulario" in meta
+            and meta.get("tokenizer") == tokenizer.huella(*meta["vocabulario"])
+            and self.store.huella(DATASET, meta["ultimo_id"]) == (meta["pares"], meta["suma_ids"])
+            and self._recortar(meta)
+        )
+        if not valido:
+            if meta is not None:
+                print("Corpus pre-tokenizado desactualizado, reconstruyendo")
+            meta = self._vaciar()
+
+        nuevos = self.store.pares(DATASET, desde_id=meta["ultimo_id"])
+        if not nuevos:
+            return meta, 0
+
+        if aprender and (meta["pares"] or not tokenizer.merges):
+            antes = len(tokenizer)
+            if tokenizer.entrenar([texto for _, p, r in nuevos for texto in (p, r)],
+                                  fijos=self._pares_fijos(tokenizer, meta)):
+                print(f"Tokenizador ampliado con {len(tokenizer) - antes} subpalabras")
+
+        tokens = array.array("i")
+        offsets = array.array("q")
+        fin = meta["tokens"]
+        preguntas = tokenizer.encode_lote([pregunta for _, pregunta, _ in nuevos])
+        respuestas = tokenizer.encode_lote([respuesta for _, _, respuesta in nuevos])
+        for pregunta_ids, respuesta_ids in zip(preguntas, respuestas):
+            tokens.extend(pregunta_ids + respuesta_ids)
+            offsets.append(fin + len(tokens))
+
+        with open(self.ruta_tokens, "ab") as f:
+            f.write(tokens.tobytes())
+        with open(self.ruta_offsets, "ab") as f:
+            f.write(offsets.tobytes())
+        with open(self.ruta_ids, "ab") as f:
+            f.write(array.array("q", [fila[0] for fila in nuevos]).tobytes())
+
+        meta = {
+            "tokenizer": tokenizer.huella(),
+            "vocabulario": [len(tokenizer), len(tokenizer.merges)],
+            "ultimo_id": nuevos[-1][0],
+            "pares": meta["pares"] + len(nuevos),
+            "suma_ids": meta["suma_ids"] + sum(fila[0] for fila in nuevos),
+            "tokens": fin + len(tokens),
+        }
+        self._escribir_meta(meta)
+        return meta, len(nuevos)
+
+    def cargar(self):
+        """Mapear el corpus en memoria: (tokens int32, offsets int64, ids int64)"""
+        meta = self._leer_meta()
+        if meta is None:
+            raise FileNotFoundError(f"No hay corpus compilado en {self.directorio}")
+
+        # shared=False: mapeo privado, las lecturas no copian el archivo
+        offsets = torch.from_file(self.ruta_offsets, shared=False,
+                                  size=meta["pares"] + 1, dtype=torch.int64)
+        if meta["tokens"] == 0:
+            tokens = torch.zeros(0, dtype=torch.int32)
+        else:
+            tokens = torch.from_file(self.ruta_tokens, shared=False,
+                                     size=meta["tokens"], dtype=torch.int32)
+        if meta["pares"] == 0:
+            ids = torch.zeros(0, dtype=torch.int64)
+        else:
+            ids = torch.from_file(self.ruta_ids, shared=False,
+                                  size=meta["pares"], dtype=torch.int64)
+        return tokens, offsets, ids
+
+    @staticmethod
+    def secuencia(tokens, offsets, i):
+        """Vista de la secuencia i (pregunta + respuesta) sin copiar"""
+        return tokens[offsets[i]:offsets[i + 1]]
+
+
+corpus = CorpusCache()
@@ -0,0 +1,124 @@
+# export_model.py - Artefacto de inferencia: modelo sin dropout y cuantizado a int8
+import os
+import time
+import warnings
+from contextlib import contextmanager
+
+import torch
+import torch.nn as nn
+from model import NeuralChat
+from checkpoint_store import checkpoints
+
+# Artefacto que se sirve en lugar del checkpoint fp32 cuando corresponde a la misma versión
+INFERENCIA_PATH = os.environ.get("MODELO_INFERENCIA", "model_int8.pt")
+# Exportar después de cada entrenamiento (0 lo desactiva y se sirve el modelo fp32)
+EXPORTAR = os.environ.get("EXPORTAR_INFERENCIA", "1") == "1"
+# torch.compile sobre paso() al cargar; en CPU no siempre compensa (medir con compare_models.py)
+COMPILAR = os.environ.get("INFERENCIA_COMPILAR", "0") == "1"
+
+
+@contextmanager
+def _sin_avisos():
+    """torch.ao.quantization avisa de que está obsoleto pero sigue siendo la vía estable en CPU"""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        warnings.simplefilter("ignore", UserWarning)
+        yield
+
+
+def preparar_inferencia(model, cuantizar=True):
+    """
+    Modelo solo para inferencia
+    - Sin capas de dropout (en eval no hacen nada, pero siguen en el grafo)
+    - GRU y Linear con pesos int8 y activaciones cuantizadas al vuelo:
+      son las multiplicaciones que dominan el coste por token en CPU
+    - El embedding se queda en fp32 (es una búsqueda, no una multiplicación)
+    """
+    model.eval()
+    model.dropout1 = nn.Identity()
+    model.dropout2 = nn.Identity()
+    model.rnn.dropout = 0.0
+    if not cuantizar:
+        return model
+
+    with _sin_avisos():
+        return torch.ao.quantization.quantize_dynamic(model, {nn.GRU, nn.Linear}, dtype=torch.qint8)
+
+
+def _compilar(model):
+    try:
+        model.paso = torch.compile(model.paso, dynamic=True)
+    except Exception as e:
+        print(f"⚠️ torch.compile no disponible, se usa el modelo sin compilar: {e}")
+    return model
+
+
+def exportar(almacen=None, ruta_salida=INFERENCIA_PATH, nombre=None):
+    """Generar el artefacto de inferencia de la versión activa (o `nombre`); devuelve un resumen"""
+    inicio = time.time()
+    almacen = almacen or checkpoints
+    checkpoint = almacen.cargar(nombre)
+    if checkpoint is None:
+        raise FileNotFoundError(f"No hay checkpoint en {almacen.directorio}")
+    manifiesto = checkpoint['manifest']
+    model_state = checkpoint['model_state_dict']
+    vocab_size = model_state['embedding.weight'].shape[0]
+
+    model = NeuralChat(vocab_size)
+    model.load_state_dict(model_state)
+    model = preparar_inferencia(model)
+
+    # Escritura atómica: el registro nunca lee un artefacto a medias
+    temporal = ruta_salida + ".tmp"
+    with _sin_avisos():
+        torch.save({
+            'fuente': manifiesto['version'],  # Solo vale para esta versión del checkpoint
+            'vocab_size': vocab_size,
+            'cuantizacion': "int8-dinamica",
+            'model_state_dict': model.state_dict(),
+        }, temporal)
+    os.replace(temporal, ruta_salida)
+
+    resumen = {
+        "fuente": manifiesto['version'],
+        "bytes_fp32": sum(t.element_size() * t.nelement() for t in model_state.values()),
+        "bytes_int8": os.path.getsize(ruta_salida),
+        "segundos": round(time.time() - inicio, 2),
+    }
+    print(f"📦 Artefacto de inferencia en {ruta_salida}: "
+          f"{resumen['bytes_fp32'] / 1024:.0f} KB → {resumen['bytes_int8'] / 1024:.0f} KB")
+    return resumen
+
+
+def cargar_artefacto(version, vocab_size, ruta=INFERENCIA_PATH, compilar=COMPILAR):
+    """
+    Modelo int8 listo para inferencia, o None si no hay artefacto para esta versión
+    - El artefacto es un state_dict: se carga en un modelo cuantizado con preparar_inferencia
+    """
+    if not os.path.exists(ruta):
+        return None
+    try:
+        # Solo tensores y los parámetros empaquetados de GRU/Linear (torch.ScriptObject de
+        # las clases registradas de torch): nada de unpickle de objetos arbitrarios
+        with _sin_avisos(), torch.serialization.safe_globals([torch.ScriptObject]):
+            artefacto = torch.load(ruta, map_location="cpu", weights_only=True)
+        if artefacto.get('fuente') != version or artefacto.get('vocab_size') != vocab_size:
+            print(f"Artefacto de inferencia desactualizado ({artefacto.get('fuente')}), se usa el modelo fp32")
+            return None
+        model = preparar_inferencia(NeuralChat(vocab_size))
+        with _sin_avisos():
+            model.load_state_dict(artefacto['model_state_dict'])
+    except Exception as e:
+        print(f"Error cargando artefacto de inferencia: {e}")
+        return None
+    return _compilar(model) if compilar else model
+
+
+if __name__ == "__main__":
+    import sys
+    # python export_model.py [versión, p. ej. v000003]
+    try:
+        exportar(nombre=sys.argv[1] if len(sys.argv) > 1 else None)
+    except Exception as e:
+        print(f"❌ Error exportando: {e}")
+        exit(1)
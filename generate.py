@@ -2,55 +2,132 @@
 import torch
 import os
 import random
-from model import NeuralChat
+import threading
+import time
+from collections import OrderedDict
+from model_registry import ModelRegistry
+from sampler import Sampler
+from tokenizer import SIGNOS_FIN
+from metrics import ETAPAS, RESPUESTAS, TOKENS_GENERADOS, TOKENS_POR_RESPUESTA, TOKENS_PROMPT, TOKENS_OOV, PROPORCION_OOV
 
-# Verificar modelo
-if not os.path.exists("model.pth"):
-    print("Modelo no encontrado. Ejecuta: python train.py")
-    exit(1)
+# Parámetros de muestreo: probs ** 0.7 equivale a temperatura 1/0.7,
+# y las palabras ya usadas conservan el 20% de su probabilidad
+MUESTREO = {
+    "temperatura": 1 / 0.7,
+    "penalizacion": 0.2,
+    "top_k": 0,
+    "top_p": 1.0,
+}
 
-# CARGA CORREGIDA DEL MODELO
-try:
-    checkpoint = torch.load("model.pth", map_location="cpu", weights_only=False)
-    
-    # Formato nuevo (diccionario)
-    if isinstance(checkpoint, dict):
-        model_state = checkpoint['model_state_dict']
-        stoi = checkpoint['stoi']
-        itos = checkpoint['itos']
-    # Formato antiguo (tupla)
-    elif isinstance(checkpoint, tuple) and len(checkpoint) == 3:
-        model_state, stoi, itos = checkpoint
-    else:
-        raise ValueError("Formato de modelo no reconocido")
+# Modelo servido (a través del registro, recargable en caliente)
+# No se carga al importar: app.py lo carga en segundo plano y los scripts llaman a registro.cargar()
+registro = ModelRegistry()
+
+# Memoria máxima de la caché de estados de prompts (0 la desactiva)
+ESTADOS_CACHE_MB = float(os.environ.get("ESTADOS_CACHE_MB", "16"))
+
+class CacheEstados:
+    """
+    Caché de prompts ya codificados: (versión, ids del prompt) → estado oculto final
+    - Con el modelo en eval() el estado tras codificar un prompt es determinista
+    - Un prompt repetido no vuelve a pasar por la GRU; uno que empieza por un
+      prompt guardado solo codifica lo que falta
+    - Se desaloja por LRU cuando los tensores superan max_bytes
+    """
+    def __init__(self, max_bytes=int(ESTADOS_CACHE_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        self.entradas = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.aciertos = 0
+        self.parciales = 0
+        self.fallos = 0
+        self.desalojos = 0
+    
+    @staticmethod
+    def _tamano(clave, h):
+        # Tensor + una estimación de la clave (tupla de ints)
+        return h.element_size() * h.nelement() + 8 * len(clave[1]) + 64
     
-    model = NeuralChat(len(stoi))
-    model.load_state_dict(model_state)
-    model.eval()
-    print("Modelo cargado correctamente")
+    def prefijo(self, version, ids):
+        """(largo, estado) del prefijo guardado más largo de ids; (0, None) si no hay"""
+        with self.lock:
+            for largo in range(len(ids), 0, -1):
+                clave = (version, tuple(ids[:largo]))
+                h = self.entradas.get(clave)
+                if h is not None:
+                    self.entradas.move_to_end(clave)
+                    if largo == len(ids):
+                        self.aciertos += 1
+                    else:
+                        self.parciales += 1
+                    return largo, h
+            self.fallos += 1
+            return 0, None
     
-except Exception as e:
-    print(f"Error cargando modelo: {e}")
-    exit(1)
+    def guardar(self, version, ids, h):
+        """Guardar el estado (num_layers, hidden) tras codificar ids"""
+        clave = (version, tuple(ids))
+        h = h.detach().clone()
+        tamano = self._tamano(clave, h)
+        if tamano > self.max_bytes:
+            return
+        
+        with self.lock:
+            anterior = self.entradas.pop(clave, None)
+            if anterior is not None:
+                self.bytes -= self._tamano(clave, anterior)
+            self.entradas[clave] = h
+            self.bytes += tamano
+            while self.bytes > self.max_bytes:
+                viejo, h_viejo = self.entradas.popitem(last=False)
+                self.bytes -= self._tamano(viejo, h_viejo)
+                self.desalojos += 1
+    
+    def invalidar(self):
+        with self.lock:
+            self.entradas.clear()
+            self.bytes = 0
+    
+    def metricas(self):
+        with self.lock:
+            return {
+                "entradas": len(self.entradas),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "aciertos": self.aciertos,
+                "parciales": self.parciales,
+                "fallos": self.fallos,
+                "desalojos": self.desalojos,
+            }
 
-def generar(seed, max_palabras=8):
-    """Generar respuesta CORTA y COHERENTE"""
+estados = CacheEstados()
+# Un modelo nuevo invalida los estados guardados
+registro.suscribir(lambda activo: estados.invalidar())
+
+PALABRAS_FIN = [".", "!", "?", "fin", "adiós", "adios", "bye", "chao", "luego", "stop", "parar"]
+# Subpalabras que puede ocupar cada palabra de la respuesta (límite de pasos)
+PIEZAS_POR_PALABRA = 3
+
+def _preparar(seed, tokenizer):
+    """Tokenizar el seed: devuelve (ids, None) o (None, respuesta directa)"""
     
     if not seed or len(seed.strip()) == 0:
-        return "Hola, ¿cómo estás?"
-    
-    # Limpiar y tokenizar
-    seed = seed.lower().strip()
-    palabras = seed.split()
+        RESPUESTAS.inc(origen="vacio")
+        return None, "Hola, ¿cómo estás?"
     
-    # CORRECCIÓN: Manejar palabras OOV (Out of Vocabulary) con índice 0
-    ids = [stoi.get(p, 0) for p in palabras]  # Usar get() en lugar de verificación directa
+    # Limpiar y tokenizar (con BPE una palabra nueva se parte en subpalabras conocidas)
+    ids = tokenizer.encode(seed.strip())
     
-    # CORRECCIÓN: Verificar si hay suficientes palabras conocidas
-    palabras_conocidas = sum(1 for id in ids if id != 0)
+    # CORRECCIÓN: Verificar si hay suficientes tokens conocidos (id 0 = desconocido)
+    conocidos = sum(1 for id in ids if id != 0)
+    TOKENS_PROMPT.inc(len(ids))
+    TOKENS_OOV.inc(len(ids) - conocidos)
+    PROPORCION_OOV.observar(1 - conocidos / len(ids) if ids else 1.0)
     
-    if not ids or palabras_conocidas < max(1, len(palabras) * 0.3):  # Al menos 30% conocidas
-        return random.choice([
+    if not ids or conocidos < max(1, len(ids) * 0.3):  # Al menos 30% conocidos
+        RESPUESTAS.inc(origen="desconocido")
+        return None, random.choice([
             "No entiendo completamente",
             "¿Puedes explicar mejor?",
             "Interesante pregunta",
@@ -58,52 +135,23 @@ def generar(seed, max_palabras=8):
         ])
     
     # CORRECCIÓN: Filtrar IDs cero (palabras desconocidas)
-    ids = [id for id in ids if id != 0]
-    
-    # Tensor de entrada
-    x = torch.tensor([ids], dtype=torch.long)
-    
-    # Generar con límite estricto
-    resultado = []
-    palabras_usadas = set()
-    
-    for i in range(max_palabras):
-        with torch.no_grad():
-            out = model(x)
-            probs = torch.softmax(out[0, -1], dim=0)
-            
-            # Penalizar palabras repetidas
-            for idx, palabra in itos.items():
-                if palabra in palabras_usadas:
-                    probs[idx] *= 0.2  # Reducir 80%
-            
-            # Añadir creatividad
-            probs = probs ** 0.7  # Temperatura
-            probs = probs / probs.sum()
-            
-            # Escoger siguiente palabra
-            next_id = torch.multinomial(probs, 1).item()
-        
-        palabra = itos.get(next_id, "")
-        
-        # CORRECCIÓN: Condiciones de parada mejoradas
-        stop_conditions = [
-            not palabra,
-            palabra in [".", "!", "?", "fin", "adiós", "adios", "bye", "chao", "luego", "stop", "parar"],
-            i >= 5 and len(resultado) >= 3,  # Parar después de 3-5 palabras
-            palabra in resultado[-2:] if resultado else False,  # No repetir
-            len(palabras_usadas) >= 7  # No más de 7 palabras únicas
-        ]
-        
-        if any(stop_conditions):
-            break
-        
-        resultado.append(palabra)
-        palabras_usadas.add(palabra)
-        x = torch.cat([x, torch.tensor([[next_id]], dtype=torch.long)], dim=1)
-    
-    # Formatear respuesta
+    return [id for id in ids if id != 0], None
+
+def _debe_parar(palabra, i, resultado, palabras_usadas):
+    """Condiciones de parada de una secuencia"""
+    stop_conditions = [
+        not palabra,
+        palabra in PALABRAS_FIN,
+        i >= 5 and len(resultado) >= 3,  # Parar después de 3-5 palabras
+        palabra in resultado[-2:] if resultado else False,  # No repetir
+        len(palabras_usadas) >= 7  # No más de 7 palabras únicas
+    ]
+    return any(stop_conditions)
+
+def _formatear(resultado):
+    """Convertir la lista de palabras generadas en la respuesta final"""
     if resultado:
+        RESPUESTAS.inc(origen="modelo")
         respuesta = " ".join(resultado)
         respuesta = respuesta.capitalize()
         
@@ -126,6 +174,7 @@ def generar(seed, max_palabras=8):
         return respuesta
     else:
         # CORRECCIÓN: Respuestas de fallback mejoradas
+        RESPUESTAS.inc(origen="fallback")
         fallback_responses = [
             "No sé qué decir sobre eso.",
             "Podrías reformular la pregunta?",
@@ -135,8 +184,221 @@ def generar(seed, max_palabras=8):
         ]
         return random.choice(fallback_responses)
 
+def _decodificar_pasos(activo, lista_ids, max_palabras, cancelados=None):
+    """
+    Decodificar varias secuencias juntas con paradas independientes (generador)
+    - Produce (fila, texto) con cada subpalabra en cuanto se muestrea
+    - Al terminar devuelve (StopIteration.value) las palabras de cada fila
+    - cancelados: función por fila; si devuelve True la fila sale del lote
+    - Cada prompt parte del estado guardado de su prefijo más largo (CacheEstados);
+      lo que falta se rellena y se codifica en un solo forward empaquetado
+    - Las secuencias que terminan salen del lote (se recorta el estado oculto)
+    - Cada paso produce una subpalabra; las condiciones de parada se aplican
+      a cada palabra completa (cuando empieza la siguiente)
+    - Un ▁ suelto solo separa palabras; un signo de fin o un token sin texto
+      (desconocido) termina la fila
+    - Se miden las etapas prompt, muestreo y paso, y las subpalabras de cada fila
+    """
+    inicio = time.perf_counter()
+    model, tokenizer = activo.model, activo.tokenizer
+    n = len(lista_ids)
+    h = torch.zeros(model.rnn.num_layers, n, model.rnn.hidden_size)
+    
+    # Reanudar desde los estados guardados
+    pendientes = []
+    for fila, ids in enumerate(lista_ids):
+        if estados.max_bytes > 0:
+            largo, estado = estados.prefijo(activo.version, ids)
+        else:
+            largo, estado = 0, None
+        if estado is not None:
+            h[:, fila] = estado
+        if largo < len(ids):
+            pendientes.append((fila, ids[largo:]))
+    
+    # Codificar lo que falta una sola vez (sin empaquetar si mide lo mismo)
+    if pendientes:
+        filas = torch.tensor([fila for fila, _ in pendientes], dtype=torch.long)
+        longitudes = [len(resto) for _, resto in pendientes]
+        x = torch.zeros(len(pendientes), max(longitudes), dtype=torch.long)
+        for pos, (_, resto) in enumerate(pendientes):
+            x[pos, :len(resto)] = torch.tensor(resto, dtype=torch.long)
+        
+        with torch.no_grad():
+            _, h_prompt = model.paso(x, longitudes if len(set(longitudes)) > 1 else None, h=h[:, filas])
+        h[:, filas] = h_prompt
+        
+        if estados.max_bytes > 0:
+            for fila, _ in pendientes:
+                estados.guardar(activo.version, lista_ids[fila], h[:, fila])
+    
+    with torch.no_grad():
+        logits = model.salida(h)
+    ETAPAS.observar(time.perf_counter() - inicio, etapa="prompt")
+    
+    resultados = [[] for _ in range(n)]
+    palabras_usadas = [set() for _ in range(n)]
+    actuales = [""] * n  # Palabra en construcción de cada secuencia
+    separar = [False] * n  # Un ▁ suelto: la pieza siguiente empieza palabra
+    activos = list(range(n))
+    # Solo se penalizan palabras repetidas, no sufijos que se repiten (ni el ▁ suelto)
+    sampler = Sampler(len(tokenizer), batch=n, **MUESTREO,
+                      penalizables=torch.tensor(tokenizer.penalizables(), dtype=torch.bool))
+    max_pasos = max_palabras * PIEZAS_POR_PALABRA
+    
+    def cerrar_palabra(fila):
+        """Aceptar la palabra en construcción; False si la secuencia debe parar"""
+        palabra, actuales[fila] = actuales[fila], ""
+        resultado = resultados[fila]
+        if _debe_parar(palabra, len(resultado), resultado, palabras_usadas[fila]):
+            return False
+        resultado.append(palabra)
+        palabras_usadas[fila].add(palabra)
+        return len(resultado) < max_palabras
+    
+    generados = [0] * n
+    for i in range(max_pasos):
+        inicio = time.perf_counter()
+        with torch.no_grad():
+            # Escoger siguiente subpalabra de cada secuencia activa
+            next_ids = sampler.muestrear(logits)
+        sampler.registrar(next_ids)
+        next_ids = next_ids.tolist()
+        ETAPAS.observar(time.perf_counter() - inicio, etapa="muestreo")
+        
+        siguen = []
+        for pos, (fila, next_id) in enumerate(zip(activos, next_ids)):
+            if cancelados and cancelados[fila] and cancelados[fila]():
+                continue
+            pieza = tokenizer.pieza(next_id)
+            inicia = tokenizer.inicia_palabra(next_id)
+            if tokenizer.termina(next_id):
+                if actuales[fila]:
+                    cerrar_palabra(fila)
+                continue
+            if actuales[fila] and (inicia or pieza in SIGNOS_FIN):
+                if not cerrar_palabra(fila):
+                    continue
+            if pieza in SIGNOS_FIN:
+                # Un signo de fin es palabra propia y cierra la frase (PALABRAS_FIN)
+                continue
+            if not pieza:
+                # ▁ suelto: límite de palabra, la secuencia sigue
+                separar[fila] = True
+                siguen.append(pos)
+                generados[fila] += 1
+                continue
+            separador = " " if (inicia or separar[fila]) and (resultados[fila] or actuales[fila]) else ""
+            separar[fila] = False
+            actuales[fila] += pieza
+            siguen.append(pos)
+            generados[fila] += 1
+            yield fila, separador + pieza
+        
+        if not siguen or i == max_pasos - 1:
+            # La última palabra de cada secuencia que seguía viva
+            for pos in siguen:
+                cerrar_palabra(activos[pos])
+            break
+        
+        # Quitar del lote las secuencias terminadas
+        if len(siguen) < len(activos):
+            filas = torch.tensor(siguen, dtype=torch.long)
+            h = h[:, filas]
+            sampler.conservar(filas)
+            activos = [activos[pos] for pos in siguen]
+        
+        # Un solo paso recurrente por token nuevo (sin re-ejecutar el prompt)
+        x = torch.tensor([[next_ids[pos]] for pos in siguen], dtype=torch.long)
+        inicio = time.perf_counter()
+        with torch.no_grad():
+            logits, h = model.paso(x, h=h)
+        ETAPAS.observar(time.perf_counter() - inicio, etapa="paso")
+    
+    TOKENS_GENERADOS.inc(sum(generados))
+    for cantidad in generados:
+        TOKENS_POR_RESPUESTA.observar(cantidad)
+    return resultados
+
+def _decodificar_lote(activo, lista_ids, max_palabras, al_token=None, cancelados=None):
+    """Consumir _decodificar_pasos entero; al_token(fila, texto) recibe cada subpalabra"""
+    pasos = _decodificar_pasos(activo, lista_ids, max_palabras, cancelados)
+    while True:
+        try:
+            fila, texto = next(pasos)
+        except StopIteration as fin:
+            return fin.value
+        if al_token:
+            al_token(fila, texto)
+
+def generar_lote(semillas, max_palabras=8, al_token=None, cancelados=None):
+    """
+    Generar respuestas CORTAS para varios seeds en un solo lote
+    - al_token(i, texto): opcional, recibe cada subpalabra del seed i al muestrearla
+    - cancelados: opcional, una función por seed que indica si ya no hace falta
+    """
+    # Una sola instantánea del modelo para todo el lote
+    activo = registro.actual()
+    respuestas = [None] * len(semillas)
+    pendientes = []
+    
+    for i, seed in enumerate(semillas):
+        with ETAPAS.medir(etapa="preparar"):
+            ids, directa = _preparar(seed, activo.tokenizer)
+        if ids is None:
+            respuestas[i] = directa
+        else:
+            pendientes.append((i, ids))
+    
+    if pendientes:
+        # Las filas del lote decodificado son índices en `pendientes`
+        por_fila = None
+        if al_token:
+            por_fila = lambda fila, texto: al_token(pendientes[fila][0], texto)
+        if cancelados:
+            cancelados = [cancelados[i] for i, _ in pendientes]
+        
+        resultados = _decodificar_lote(activo, [ids for _, ids in pendientes], max_palabras,
+                                       al_token=por_fila, cancelados=cancelados)
+        for (i, _), resultado in zip(pendientes, resultados):
+            respuestas[i] = _formatear(resultado)
+    
+    return respuestas
+
+def generar_stream(seed, max_palabras=8):
+    """
+    Versión generadora de generar()
+    - Produce ("token", texto) con cada subpalabra en cuanto se muestrea
+    - Termina con ("fin", respuesta) ya formateada (puede diferir de la suma
+      de tokens: mayúscula, punto final, palabras descartadas)
+    """
+    activo = registro.actual()
+    with ETAPAS.medir(etapa="preparar"):
+        ids, directa = _preparar(seed, activo.tokenizer)
+    if ids is None:
+        yield "fin", directa
+        return
+    
+    pasos = _decodificar_pasos(activo, [ids], max_palabras)
+    while True:
+        try:
+            _, texto = next(pasos)
+        except StopIteration as fin:
+            yield "fin", _formatear(fin.value[0])
+            return
+        yield "token", texto
+
+def generar(seed, max_palabras=8):
+    """Generar respuesta CORTA y COHERENTE"""
+    return generar_lote([seed], max_palabras)[0]
+
 # Prueba mejorada
 if __name__ == "__main__":
+    if not registro.almacen.existe():
+        print("Modelo no encontrado. Ejecuta: python train.py")
+        exit(1)
+    registro.cargar()
+    
     print("Probando generador CORREGIDO:")
     print("=" * 50)
     
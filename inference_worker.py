@@ -0,0 +1,200 @@
+# inference_worker.py - Agrupar peticiones concurrentes de /chat en lotes
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+import torch
+from generate import generar_lote, registro
+from response_cache import cache as cache_respuestas
+from metrics import ETAPAS
+
+# Tamaño máximo del lote y espera máxima para completarlo
+# (más espera = más throughput, menos espera = mejor latencia p50)
+MAX_LOTE = int(os.environ.get("INFERENCIA_MAX_LOTE", "16"))
+MAX_ESPERA_MS = float(os.environ.get("INFERENCIA_MAX_ESPERA_MS", "5"))
+# Peticiones en espera como máximo; por encima se rechazan (503 + Retry-After)
+MAX_COLA = int(os.environ.get("INFERENCIA_MAX_COLA", "64"))
+# Hilos que decodifican lotes a la vez y hilos de torch (0 = núcleos / hilos)
+HILOS = int(os.environ.get("INFERENCIA_HILOS", "1"))
+TORCH_HILOS = int(os.environ.get("INFERENCIA_TORCH_HILOS", "0"))
+
+
+class ColaLlena(Exception):
+    """No caben más peticiones en la cola de inferencia"""
+
+
+# al_token/cancelado solo se usan en las peticiones con streaming
+Peticion = namedtuple("Peticion", ["seed", "futuro", "version", "encolado", "al_token", "cancelado"])
+
+
+class InferenceWorker:
+    """
+    Ejecutor de inferencia acotado
+    - Las peticiones entran en una cola de MAX_COLA como máximo, con su Future
+    - Cada hilo agrupa hasta MAX_LOTE peticiones o hasta que pasan MAX_ESPERA_MS
+    - El lote se decodifica junto y cada llamador recibe su respuesta
+    - Con caché, los prompts repetidos se responden sin pasar por la cola
+    - Streaming: al_token recibe cada subpalabra; una petición cancelada sale del lote
+    - Concurrencia máxima: HILOS × MAX_LOTE secuencias decodificándose
+    """
+    def __init__(self, max_lote=MAX_LOTE, max_espera_ms=MAX_ESPERA_MS, cache=None,
+                 max_cola=MAX_COLA, hilos=HILOS, torch_hilos=TORCH_HILOS):
+        self.cache = cache
+        self.max_lote = max(1, max_lote)
+        self.max_espera = max_espera_ms / 1000
+        self.max_cola = max(1, max_cola)
+        self.num_hilos = max(1, hilos)
+        self.torch_hilos = torch_hilos or max(1, (os.cpu_count() or 1) // self.num_hilos)
+        self.cola = queue.Queue(maxsize=self.max_cola)
+        self.hilos = []
+        self.lock = threading.Lock()
+
+        # Métricas
+        self.rechazadas = 0
+        self.lotes = 0
+        self.peticiones = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.ultima_espera = 0.0
+
+    def iniciar(self):
+        with self.lock:
+            self.hilos = [hilo for hilo in self.hilos if hilo.is_alive()]
+            if self.hilos:
+                return
+
+            # Los hilos de torch son de todo el proceso; el entrenamiento corre en otro
+            torch.set_num_threads(self.torch_hilos)
+            try:
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                pass  # Solo se puede fijar antes del primer cálculo en paralelo
+
+            for i in range(self.num_hilos):
+                hilo = threading.Thread(target=self._bucle, name=f"inference-worker-{i}", daemon=True)
+                hilo.start()
+                self.hilos.append(hilo)
+
+    def enviar(self, seed, al_token=None, cancelado=None):
+        """
+        Encolar un seed y devolver el Future con su respuesta (ColaLlena si no cabe)
+        - al_token(texto): opcional, se llama desde el hilo del worker con cada subpalabra
+        - cancelado(): opcional, True si el cliente ya no espera la respuesta
+        """
+        self.iniciar()
+        futuro = Future()
+
+        activo = registro.actual()
+        version = activo.version if activo else None
+        respuesta = self.cache.obtener(version, seed) if self.cache else None
+        if respuesta is not None:
+            futuro.set_result(respuesta)
+            return futuro
+
+        try:
+            self.cola.put_nowait(Peticion(seed, futuro, version, time.monotonic(), al_token, cancelado))
+        except queue.Full:
+            self.rechazadas += 1
+            raise ColaLlena(f"Cola de inferencia llena ({self.max_cola} peticiones)")
+        return futuro
+
+    def generar(self, seed, timeout=None):
+        """Versión bloqueante: esperar la respuesta del lote"""
+        return self.enviar(seed).result(timeout=timeout)
+
+    def sugerir_reintento(self):
+        """Segundos razonables para Retry-After según la espera reciente"""
+        return max(1, round(self.ultima_espera * 2 + 0.5))
+
+    def metricas(self):
+        return {
+            "en_cola": self.cola.qsize(),
+            "max_cola": self.max_cola,
+            "hilos": self.num_hilos,
+            "torch_hilos": self.torch_hilos,
+            "max_lote": self.max_lote,
+            "lotes": self.lotes,
+            "peticiones": self.peticiones,
+            "lote_medio": round(self.peticiones / self.lotes, 2) if self.lotes else 0.0,
+            "rechazadas": self.rechazadas,
+            "espera_ms_media": round(self.espera_total / self.peticiones * 1000, 2) if self.peticiones else 0.0,
+            "espera_ms_max": round(self.espera_max * 1000, 2),
+            "espera_ms_ultima": round(self.ultima_espera * 1000, 2),
+        }
+
+    def _recoger_lote(self):
+        """Esperar la primera petición y completar el lote hasta el límite"""
+        lote = [self.cola.get()]
+        limite = time.monotonic() + self.max_espera
+
+        while len(lote) < self.max_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self.cola.get(timeout=restante))
+            except queue.Empty:
+                break
+
+        return lote
+
+    def _registrar_espera(self, lote):
+        ahora = time.monotonic()
+        esperas = [ahora - peticion.encolado for peticion in lote]
+        for espera in esperas:
+            ETAPAS.observar(espera, etapa="cola")
+        with self.lock:
+            self.lotes += 1
+            self.peticiones += len(lote)
+            self.espera_total += sum(esperas)
+            self.espera_max = max(self.espera_max, *esperas)
+            self.ultima_espera = max(esperas)
+
+    def _bucle(self):
+        while True:
+            lote = self._recoger_lote()
+
+            # Ignorar peticiones que ya fueron canceladas (el cliente dejó de esperar)
+            vivas = []
+            for peticion in lote:
+                if peticion.cancelado and peticion.cancelado():
+                    peticion.futuro.cancel()
+                if peticion.futuro.set_running_or_notify_cancel():
+                    vivas.append(peticion)
+            lote = vivas
+            if not lote:
+                continue
+            self._registrar_espera(lote)
+
+            def al_token(i, texto):
+                if lote[i].al_token:
+                    lote[i].al_token(texto)
+
+            try:
+                with ETAPAS.medir(etapa="lote"):
+                    respuestas = generar_lote(
+                        [peticion.seed for peticion in lote],
+                        al_token=al_token if any(p.al_token for p in lote) else None,
+                        cancelados=[peticion.cancelado for peticion in lote],
+                    )
+                for peticion, respuesta in zip(lote, respuestas):
+                    # Una respuesta cortada por cancelación no se guarda en la caché
+                    completa = not (peticion.cancelado and peticion.cancelado())
+                    if self.cache and completa:
+                        self.cache.guardar(peticion.version, peticion.seed, respuesta)
+                    peticion.futuro.set_result(respuesta)
+            except Exception as e:
+                print(f"Error en lote de inferencia: {e}")
+                # Las que ya tienen respuesta la conservan (set_exception fallaría y mataría el hilo)
+                for peticion in lote:
+                    if not peticion.futuro.done():
+                        peticion.futuro.set_exception(e)
+
+
+worker = InferenceWorker(cache=cache_respuestas)
+
+# Un modelo nuevo invalida las respuestas guardadas
+registro.suscribir(lambda activo: cache_respuestas.invalidar())
@@ -1,41 +1,22 @@
 # limpiar_data.py
-import re
+from conversation_store import store, DATASET
 
 def limpiar_data_txt():
-    """Limpiar data.txt de conversaciones largas"""
+    """Limpiar el corpus de conversaciones largas"""
     
-    with open("data.txt", "r", encoding="utf-8") as f:
-        lineas = f.readlines()
+    # Ignorar pares que parecen concatenaciones
+    concatenaciones = store.borrar(DATASET, contiene="como estas estoy bien gracias")
+    if concatenaciones:
+        print(f"❌ Ignorando {concatenaciones} concatenaciones")
     
-    nuevas_lineas = []
+    # Mantener solo pares cortos y naturales (1-6 palabras por lado)
+    largas = store.borrar(DATASET, max_palabras=6, min_palabras=1)
+    if largas:
+        print(f"❌ Ignorando {largas} pares largos")
     
-    for linea in lineas:
-        linea = linea.strip()
-        
-        # Ignorar líneas vacías
-        if not linea:
-            continue
-        
-        # Ignorar líneas muy largas (>5 palabras)
-        if len(linea.split()) > 6:
-            print(f"❌ Ignorando línea larga: '{linea[:30]}...'")
-            continue
-        
-        # Ignorar líneas que parecen concatenaciones
-        if "como estas estoy bien gracias" in linea.lower():
-            print(f"❌ Ignorando concatenación: '{linea[:40]}...'")
-            continue
-        
-        # Mantener solo líneas cortas y naturales
-        if 1 <= len(linea.split()) <= 6:
-            nuevas_lineas.append(linea + "\n")
-    
-    # Guardar limpiado
-    with open("data.txt", "w", encoding="utf-8") as f:
-        f.writelines(nuevas_lineas)
-    
-    print(f"✅ data.txt limpiado: {len(nuevas_lineas)} líneas cortas")
-    print(f"📝 Ejemplos: {nuevas_lineas[:5]}")
+    pares = store.pares(DATASET)
+    print(f"✅ Corpus limpiado: {len(pares)} pares cortos")
+    print(f"📝 Ejemplos: {[(p, r) for _, p, r in pares[:5]]}")
 
 if __name__ == "__main__":
     limpiar_data_txt()
\ No newline at end of file
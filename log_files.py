@@ -0,0 +1,114 @@
+# log_files.py - Lectura por trozos de archivos de log y rotación comprimida
+import gzip
+import os
+import shutil
+
+BLOQUE = 64 * 1024
+# Tope de bytes por respuesta aunque las líneas sean muy largas
+MAX_BYTES = 1024 * 1024
+
+
+def leer_cola(ruta, lineas=200, max_bytes=MAX_BYTES):
+    """
+    Últimas `lineas` líneas leyendo bloques desde el final (sin cargar el archivo)
+    - Devuelve (texto, desde, hasta): offsets en bytes del trozo leído;
+      `hasta` sirve de cursor para pedir lo que se escriba después
+    """
+    with open(ruta, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        hasta = f.tell()
+        desde = hasta
+        datos = b""
+        # Una línea más de las pedidas: la primera puede estar cortada
+        while desde > 0 and datos.count(b"\n") <= lineas and hasta - desde < max_bytes:
+            paso = min(BLOQUE, desde)
+            desde -= paso
+            f.seek(desde)
+            datos = f.read(paso) + datos
+
+    # Si el último carácter es \n no cuenta como línea vacía
+    partes = datos.split(b"\n")
+    final = partes.pop() if partes and partes[-1] == b"" else None
+    if desde > 0 or len(partes) > lineas:
+        sobran = max(len(partes) - lineas, 1 if desde > 0 else 0)
+        desde += sum(len(p) + 1 for p in partes[:sobran])
+        partes = partes[sobran:]
+    if final is not None:
+        partes.append(final)
+    return b"\n".join(partes).decode("utf-8", errors="replace"), desde, hasta
+
+
+def leer_desde(ruta, desde=0, lineas=200, max_bytes=MAX_BYTES):
+    """
+    Hasta `lineas` líneas completas a partir del byte `desde`
+    - Devuelve (texto, desde, hasta); `hasta` es el offset de la siguiente página
+    - Una última línea sin \\n (se está escribiendo) se deja para la siguiente
+    - Un `desde` más allá del final es de antes de una rotación: se empieza
+      el archivo nuevo desde el principio
+    """
+    with open(ruta, "rb") as f:
+        tamano = f.seek(0, os.SEEK_END)
+        desde = max(desde, 0) if desde <= tamano else 0
+        f.seek(desde)
+        trozos = []
+        leidas = 0
+        leido = 0
+        while leidas < lineas and leido < max_bytes:
+            linea = f.readline(max_bytes - leido)
+            if not linea or (not linea.endswith(b"\n") and leido + len(linea) < max_bytes):
+                break
+            trozos.append(linea)
+            leidas += 1
+            leido += len(linea)
+    return b"".join(trozos).decode("utf-8", errors="replace"), desde, desde + leido
+
+
+def iterar(ruta, desde=0, hasta=None, bloque=BLOQUE):
+    """Contenido en bloques de bytes (para StreamingResponse), hasta `hasta` o el tamaño de ahora"""
+    with open(ruta, "rb") as f:
+        fin = f.seek(0, os.SEEK_END)
+        hasta = fin if hasta is None else min(hasta, fin)
+        f.seek(desde)
+        while f.tell() < hasta:
+            datos = f.read(min(bloque, hasta - f.tell()))
+            if not datos:
+                break
+            yield datos
+
+
+def archivos_rotados(ruta):
+    """Archivos comprimidos de `ruta` que existen, del más nuevo al más viejo"""
+    archivos = []
+    n = 1
+    while os.path.exists(f"{ruta}.{n}.gz"):
+        archivos.append(f"{ruta}.{n}.gz")
+        n += 1
+    return archivos
+
+
+def rotar(ruta, conservar=5):
+    """
+    ruta → ruta.1.gz (los anteriores pasan a .2.gz, .3.gz... y se borra el que sobra)
+    - El servidor y el worker de entrenamiento escriben el mismo log: el primero
+      que consigue renombrarlo es el que rota, el otro ya escribe en uno nuevo
+    """
+    conservar = max(1, conservar)
+    temporal = f"{ruta}.{os.getpid()}.rotando"
+    try:
+        os.rename(ruta, temporal)
+    except FileNotFoundError:
+        return None
+
+    if os.path.exists(f"{ruta}.{conservar}.gz"):
+        os.remove(f"{ruta}.{conservar}.gz")
+    for n in range(conservar - 1, 0, -1):
+        if os.path.exists(f"{ruta}.{n}.gz"):
+            os.replace(f"{ruta}.{n}.gz", f"{ruta}.{n + 1}.gz")
+
+    # Si algo falla, el log sin comprimir se queda como .rotando
+    destino = f"{ruta}.1.gz"
+    with open(temporal, "rb") as origen, gzip.open(destino + ".tmp", "wb") as comprimido:
+        shutil.copyfileobj(origen, comprimido)
+    os.replace(destino + ".tmp", destino)
+    os.remove(temporal)
+    return destino
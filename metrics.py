@@ -0,0 +1,215 @@
+# metrics.py - Métricas en memoria (contadores, histogramas) en formato de texto de Prometheus
+import bisect
+import threading
+import time
+
+# Latencias en segundos: de un paso de la GRU (~100 µs) a una petición lenta
+BUCKETS_LATENCIA = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_ENTRENAMIENTO = (1, 5, 10, 30, 60, 120, 300, 600)
+BUCKETS_PROPORCION = (0.0, 0.1, 0.25, 0.5, 0.7, 0.9, 1.0)
+BUCKETS_TOKENS = (1, 2, 4, 8, 12, 16, 24)
+
+
+def _etiquetas(nombres, valores, extra=""):
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _escapar(valor):
+    """Barra, comillas y saltos de línea escapados, como pide el formato de texto"""
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def _clave(self, etiquetas):
+        return tuple(etiquetas.get(n, "") for n in self.etiquetas)
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        with self.lock:
+            # Copia bajo el lock: observar() sigue sumando mientras se formatea
+            series = sorted((clave, self._copiar(valor)) for clave, valor in self.series.items())
+        for clave, valor in series:
+            lineas.extend(self._lineas(clave, valor))
+        return lineas
+
+    def _copiar(self, valor):
+        return valor
+
+    def _lineas(self, clave, valor):
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}"]
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def inc(self, cantidad=1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self.lock:
+            self.series[clave] = self.series.get(clave, 0) + cantidad
+
+    def valor(self, **etiquetas):
+        return self.series.get(self._clave(etiquetas), 0)
+
+
+class Medidor(_Metrica):
+    """Valor que sube y baja; con `funcion` se lee en el momento de exponer"""
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), funcion=None):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.funcion = funcion
+
+    def fijar(self, valor, **etiquetas):
+        with self.lock:
+            self.series[self._clave(etiquetas)] = valor
+
+    def exponer(self):
+        if self.funcion is not None:
+            try:
+                valor = self.funcion()
+            except Exception:
+                valor = None
+            if valor is not None:
+                self.fijar(float(valor))
+        return super().exponer()
+
+
+class Histograma(_Metrica):
+    """
+    Cuentas por bucket sin acumular (observar() es un bisect y una suma);
+    se acumulan al exponer
+    """
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, valor, **etiquetas):
+        clave = self._clave(etiquetas)
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self.lock:
+            serie = self.series.get(clave)
+            if serie is None:
+                # [cuentas por bucket (+Inf al final), suma, total]
+                serie = self.series[clave] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def medir(self, **etiquetas):
+        return _Cronometro(self, etiquetas)
+
+    def total(self, **etiquetas):
+        serie = self.series.get(self._clave(etiquetas))
+        return serie[2] if serie else 0
+
+    def _copiar(self, serie):
+        cuentas, suma, total = serie
+        return [list(cuentas), suma, total]
+
+    def _lineas(self, clave, serie):
+        cuentas, suma, total = serie
+        lineas = []
+        acumulado = 0
+        for limite, cuenta in zip(self.buckets + (float("inf"),), cuentas):
+            acumulado += cuenta
+            le = f'le="{_numero(limite)}"'
+            lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, le)} {acumulado}")
+        lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_numero(suma)}")
+        lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {total}")
+        return lineas
+
+
+class _Cronometro:
+    """with histograma.medir(etapa=...): observa la duración del bloque"""
+    __slots__ = ("histograma", "etiquetas", "inicio")
+
+    def __init__(self, histograma, etiquetas):
+        self.histograma = histograma
+        self.etiquetas = etiquetas
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.histograma.observar(time.perf_counter() - self.inicio, **self.etiquetas)
+
+
+class MetricsRegistry:
+    """Todas las métricas del proceso; exponer() devuelve el texto de /metrics"""
+    def __init__(self, prefijo="chatbot_"):
+        self.prefijo = prefijo
+        self.metricas = []
+
+    def _registrar(self, metrica):
+        metrica.nombre = self.prefijo + metrica.nombre
+        self.metricas.append(metrica)
+        return metrica
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def medidor(self, nombre, ayuda, etiquetas=(), funcion=None):
+        return self._registrar(Medidor(nombre, ayuda, etiquetas, funcion))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def exponer(self):
+        lineas = []
+        for metrica in self.metricas:
+            lineas.extend(metrica.exponer())
+        return "\n".join(lineas) + "\n"
+
+
+metricas = MetricsRegistry()
+
+# /chat y /chat/stream
+PETICIONES = metricas.contador(
+    "chat_peticiones_total", "Peticiones de chat por endpoint y resultado", ("endpoint", "resultado"))
+LATENCIA_CHAT = metricas.histograma(
+    "chat_latencia_segundos", "Latencia total de las peticiones de chat respondidas", ("endpoint",))
+# cola, preparar, prompt, paso, muestreo, formatear, lote, registrar, revisar_entrenamiento, volcado
+ETAPAS = metricas.histograma(
+    "etapa_segundos", "Duración de cada etapa de /chat y de generar", ("etapa",))
+
+# Generación
+RESPUESTAS = metricas.contador(
+    "respuestas_total", "Respuestas por origen: modelo, fallback (sin palabras), desconocido (OOV), vacio",
+    ("origen",))
+TOKENS_GENERADOS = metricas.contador("tokens_generados_total", "Subpalabras muestreadas")
+TOKENS_POR_RESPUESTA = metricas.histograma(
+    "tokens_por_respuesta", "Subpalabras muestreadas por respuesta", buckets=BUCKETS_TOKENS)
+TOKENS_PROMPT = metricas.contador("tokens_prompt_total", "Subpalabras de los prompts")
+TOKENS_OOV = metricas.contador("tokens_oov_total", "Subpalabras de los prompts fuera del vocabulario")
+PROPORCION_OOV = metricas.histograma(
+    "oov_proporcion", "Proporción de subpalabras desconocidas por prompt", buckets=BUCKETS_PROPORCION)
+
+# Entrenamiento (lo envía el worker al terminar cada trabajo)
+ENTRENAMIENTOS = metricas.contador("entrenamientos_total", "Trabajos de entrenamiento por resultado", ("resultado",))
+DURACION_ENTRENAMIENTO = metricas.histograma(
+    "entrenamiento_etapa_segundos", "Duración de cada paso de auto_train", ("etapa",), buckets=BUCKETS_ENTRENAMIENTO)
+LOSS = metricas.medidor("entrenamiento_loss", "Loss final del último entrenamiento")
+TOKENS_S = metricas.medidor("entrenamiento_tokens_por_segundo", "Throughput del último entrenamiento")
+EPOCAS = metricas.medidor("entrenamiento_epocas", "Épocas del último entrenamiento")
@@ -1,5 +1,6 @@
 import torch
 import torch.nn as nn
+from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
 
 class NeuralChat(nn.Module):
     """
@@ -28,14 +29,62 @@ class NeuralChat(nn.Module):
         self.dropout2 = nn.Dropout(dropout)
         self.fc = nn.Linear(hidden, vocab_size)
     
-    def forward(self, x):
+    def forward(self, x, h=None, longitudes=None):
         # Embedding
+        largo = x.size(1)
         x = self.embedding(x)
         x = self.dropout1(x)
         
-        # RNN
-        out, _ = self.rnn(x)
+        # RNN (secuencias empaquetadas si el batch trae relleno)
+        if longitudes is not None:
+            x = pack_padded_sequence(x, longitudes, batch_first=True, enforce_sorted=False)
+            out, _ = self.rnn(x, h)
+            out, _ = pad_packed_sequence(out, batch_first=True, total_length=largo)
+        else:
+            out, _ = self.rnn(x, h)
         
         # Salida
         out = self.dropout2(out)
-        return self.fc(out)
\ No newline at end of file
+        return self.fc(out)
+    
+    def paso(self, x, longitudes=None, h=None):
+        """
+        Decodificación incremental
+        - x: tokens nuevos (batch, longitud), h: estado oculto previo o None
+        - longitudes: largo real de cada fila si x viene rellenado (padding)
+        - Devuelve los logits del último token y el nuevo estado oculto
+        - El prompt se codifica una vez y cada token nuevo cuesta un solo paso
+        """
+        x = self.embedding(x)
+        x = self.dropout1(x)
+        
+        if longitudes is not None:
+            x = pack_padded_sequence(x, longitudes, batch_first=True, enforce_sorted=False)
+        _, h = self.rnn(x, h)
+        
+        # La salida del último paso válido es el estado de la última capa
+        return self.salida(h), h
+    
+    def salida(self, h):
+        """Logits del siguiente token a partir de un estado oculto (num_layers, batch, hidden)"""
+        out = self.dropout2(h[-1])
+        return self.fc(out)
+    
+    def redimensionar_vocab(self, vocab_size):
+        """
+        Ampliar embedding y fc a un vocabulario más grande
+        - Las filas de las palabras existentes se conservan tal cual
+        - Las palabras nuevas empiezan con la inicialización por defecto
+        """
+        anterior = self.embedding.num_embeddings
+        if vocab_size <= anterior:
+            return
+        
+        embedding = nn.Embedding(vocab_size, self.embedding.embedding_dim)
+        fc = nn.Linear(self.fc.in_features, vocab_size)
+        with torch.no_grad():
+            embedding.weight[:anterior] = self.embedding.weight
+            fc.weight[:anterior] = self.fc.weight
+            fc.bias[:anterior] = self.fc.bias
+        self.embedding = embedding
+        self.fc = fc
@@ -0,0 +1,143 @@
+# model_registry.py - Modelo servido con recarga en caliente
+import datetime
+import os
+import threading
+from collections import namedtuple
+
+import torch
+from model import NeuralChat
+from tokenizer import Tokenizer
+from export_model import INFERENCIA_PATH, cargar_artefacto
+from checkpoint_store import checkpoints
+
+# Cada cuántos segundos se revisa si hay un checkpoint nuevo en disco
+INTERVALO_VIGILANCIA = float(os.environ.get("MODELO_VIGILAR_S", "10"))
+
+# Todo lo que necesita generar() en un único objeto inmutable
+ModeloActivo = namedtuple("ModeloActivo", ["model", "stoi", "itos", "tokenizer", "version", "inferencia", "cargado_en", "ruta"])
+
+
+def cargar_checkpoint(almacen):
+    """Leer el checkpoint activo y devolver un ModeloActivo listo para inferencia"""
+    checkpoint = almacen.cargar()
+    if checkpoint is None:
+        raise FileNotFoundError(f"No hay checkpoint en {almacen.directorio}")
+
+    manifiesto = checkpoint['manifest']
+    tokenizer = Tokenizer.desde_estado(checkpoint['tokenizer'])
+    version = manifiesto['version']
+
+    # Artefacto int8 exportado de este mismo checkpoint si existe; si no, el modelo fp32
+    model = cargar_artefacto(version, len(tokenizer))
+    inferencia = "int8" if model is not None else "fp32"
+    if model is None:
+        # Sin reservar pesos aleatorios: los parámetros pasan a ser los tensores mapeados
+        with torch.device("meta"):
+            model = NeuralChat(len(tokenizer))
+        model.load_state_dict(checkpoint['model_state_dict'], assign=True)
+        model.eval()
+
+    return ModeloActivo(
+        model=model,
+        stoi=tokenizer.stoi,
+        itos=tokenizer.itos,
+        tokenizer=tokenizer,
+        version=version,
+        inferencia=inferencia,
+        cargado_en=datetime.datetime.now().isoformat(),
+        ruta=manifiesto['nombre'],
+    )
+
+
+class ModelRegistry:
+    """
+    Registro del modelo activo
+    - actual() devuelve la terna model/stoi/itos como un solo objeto
+    - recargar() carga en segundo plano y sustituye la referencia de una vez,
+      así una petición en curso nunca ve un estado a medio cargar
+    - vigilar() revisa periódicamente si se activó otra versión del checkpoint
+    """
+    def __init__(self, almacen=None):
+        self.almacen = almacen or checkpoints
+        self.activo = None
+        self.mtime = None
+        self.lock = threading.Lock()
+        self.vigilante = None
+        self.suscriptores = []
+
+    def actual(self):
+        return self.activo
+
+    def suscribir(self, funcion):
+        """Registrar una función que recibe cada modelo nuevo que se activa"""
+        self.suscriptores.append(funcion)
+
+    def _firma(self):
+        """Versión activa del almacén y mtime del artefacto de inferencia (se exporta después)"""
+        modelo = self.almacen.firma()
+        if modelo is None:
+            return None
+        try:
+            return modelo, os.stat(INFERENCIA_PATH).st_mtime_ns
+        except FileNotFoundError:
+            return modelo, None
+
+    def cargar(self):
+        """Cargar el checkpoint actual (bloqueante) y activarlo"""
+        with self.lock:
+            mtime = self._firma()
+            nuevo = cargar_checkpoint(self.almacen)
+            anterior = self.activo
+            self.activo = nuevo
+            self.mtime = mtime
+
+        if anterior is None or (anterior.version, anterior.inferencia) != (nuevo.version, nuevo.inferencia):
+            print(f"Modelo {nuevo.version} activo ({len(nuevo.stoi)} palabras, {nuevo.inferencia})")
+            for funcion in list(self.suscriptores):
+                try:
+                    funcion(nuevo)
+                except Exception as e:
+                    print(f"Error en suscriptor del modelo: {e}")
+        return nuevo
+
+    def recargar(self):
+        """Cargar el checkpoint en un hilo aparte sin bloquear al llamador"""
+        hilo = threading.Thread(target=self._recargar_seguro, name="model-reload", daemon=True)
+        hilo.start()
+        return hilo
+
+    def _recargar_seguro(self):
+        try:
+            self.cargar()
+        except Exception as e:
+            # Nos quedamos con el modelo anterior; se reintenta en la próxima revisión
+            print(f"Error recargando modelo: {e}")
+
+    def vigilar(self, intervalo=INTERVALO_VIGILANCIA):
+        """Revisar el checkpoint cada `intervalo` segundos y recargar si cambió"""
+        if intervalo <= 0 or (self.vigilante and self.vigilante.is_alive()):
+            return
+
+        def bucle():
+            evento = threading.Event()
+            while not evento.wait(intervalo):
+                firma = self._firma()
+                if firma is not None and firma != self.mtime:
+                    self._recargar_seguro()
+
+        self.vigilante = threading.Thread(target=bucle, name="model-watch", daemon=True)
+        self.vigilante.start()
+
+    def info(self):
+        activo = self.activo
+        if activo is None:
+            return {"cargado": False, "ruta": self.almacen.directorio}
+        return {
+            "cargado": True,
+            "version": activo.version,
+            "cargado_en": activo.cargado_en,
+            "vocabulario": len(activo.stoi),
+            "tokenizador": activo.tokenizer.modo,
+            "inferencia": activo.inferencia,
+            "ruta": activo.ruta,
+        }
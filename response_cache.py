@@ -0,0 +1,110 @@
+# response_cache.py - Caché de respuestas para prompts repetidos
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Entradas máximas (0 desactiva la caché), vida de cada entrada y
+# respuestas distintas que se guardan por prompt
+MAX_ENTRADAS = int(os.environ.get("RESPUESTAS_CACHE_MAX", "512"))
+TTL_S = float(os.environ.get("RESPUESTAS_CACHE_TTL_S", "600"))
+CANDIDATOS = int(os.environ.get("RESPUESTAS_CACHE_CANDIDATOS", "4"))
+
+
+class _Entrada:
+    __slots__ = ("creado", "candidatos", "siguiente")
+
+    def __init__(self):
+        self.creado = time.monotonic()
+        self.candidatos = []
+        self.siguiente = 0
+
+
+class ResponseCache:
+    """
+    Caché LRU con caducidad, por (versión del modelo, prompt normalizado)
+    - generar() muestrea, así que cada prompt guarda hasta CANDIDATOS respuestas:
+      mientras el grupo no está completo cuenta como fallo y se genera otra;
+      después se van rotando
+    - invalidar() se llama al activar un modelo nuevo
+    """
+    def __init__(self, max_entradas=MAX_ENTRADAS, ttl=TTL_S, candidatos=CANDIDATOS):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.candidatos = max(1, candidatos)
+        self.entradas = OrderedDict()
+        self.lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.expirados = 0
+        self.invalidaciones = 0
+
+    @staticmethod
+    def normalizar(prompt):
+        return " ".join(prompt.lower().split())
+
+    def obtener(self, version, prompt):
+        """Respuesta guardada (rotando entre candidatos) o None si hay que generar"""
+        if self.max_entradas <= 0:
+            return None
+        clave = (version, self.normalizar(prompt))
+
+        with self.lock:
+            entrada = self.entradas.get(clave)
+            if entrada is not None and time.monotonic() - entrada.creado > self.ttl:
+                del self.entradas[clave]
+                self.expirados += 1
+                entrada = None
+
+            if entrada is None or len(entrada.candidatos) < self.candidatos:
+                self.fallos += 1
+                return None
+
+            self.entradas.move_to_end(clave)
+            respuesta = entrada.candidatos[entrada.siguiente]
+            entrada.siguiente = (entrada.siguiente + 1) % len(entrada.candidatos)
+            self.aciertos += 1
+            return respuesta
+
+    def guardar(self, version, prompt, respuesta):
+        """Añadir una respuesta generada al grupo de candidatos del prompt"""
+        if self.max_entradas <= 0:
+            return
+        clave = (version, self.normalizar(prompt))
+
+        with self.lock:
+            entrada = self.entradas.get(clave)
+            if entrada is None:
+                entrada = self.entradas[clave] = _Entrada()
+            if len(entrada.candidatos) < self.candidatos:
+                entrada.candidatos.append(respuesta)
+            self.entradas.move_to_end(clave)
+
+            # Desalojar las menos usadas
+            while len(self.entradas) > self.max_entradas:
+                self.entradas.popitem(last=False)
+                self.desalojos += 1
+
+    def invalidar(self):
+        """Vaciar la caché (modelo nuevo: las respuestas anteriores ya no valen)"""
+        with self.lock:
+            self.entradas.clear()
+            self.invalidaciones += 1
+
+    def metricas(self):
+        with self.lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self.entradas),
+                "max_entradas": self.max_entradas,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 3) if consultas else 0.0,
+                "desalojos": self.desalojos,
+                "expirados": self.expirados,
+                "invalidaciones": self.invalidaciones,
+            }
+
+
+cache = ResponseCache()
@@ -0,0 +1,65 @@
+# sampler.py - Muestreo vectorizado de tokens
+import math
+import torch
+
+
+class Sampler:
+    """
+    Etapa de muestreo reutilizable (generate.py y la vista previa de train.py)
+    - Penalización de repetidos con una máscara de ids usados (batch, vocab)
+    - Temperatura, top-k y top-p aplicados con operaciones de tensores
+    - Funciona igual para un batch de 1 que para varias secuencias a la vez
+    """
+    def __init__(self, vocab_size, batch=1, temperatura=1.0, penalizacion=1.0, top_k=0, top_p=1.0,
+                 penalizables=None):
+        self.vocab_size = vocab_size
+        self.temperatura = temperatura
+        self.top_k = top_k
+        self.top_p = top_p
+
+        # La penalización multiplica la probabilidad => se suma su log
+        self.log_penalizacion = math.log(penalizacion) if penalizacion > 0 else float("-inf")
+        self.usados = torch.zeros(batch, vocab_size, dtype=torch.bool)
+        # Máscara (vocab,) de ids a los que se aplica la penalización (None = todos)
+        self.penalizables = penalizables
+
+    def registrar(self, ids):
+        """Marcar como usados los ids elegidos (un id por secuencia)"""
+        ids = torch.as_tensor(ids, dtype=torch.long).view(-1, 1)
+        self.usados.scatter_(1, ids, True)
+        if self.penalizables is not None:
+            self.usados &= self.penalizables
+
+    def conservar(self, filas):
+        """Quedarse solo con las filas indicadas (secuencias que siguen activas)"""
+        self.usados = self.usados[filas]
+
+    def muestrear(self, logits):
+        """Devolver un tensor (batch,) con el id muestreado para cada secuencia"""
+        if logits.dim() == 1:
+            logits = logits.unsqueeze(0)
+
+        logp = torch.log_softmax(logits.float(), dim=-1)
+
+        # Penalizar palabras repetidas
+        if self.log_penalizacion != 0.0:
+            logp = torch.where(self.usados, logp + self.log_penalizacion, logp)
+
+        # Temperatura
+        logp = logp / self.temperatura
+
+        # Top-k: quedarnos con los k más probables
+        if 0 < self.top_k < self.vocab_size:
+            kth = torch.topk(logp, self.top_k, dim=-1).values[:, -1:]
+            logp = logp.masked_fill(logp < kth, float("-inf"))
+
+        # Top-p: núcleo de probabilidad acumulada
+        if self.top_p < 1.0:
+            ordenados, indices = torch.sort(logp, dim=-1, descending=True)
+            probs_ordenadas = torch.softmax(ordenados, dim=-1)
+            fuera = probs_ordenadas.cumsum(dim=-1) - probs_ordenadas > self.top_p
+            fuera = torch.zeros_like(fuera).scatter(1, indices, fuera)
+            logp = logp.masked_fill(fuera, float("-inf"))
+
+        probs = torch.softmax(logp, dim=-1)
+        return torch.multinomial(probs, 1).squeeze(1)
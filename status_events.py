@@ -0,0 +1,144 @@
+# status_events.py - Estado y progreso del entrenamiento empujados a los clientes (SSE)
+import asyncio
+import json
+import os
+import threading
+import time
+
+# Revisión periódica por si cambió algo que no avisa (métricas, training.lock...)
+INTERVALO_S = float(os.environ.get("ESTADO_EVENTOS_S", "10"))
+# Espera tras un aviso para juntar ráfagas (varias épocas, guardado + invalidación...)
+AGRUPAR_S = float(os.environ.get("ESTADO_EVENTOS_AGRUPAR_S", "0.25"))
+# Comentario vacío para que proxies y navegador no den la conexión por muerta
+KEEPALIVE_S = float(os.environ.get("ESTADO_EVENTOS_KEEPALIVE_S", "15"))
+# Mensajes pendientes por cliente; si un cliente no lee, se descartan los más viejos
+MAX_PENDIENTES = 64
+
+
+def evento_sse(evento, datos, id=None):
+    cabecera = f"id: {id}\n" if id is not None else ""
+    return f"{cabecera}event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+
+def _entregar(cola, mensaje):
+    """Encolar en el loop del cliente (se llama con call_soon_threadsafe)"""
+    if cola.full():
+        cola.get_nowait()
+    cola.put_nowait(mensaje)
+
+
+class StatusBroadcaster:
+    """
+    Un canal de eventos para todas las pestañas abiertas
+    - avisar(): algo cambió; un hilo calcula la instantánea de /estado una sola vez
+      y la envía a todos solo si cambió su ETag (event: estado)
+    - publicar(): reenviar un evento tal cual (event: entrenamiento)
+    - clientes() es el generador de cada conexión; al conectar recibe el último
+      estado, salvo que Last-Event-ID indique que ya lo tiene
+    - Sin clientes no se calcula nada
+    """
+    def __init__(self, intervalo=INTERVALO_S, agrupar=AGRUPAR_S, keepalive=KEEPALIVE_S):
+        self.intervalo = intervalo
+        self.agrupar = agrupar
+        self.keepalive = keepalive
+        self.fuente = None
+        self.lock = threading.Lock()
+        self.suscritos = set()  # (loop, cola)
+        self.ultimo = None  # (etag, mensaje SSE)
+        self.cambio = threading.Event()
+        self.parar = threading.Event()
+        self.hilo = None
+        self.enviados = 0
+        self.calculos = 0
+
+    def iniciar(self, fuente):
+        """fuente() devuelve (cuerpo JSON en bytes, ETag) del estado actual"""
+        self.fuente = fuente
+        if self.hilo is not None and self.hilo.is_alive():
+            return
+        self.parar.clear()
+        self.hilo = threading.Thread(target=self._bucle, name="status-events", daemon=True)
+        self.hilo.start()
+
+    def detener(self):
+        """Cerrar las conexiones abiertas (si no, el apagado espera a que se vayan)"""
+        self.parar.set()
+        self.cambio.set()
+        self._difundir(None)
+
+    def avisar(self, *_):
+        self.cambio.set()
+
+    def publicar(self, evento, datos):
+        if self.suscritos:
+            self._difundir(evento_sse(evento, datos))
+
+    def _difundir(self, mensaje):
+        with self.lock:
+            suscritos = list(self.suscritos)
+        for loop, cola in suscritos:
+            try:
+                loop.call_soon_threadsafe(_entregar, cola, mensaje)
+            except RuntimeError:
+                pass  # Loop cerrado: el cliente ya no está
+        if mensaje is not None:
+            self.enviados += len(suscritos)
+
+    def _bucle(self):
+        while not self.parar.is_set():
+            self.cambio.wait(self.intervalo)
+            if self.parar.is_set():
+                break
+            if self.cambio.is_set():
+                time.sleep(self.agrupar)
+            self.cambio.clear()
+            if not self.suscritos:
+                self.ultimo = None  # El próximo cliente fuerza un cálculo nuevo
+                continue
+            try:
+                self._publicar_estado()
+            except Exception as e:
+                print(f"Error calculando el estado para los clientes: {e}")
+
+    def _publicar_estado(self):
+        cuerpo, etag = self.fuente()
+        self.calculos += 1
+        if self.ultimo is not None and self.ultimo[0] == etag:
+            return
+        # El cuerpo ya es JSON en una sola línea: va tal cual en data
+        mensaje = f"id: {etag}\nevent: estado\ndata: {cuerpo.decode('utf-8')}\n\n"
+        self.ultimo = (etag, mensaje)
+        self._difundir(mensaje)
+
+    async def clientes(self, ultimo_id=None):
+        """Mensajes SSE para una conexión, hasta que se cierre o se detenga el servidor"""
+        loop = asyncio.get_running_loop()
+        cola = asyncio.Queue(maxsize=MAX_PENDIENTES)
+        suscrito = (loop, cola)
+        with self.lock:
+            self.suscritos.add(suscrito)
+        try:
+            ultimo = self.ultimo
+            if ultimo is None:
+                self.avisar()  # Lo envía el hilo en cuanto lo calcule
+            elif ultimo[0] != ultimo_id:
+                yield ultimo[1]
+
+            while not self.parar.is_set():
+                try:
+                    mensaje = await asyncio.wait_for(cola.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if mensaje is None:
+                    break
+                yield mensaje
+        finally:
+            with self.lock:
+                self.suscritos.discard(suscrito)
+
+    def metricas(self):
+        return {"clientes": len(self.suscritos), "calculos": self.calculos, "enviados": self.enviados}
+
+
+difusor = StatusBroadcaster()
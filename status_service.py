@@ -0,0 +1,176 @@
+# status_service.py - Instantánea de /estado mantenida en memoria
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+
+from tokenizer import tokenize
+from conversation_store import store as store_global, PENDIENTE, DATASET
+from checkpoint_store import checkpoints as checkpoints_global
+
+# Recalcular todo cada tanto por si otro proceso tocó el almacén (limpiar_data.py...)
+REFRESCO_S = float(os.environ.get("ESTADO_REFRESCO_S", "300"))
+
+
+def _vacio():
+    return {"pares": 0, "lineas": 0, "palabras": 0, "promedio_palabras": 0, "max_palabras": 0,
+            "lineas_largas": 0, "lineas_validas": 0, "lineas_hasta_8": 0, "caracteres": 0}
+
+
+class StatusService:
+    """
+    Estadísticas de /estado en memoria
+    - agregar(): suma los pares recién guardados (sin consultar el almacén)
+    - invalidar(): tras borrar o mover pares, ese estado se recalcula con una
+      consulta la próxima vez que se pide (el máximo no se puede restar)
+    - invalidar_modelo(): tras entrenar, restaurar o reiniciar el modelo
+    - instantanea(dinamico) devuelve (cuerpo JSON, ETag); mientras no cambie
+      nada se reutiliza el mismo cuerpo y el cliente recibe 304
+    - Los suscriptores se enteran de cada cambio (para empujarlo a los clientes)
+    """
+    def __init__(self, store=None, almacen=None, refresco=REFRESCO_S):
+        self.store = store or store_global
+        self.almacen = almacen or checkpoints_global
+        self.refresco = refresco
+        self.lock = threading.Lock()
+        self.stats = {PENDIENTE: None, DATASET: None}  # None: recalcular
+        self.errores = {}
+        self.modelo = None
+        self.calculado_en = 0.0
+        self.cambios = 0  # Sube con cada cambio de las estadísticas
+        self.cuerpo = None
+        self.etag = None
+        self.clave = None
+        self.consultas = 0
+        self.reutilizadas = 0
+        self.suscriptores = []
+
+    def suscribir(self, funcion):
+        """Registrar una función que se llama (sin argumentos) cuando cambian las estadísticas"""
+        self.suscriptores.append(funcion)
+
+    def _notificar(self):
+        for funcion in list(self.suscriptores):
+            try:
+                funcion()
+            except Exception as e:
+                print(f"Error en suscriptor del estado: {e}")
+
+    def agregar(self, estado, pares):
+        """Sumar pares (pregunta, respuesta) que se acaban de guardar en `estado`"""
+        with self.lock:
+            stats = self.stats[estado]
+            if stats is None:
+                return  # Se recalcula entero de todos modos
+            for pregunta, respuesta in pares:
+                largos = (len(tokenize(pregunta)), len(tokenize(respuesta)))
+                stats["pares"] += 1
+                stats["lineas"] += 2
+                stats["palabras"] += sum(largos)
+                stats["max_palabras"] = max(stats["max_palabras"], *largos)
+                stats["lineas_largas"] += sum(n > 6 for n in largos)
+                stats["lineas_validas"] += sum(1 <= n <= 6 for n in largos)
+                stats["lineas_hasta_8"] += sum(n <= 8 for n in largos)
+                stats["caracteres"] += len(pregunta) + len(respuesta)
+            stats["promedio_palabras"] = stats["palabras"] / stats["lineas"] if stats["lineas"] else 0
+            self.cambios += 1
+        self._notificar()
+
+    def invalidar(self, estado=None):
+        """Recalcular `estado` (o ambos) en la próxima instantánea"""
+        with self.lock:
+            for clave in ((estado,) if estado is not None else (PENDIENTE, DATASET)):
+                self.stats[clave] = None
+            self.cambios += 1
+        self._notificar()
+
+    def invalidar_modelo(self):
+        with self.lock:
+            self.modelo = None
+            self.cambios += 1
+        self._notificar()
+
+    def _refrescar(self):
+        """Recalcular lo invalidado (con el lock tomado)"""
+        if time.monotonic() - self.calculado_en > self.refresco:
+            self.stats = {PENDIENTE: None, DATASET: None}
+            self.modelo = None
+
+        for estado in (PENDIENTE, DATASET):
+            if self.stats[estado] is None:
+                try:
+                    self.stats[estado] = self.store.estadisticas(estado)
+                    self.errores.pop(estado, None)
+                except Exception as e:
+                    self.stats[estado] = _vacio()
+                    self.errores[estado] = str(e)
+                self.calculado_en = time.monotonic()
+                self.cambios += 1
+
+        if self.modelo is None:
+            self.modelo = {"modelo_existe": self.almacen.existe()}
+            if self.modelo["modelo_existe"]:
+                try:
+                    tamano = self.almacen.tamano()
+                    self.modelo["version_checkpoint"] = self.almacen.nombre_actual()
+                    self.modelo["tamano_modelo_bytes"] = tamano
+                    self.modelo["tamano_modelo_kb"] = tamano / 1024
+                    self.modelo["tamano_modelo_mb"] = tamano / (1024 * 1024)
+                except Exception as e:
+                    self.modelo["error_tamano_modelo"] = str(e)
+            self.cambios += 1
+
+    def _cuerpo(self, dinamico):
+        chat = self.stats[PENDIENTE]
+        data = self.stats[DATASET]
+        estado = {
+            "almacen_existe": os.path.exists(self.store.ruta),  # Sustituye a chat_logs_existe/data_txt_existe
+            **dinamico,
+            # Conversaciones pendientes (antes chat_logs.txt)
+            "lineas_chat_logs": chat["lineas"],
+            "conversaciones_chat": chat["pares"],
+            "lineas_validas_chat": chat["lineas_hasta_8"],
+            "caracteres_chat": chat["caracteres"],
+            # Corpus de entrenamiento (antes data.txt)
+            "lineas_data_txt": data["lineas"],
+            "promedio_palabras_data": data["promedio_palabras"],
+            "max_palabras_data": data["max_palabras"],
+            **self.modelo,
+            "timestamp": datetime.datetime.now().isoformat(),
+        }
+        if data["pares"]:
+            estado["lineas_largas_data"] = data["lineas_largas"]
+            estado["lineas_validas_data"] = data["lineas_validas"]
+        if PENDIENTE in self.errores:
+            estado["error_chat_logs"] = self.errores[PENDIENTE]
+        if DATASET in self.errores:
+            estado["error_data_txt"] = self.errores[DATASET]
+        return estado
+
+    def instantanea(self, dinamico):
+        """
+        (cuerpo JSON en bytes, ETag) de /estado
+        - dinamico: valores baratos que cambian solos (progreso, métricas de inferencia...)
+        - El timestamp es el del último cambio: así el ETag solo cambia si cambia algo
+        """
+        with self.lock:
+            self.consultas += 1
+            self._refrescar()
+            clave = (self.cambios, json.dumps(dinamico, sort_keys=True, default=str))
+            if clave == self.clave:
+                self.reutilizadas += 1
+                return self.cuerpo, self.etag
+
+            self.cuerpo = json.dumps(self._cuerpo(dinamico), ensure_ascii=False, default=str).encode("utf-8")
+            self.etag = '"' + hashlib.sha1(self.cuerpo).hexdigest()[:16] + '"'
+            self.clave = clave
+            return self.cuerpo, self.etag
+
+    def metricas(self):
+        with self.lock:
+            return {"consultas": self.consultas, "reutilizadas": self.reutilizadas, "cambios": self.cambios}
+
+
+servicio = StatusService()
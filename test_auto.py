@@ -1,18 +1,16 @@
 # test_auto.py - Para probar el autoentrenamiento fácilmente
 import os
 import auto_train
+from conversation_store import store
 
 # 1. Limpiar archivos viejos
 if os.path.exists("training.lock"):
     os.remove("training.lock")
 
-# 2. Crear datos de prueba en chat_logs.txt
-with open("chat_logs.txt", "w", encoding="utf-8") as f:
-    for i in range(10):
-        f.write(f"usuario: mensaje de prueba {i}\n")
-        f.write(f"ia: respuesta de prueba {i}\n")
+# 2. Crear conversaciones pendientes de prueba
+store.agregar([(f"mensaje de prueba {i}", f"respuesta de prueba {i}") for i in range(10)], origen="prueba")
 
-print("📝 Datos de prueba creados en chat_logs.txt")
+print("📝 Datos de prueba creados en el almacén de conversaciones")
 
 # 3. Verificar si debe entrenar
 print("\n🔍 Verificando should_train():")
@@ -0,0 +1,39 @@
+# test_benchmarks.py - La suite de benchmarks corre y detecta regresiones (sin medir nada en serio)
+from benchmarks.comparar import comparar
+from benchmarks.corpus import CorpusSintetico
+from benchmarks.entorno import ejecutar, percentiles
+
+
+def test_percentiles_en_milisegundos():
+    tiempos = [i / 1000 for i in range(1, 101)]
+    assert percentiles(tiempos) == {"p50_ms": 50.5, "p99_ms": 100.0, "media_ms": 50.5}
+
+
+def test_corpus_sintetico_reproducible():
+    a, b = CorpusSintetico(50, semilla=3), CorpusSintetico(50, semilla=3)
+    assert a.pares(20) == b.pares(20)
+    assert all(1 <= len(p.split()) <= 6 for par in a.pares(20) for p in par)
+
+
+def test_comparar_marca_solo_lo_que_empeora_mas_de_la_tolerancia():
+    anterior = {"generacion": [{"vocab_max": 250, "largo_prompt": 1, "p50_ms": 10.0}],
+                "chat": [{"concurrencia": 8, "rps": 100.0}]}
+    actual = {"generacion": [{"vocab_max": 250, "largo_prompt": 1, "p50_ms": 11.0},
+                             {"vocab_max": 1000, "largo_prompt": 1, "p50_ms": 50.0}],
+              "chat": [{"concurrencia": 8, "rps": 80.0}]}
+
+    diferencias = {d["metrica"]: d for d in comparar(anterior, actual, tolerancia=0.15)}
+    # El caso sin ejecución anterior no se compara
+    assert set(diferencias) == {"p50_ms", "rps"}
+    assert not diferencias["p50_ms"]["regresion"]
+    assert diferencias["rps"]["regresion"]
+    assert diferencias["rps"]["cambio"] == -0.2
+
+
+def test_entrenamiento_corre_aislado(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fila = ejecutar("entrenamiento", {"pares": 20, "palabras": 30, "epocas": 11, "semilla": 0}, timeout=300)
+    assert fila["pares"] == 20 and fila["epocas_medidas"] == 10
+    assert fila["tokens_s"] > 0 and fila["s_por_epoca"] > 0
+    # El caso trabaja en su propio directorio temporal
+    assert list(tmp_path.iterdir()) == []
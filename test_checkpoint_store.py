@@ -0,0 +1,133 @@
+# test_checkpoint_store.py - Versiones atómicas, poda, rollback y lectura segura de pesos
+import os
+import pickle
+
+import pytest
+import torch
+
+import checkpoint_store
+from checkpoint_store import CheckpointStore
+from model import NeuralChat
+from model_registry import ModelRegistry
+from tokenizer import Tokenizer
+
+
+@pytest.fixture
+def almacen(tmp_path, monkeypatch):
+    # Sin model_int8.pt en el directorio: el registro sirve el modelo fp32
+    monkeypatch.chdir(tmp_path)
+    return CheckpointStore(str(tmp_path / "checkpoints"), conservar=3, legado=str(tmp_path / "model.pth"))
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    tokenizer = Tokenizer()
+    tokenizer.entrenar(["hola", "buenos días", "como te llamas", "me llamo artur"])
+    return tokenizer
+
+
+def pesos(valor):
+    return {"w": torch.full((2, 2), float(valor))}
+
+
+def guardar(almacen, valor, tokenizer):
+    return almacen.guardar(pesos(valor), tokenizer.estado(), ultimo_id=valor)
+
+
+def test_guardar_renombra_el_temporal_antes_de_mover_actual(almacen, tokenizer, monkeypatch):
+    guardar(almacen, 1, tokenizer)
+    pasos = []
+    renombrar = os.rename
+
+    def rename(origen, destino):
+        # El directorio temporal ya está completo y ACTUAL sigue en la versión anterior
+        assert os.path.basename(origen).startswith(".tmp-")
+        assert sorted(os.listdir(origen)) == sorted([checkpoint_store.PESOS, checkpoint_store.VOCAB,
+                                                     checkpoint_store.MANIFIESTO])
+        assert almacen.nombre_actual() == "v000001"
+        pasos.append(("rename", os.path.basename(os.path.normpath(destino))))
+        renombrar(origen, destino)
+
+    escribir_actual = almacen._escribir_actual
+    monkeypatch.setattr(checkpoint_store.os, "rename", rename)
+    monkeypatch.setattr(almacen, "_escribir_actual", lambda nombre: (pasos.append(("actual", nombre)),
+                                                                     escribir_actual(nombre)))
+
+    manifiesto = guardar(almacen, 2, tokenizer)
+    assert pasos == [("rename", "v000002"), ("actual", "v000002")]
+    assert almacen.nombre_actual() == manifiesto["nombre"] == "v000002"
+    assert not [n for n in os.listdir(almacen.directorio) if n.startswith(".tmp-") or n.endswith(".tmp")]
+
+
+def test_un_guardado_fallido_no_deja_rastro(almacen, tokenizer, monkeypatch):
+    guardar(almacen, 1, tokenizer)
+
+    def save(*args, **kwargs):
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(torch, "save", save)
+    with pytest.raises(OSError):
+        guardar(almacen, 2, tokenizer)
+    assert almacen.nombres() == ["v000001"]
+    assert almacen.nombre_actual() == "v000001"
+    assert sorted(os.listdir(almacen.directorio)) == ["ACTUAL", "v000001"]
+
+
+def test_podar_conserva_las_ultimas_y_la_activa(almacen, tokenizer):
+    for valor in range(1, 6):
+        guardar(almacen, valor, tokenizer)
+    assert almacen.nombres() == ["v000003", "v000004", "v000005"]
+
+    almacen.activar("v000003")
+    almacen.conservar = 1
+    almacen._podar()
+    assert almacen.nombres() == ["v000003", "v000005"]
+
+
+def test_activar_vuelve_a_una_version_anterior(almacen, tokenizer):
+    guardar(almacen, 1, tokenizer)
+    guardar(almacen, 2, tokenizer)
+    firma = almacen.firma()
+
+    assert almacen.activar("v000001")["ultimo_id"] == 1
+    assert almacen.nombre_actual() == "v000001"
+    assert almacen.cargar()["model_state_dict"]["w"].equal(pesos(1)["w"])
+    assert almacen.firma() != firma
+    assert [v["activa"] for v in almacen.versiones()] == [True, False]
+
+    with pytest.raises(FileNotFoundError):
+        almacen.activar("v000009")
+
+
+def test_model_pth_antiguo_se_lee_sin_unpickle_arbitrario(almacen):
+    stoi = {"hola": 0, "que": 1, "tal": 2}
+    itos = {i: w for w, i in stoi.items()}
+
+    # Tupla del formato original y dict posterior: solo tensores, dicts y tipos básicos
+    for checkpoint in ((pesos(1), stoi, itos), {"model_state_dict": pesos(1), "stoi": stoi, "itos": itos}):
+        torch.save(checkpoint, almacen.legado)
+        cargado = almacen.cargar()
+        assert cargado["manifest"]["formato"] == 0
+        assert cargado["manifest"]["tokenizador"] == "palabras"
+        assert cargado["model_state_dict"]["w"].equal(pesos(1)["w"])
+
+    # Un objeto arbitrario dentro del pickle no se ejecuta: weights_only=True lo rechaza
+    torch.save({"model_state_dict": pesos(1), "stoi": stoi, "itos": itos, "extra": Tokenizer()}, almacen.legado)
+    with pytest.raises(pickle.UnpicklingError):
+        almacen.cargar()
+
+
+def test_registro_carga_los_pesos_mapeados_sobre_el_modelo_meta(almacen, tokenizer):
+    torch.manual_seed(0)
+    model = NeuralChat(len(tokenizer))
+    model.eval()
+    manifiesto = almacen.guardar(model.state_dict(), tokenizer.estado())
+
+    activo = ModelRegistry(almacen).cargar()
+    assert (activo.version, activo.inferencia) == (manifiesto["version"], "fp32")
+    assert all(p.device.type == "cpu" for p in activo.model.parameters())
+
+    x = torch.tensor([tokenizer.encode("como te llamas")])
+    with torch.no_grad():
+        assert torch.allclose(activo.model(x), model(x))
+    assert activo.model.state_dict().keys() == model.state_dict().keys()
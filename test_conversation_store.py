@@ -0,0 +1,98 @@
+# test_conversation_store.py - Almacén de conversaciones y corpus pre-tokenizado incremental
+import pytest
+
+from conversation_store import ConversationStore, PENDIENTE, DATASET
+from corpus_cache import CorpusCache
+from tokenizer import Tokenizer
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # Sin chat_logs.txt/data.txt en el directorio: la base empieza vacía
+    monkeypatch.chdir(tmp_path)
+    return ConversationStore(str(tmp_path / "conversaciones.db"))
+
+
+def test_importa_los_textos_la_primera_vez(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data.txt").write_text("hola\nbuenos días\ncomo te llamas\nme llamo artur\n", encoding="utf-8")
+    (tmp_path / "chat_logs.txt").write_text("usuario: que tal\nia: bien\nbasura\n", encoding="utf-8")
+
+    store = ConversationStore(str(tmp_path / "c.db"))
+    assert store.contar(DATASET) == 2
+    assert store.contar(PENDIENTE) == 1
+    # Una segunda instancia sobre la misma base no vuelve a importar
+    assert ConversationStore(str(tmp_path / "c.db")).contar(DATASET) == 2
+
+
+def test_agregar_paginar_y_mover(store):
+    store.agregar([(f"pregunta {i}", f"respuesta {i}") for i in range(5)])
+    assert store.contar(PENDIENTE) == 5
+
+    pagina = store.pares(PENDIENTE, limite=2)
+    assert [p for _, p, _ in pagina] == ["pregunta 0", "pregunta 1"]
+    siguiente = store.pares(PENDIENTE, desde_id=pagina[-1][0], limite=2)
+    assert [p for _, p, _ in siguiente] == ["pregunta 2", "pregunta 3"]
+    assert [p for _, p, _ in store.ultimos(PENDIENTE, 2)] == ["pregunta 3", "pregunta 4"]
+
+    assert store.mover_a_dataset(hasta_id=siguiente[-1][0]) == 4
+    assert store.contar(PENDIENTE) == 1
+    assert store.contar(DATASET) == 4
+
+
+def test_texto_por_rango_de_ids(store):
+    store.agregar([("a", "b"), ("c", "d"), ("e", "f")])
+    store.agregar([("hola", "que tal")], estado=DATASET)
+    ids = [i for i, _, _ in store.pares(PENDIENTE)]
+
+    assert store.exportar_texto(PENDIENTE) == "usuario: a\nia: b\nusuario: c\nia: d\nusuario: e\nia: f\n"
+    assert store.exportar_texto(DATASET) == "hola\nque tal\n"
+    assert "".join(store.iterar_texto(PENDIENTE, lote=1)) == store.exportar_texto(PENDIENTE)
+    assert "".join(store.iterar_texto(PENDIENTE, desde_id=ids[0], hasta_id=ids[1])) == "usuario: c\nia: d\n"
+
+
+def test_borrar_y_estadisticas(store):
+    store.agregar([("hola", "que tal"), ("una frase bastante larga de verdad", "ok")], estado=DATASET)
+    ultimo = store.pares(DATASET)[-1][0]
+    antes = store.huella(DATASET, ultimo)
+
+    assert store.borrar(DATASET, max_palabras=4) == 1
+    assert store.huella(DATASET, ultimo) != antes
+    assert store.estadisticas(DATASET)["pares"] == 1
+    assert store.borrar(DATASET) == 1
+    assert store.estadisticas(DATASET)["lineas"] == 0
+
+
+def test_corpus_se_amplia_sin_re_tokenizar(store, tmp_path):
+    corpus = CorpusCache(str(tmp_path / "corpus"), store=store)
+    tokenizer = Tokenizer()
+    store.agregar([("hola", "buenos días"), ("como te llamas", "me llamo artur")] * 3, estado=DATASET)
+    meta, nuevos = corpus.sincronizar(tokenizer)
+    assert nuevos == 6
+    antes = corpus.cargar()[0].clone()
+    vocabulario = len(tokenizer)
+
+    # Pares nuevos con palabras nuevas: el tokenizador crece y solo se añaden esos
+    store.agregar([("que tal amigo", "muy bien amigo"), ("amigo mio", "hola amigo")] * 3, estado=DATASET)
+    meta, nuevos = corpus.sincronizar(tokenizer)
+    assert nuevos == 6
+    assert len(tokenizer) > vocabulario
+    tokens, offsets, ids = corpus.cargar()
+    assert tokens[:len(antes)].equal(antes)
+
+    # Lo ya tokenizado coincide con codificarlo de nuevo con el tokenizador ampliado
+    for i, (_, pregunta, respuesta) in enumerate(store.pares(DATASET)):
+        assert CorpusCache.secuencia(tokens, offsets, i).tolist() == tokenizer.encode(pregunta) + tokenizer.encode(respuesta)
+
+    assert corpus.sincronizar(tokenizer)[1] == 0
+
+
+def test_corpus_se_reconstruye_si_se_borra(store, tmp_path):
+    corpus = CorpusCache(str(tmp_path / "corpus"), store=store)
+    tokenizer = Tokenizer()
+    store.agregar([("hola", "buenos días"), ("adios", "hasta luego")], estado=DATASET)
+    corpus.sincronizar(tokenizer)
+
+    store.borrar(DATASET, contiene="adios")
+    meta, nuevos = corpus.sincronizar(tokenizer)
+    assert (meta["pares"], nuevos) == (1, 1)
@@ -0,0 +1,77 @@
+# test_generate.py - Decodificación de un modelo pequeño entrenado sobre los pares de data.txt
+import datetime
+
+import pytest
+import torch
+
+import generate
+from model import NeuralChat
+from model_registry import ModeloActivo
+from tokenizer import Tokenizer
+
+PARES = [
+    ("hola", "Buenos días"),
+    ("Hola", "Que Tal?"),
+    ("Como te llamas", "Me llamo Artur"),
+]
+FALLBACKS = {
+    "No sé qué decir sobre eso.",
+    "Podrías reformular la pregunta?",
+    "Eso es interesante, dime más.",
+    "No estoy seguro de cómo responder.",
+    "Hablemos de otra cosa.",
+}
+
+
+@pytest.fixture(scope="module")
+def activo():
+    """Entrenar hasta memorizar los pares y servir el modelo desde el registro"""
+    torch.manual_seed(0)
+    tokenizer = Tokenizer()
+    tokenizer.entrenar([texto for par in PARES for texto in par])
+    secuencias = [tokenizer.encode(p) + tokenizer.encode(r) for p, r in PARES]
+
+    model = NeuralChat(len(tokenizer), embed=32, hidden=64, dropout=0.0)
+    optimizer = torch.optim.Adam(model.parameters(), lr=0.01)
+    for _ in range(300):
+        for secuencia in secuencias:
+            x = torch.tensor([secuencia])
+            optimizer.zero_grad()
+            loss = torch.nn.functional.cross_entropy(model(x[:, :-1])[0], x[0, 1:])
+            loss.backward()
+            optimizer.step()
+    model.eval()
+
+    anterior = generate.registro.activo
+    generate.registro.activo = ModeloActivo(
+        model=model, stoi=tokenizer.stoi, itos=tokenizer.itos, tokenizer=tokenizer, version="prueba",
+        inferencia="fp32", cargado_en=datetime.datetime.now().isoformat(), ruta="prueba",
+    )
+    generate.estados.invalidar()
+    yield generate.registro.activo
+    generate.registro.activo = anterior
+    generate.estados.invalidar()
+
+
+def test_el_espacio_suelto_no_termina_la_respuesta(activo):
+    # Tras "como te llamas" el corpus sigue con "▁me": BPE puede segmentarlo como "▁" + "me"
+    torch.manual_seed(0)
+    respuestas = [generate.generar("Como te llamas") for _ in range(5)]
+    assert all(r not in FALLBACKS for r in respuestas), respuestas
+    assert any("llamo" in r.lower() for r in respuestas), respuestas
+
+
+def test_un_signo_de_fin_cierra_la_respuesta(activo):
+    torch.manual_seed(0)
+    for _ in range(5):
+        respuesta = generate.generar("Hola")
+        # El "?" de "Que Tal?" es palabra propia: para la respuesta en lugar de pegarse
+        assert "?" not in respuesta[:-1], respuesta
+
+
+def test_stream_termina_con_la_respuesta_formateada(activo):
+    torch.manual_seed(0)
+    eventos = list(generate.generar_stream("Como te llamas"))
+    assert eventos[-1][0] == "fin"
+    assert all(tipo == "token" for tipo, _ in eventos[:-1])
+    assert eventos[-1][1] not in FALLBACKS
@@ -0,0 +1,90 @@
+# test_inference_worker.py - Lotes del worker de inferencia y sus errores
+import pytest
+
+import inference_worker
+from inference_worker import InferenceWorker
+from response_cache import ResponseCache
+
+
+class CacheQueFalla(ResponseCache):
+    """Caché que no puede guardar la respuesta de un prompt concreto"""
+    def __init__(self, prompt):
+        super().__init__(max_entradas=16)
+        self.prompt = prompt
+
+    def guardar(self, version, prompt, respuesta):
+        if prompt == self.prompt:
+            raise RuntimeError("caché rota")
+        super().guardar(version, prompt, respuesta)
+
+
+@pytest.fixture
+def eco(monkeypatch):
+    """
+    generar_lote sin modelo: la respuesta es el prompt en mayúsculas
+    - Entrega las respuestas una a una y falla al llegar al prompt "falla"
+    """
+    lotes = []
+
+    def generar_lote(semillas, **_):
+        lotes.append(list(semillas))
+        for seed in semillas:
+            if seed == "falla":
+                raise RuntimeError("fallo a mitad de lote")
+            yield seed.upper()
+
+    monkeypatch.setattr(inference_worker, "generar_lote", generar_lote)
+    return lotes
+
+
+def test_agrupa_peticiones_en_un_lote(eco):
+    worker = InferenceWorker(max_lote=4, max_espera_ms=200, hilos=1, torch_hilos=1)
+    futuros = [worker.enviar(seed) for seed in ("a", "b", "c")]
+    assert [f.result(timeout=5) for f in futuros] == ["A", "B", "C"]
+    assert eco == [["a", "b", "c"]]
+
+
+def test_un_fallo_a_mitad_de_lote_no_mata_el_worker(eco):
+    worker = InferenceWorker(max_lote=4, max_espera_ms=200, hilos=1, torch_hilos=1)
+    futuros = [worker.enviar(seed) for seed in ("a", "falla", "c")]
+
+    # "a" ya tenía respuesta cuando falló el lote: la conserva; el resto recibe el error
+    assert futuros[0].result(timeout=5) == "A"
+    for futuro in futuros[1:]:
+        with pytest.raises(RuntimeError, match="fallo a mitad de lote"):
+            futuro.result(timeout=5)
+
+    # El hilo sigue vivo y atiende el siguiente lote
+    assert worker.generar("d", timeout=5) == "D"
+    assert all(hilo.is_alive() for hilo in worker.hilos)
+
+
+def test_la_cache_responde_sin_pasar_por_el_lote(eco):
+    worker = InferenceWorker(max_lote=4, max_espera_ms=50, hilos=1, torch_hilos=1, cache=ResponseCache(max_entradas=16, candidatos=1))
+    assert worker.generar("a", timeout=5) == "A"
+    assert worker.generar("a", timeout=5) == "A"
+    assert eco == [["a"]]
+
+
+def test_un_fallo_de_la_cache_no_mata_el_worker(eco):
+    worker = InferenceWorker(max_lote=4, max_espera_ms=200, hilos=1, torch_hilos=1, cache=CacheQueFalla("b"))
+    futuros = [worker.enviar(seed) for seed in ("a", "b", "c")]
+
+    assert futuros[0].result(timeout=5) == "A"
+    for futuro in futuros[1:]:
+        with pytest.raises(RuntimeError, match="caché rota"):
+            futuro.result(timeout=5)
+    assert worker.generar("d", timeout=5) == "D"
+
+
+def test_un_lote_que_falla_entero(monkeypatch):
+    def generar_lote(semillas, **_):
+        raise ValueError("sin modelo")
+
+    monkeypatch.setattr(inference_worker, "generar_lote", generar_lote)
+    worker = InferenceWorker(max_lote=4, max_espera_ms=50, hilos=1, torch_hilos=1)
+    with pytest.raises(ValueError):
+        worker.generar("a", timeout=5)
+
+    monkeypatch.setattr(inference_worker, "generar_lote", lambda semillas, **_: ["ok"] * len(semillas))
+    assert worker.generar("b", timeout=5) == "ok"
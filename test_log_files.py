@@ -0,0 +1,107 @@
+# test_log_files.py - Lectura por trozos y rotación de train.log
+import asyncio
+import gzip
+
+import log_files
+from log_files import leer_cola, leer_desde, iterar, rotar, archivos_rotados
+
+
+def escribir(ruta, n):
+    lineas = [f"linea {i}\n" for i in range(n)]
+    ruta.write_text("".join(lineas), encoding="utf-8")
+    return lineas
+
+
+def test_cola_lee_las_ultimas_lineas(tmp_path, monkeypatch):
+    ruta = tmp_path / "train.log"
+    lineas = escribir(ruta, 5000)
+    # Bloques pequeños: la cola cruza varios bloques
+    monkeypatch.setattr(log_files, "BLOQUE", 100)
+
+    texto, desde, hasta = leer_cola(str(ruta), lineas=3)
+    assert texto == "".join(lineas[-3:])
+    assert hasta == ruta.stat().st_size
+    assert desde == hasta - len("".join(lineas[-3:]).encode())
+
+
+def test_cola_de_archivo_corto_y_vacio(tmp_path):
+    ruta = tmp_path / "train.log"
+    lineas = escribir(ruta, 2)
+    assert leer_cola(str(ruta), lineas=10) == ("".join(lineas), 0, ruta.stat().st_size)
+    ruta.write_text("", encoding="utf-8")
+    assert leer_cola(str(ruta)) == ("", 0, 0)
+
+
+def test_paginar_hacia_delante_reconstruye_el_archivo(tmp_path):
+    ruta = tmp_path / "train.log"
+    escribir(ruta, 1000)
+    trozos = []
+    desde = 0
+    while True:
+        texto, _, hasta = leer_desde(str(ruta), desde, lineas=77)
+        if hasta == desde:
+            break
+        trozos.append(texto)
+        desde = hasta
+    assert "".join(trozos) == ruta.read_text(encoding="utf-8")
+    assert b"".join(iterar(str(ruta), 0, bloque=333)) == ruta.read_bytes()
+
+
+def test_linea_a_medias_queda_para_la_siguiente_pagina(tmp_path):
+    ruta = tmp_path / "train.log"
+    ruta.write_text("completa\nescribiendo", encoding="utf-8")
+    texto, _, hasta = leer_desde(str(ruta), 0)
+    assert (texto, hasta) == ("completa\n", len("completa\n"))
+
+
+def test_iterar_se_para_en_hasta(tmp_path):
+    ruta = tmp_path / "train.log"
+    ruta.write_text("0123456789", encoding="utf-8")
+    assert b"".join(iterar(str(ruta), 2, 6)) == b"2345"
+
+
+def test_rotar_conserva_los_ultimos(tmp_path):
+    ruta = tmp_path / "train.log"
+    for i in range(4):
+        ruta.write_text(f"log {i}\n", encoding="utf-8")
+        assert rotar(str(ruta), conservar=3) == f"{ruta}.1.gz"
+
+    assert not ruta.exists()
+    rotados = archivos_rotados(str(ruta))
+    assert rotados == [f"{ruta}.{n}.gz" for n in (1, 2, 3)]
+    # Del más nuevo al más viejo; el primero ya se descartó
+    assert [gzip.open(r, "rt", encoding="utf-8").read() for r in rotados] == ["log 3\n", "log 2\n", "log 1\n"]
+    assert not list(tmp_path.glob("*.rotando"))
+
+    # Sin log que rotar no hace nada
+    assert rotar(str(ruta), conservar=3) is None
+
+
+def test_cursor_de_antes_de_rotar_vuelve_al_principio(tmp_path):
+    ruta = tmp_path / "train.log"
+    escribir(ruta, 100)
+    _, _, hasta = leer_desde(str(ruta), 0, lineas=100)
+
+    # Tras rotar, el log nuevo es más corto que el cursor del cliente
+    rotar(str(ruta), conservar=1)
+    ruta.write_text("nueva 0\nnueva 1\n", encoding="utf-8")
+    assert hasta > ruta.stat().st_size
+    assert leer_desde(str(ruta), hasta) == ("nueva 0\nnueva 1\n", 0, ruta.stat().st_size)
+    assert leer_desde(str(ruta), 0, lineas=1)[0] == "nueva 0\n"
+
+
+def test_stream_de_antes_de_rotar_vuelve_al_principio(tmp_path):
+    import app
+    ruta = tmp_path / "train.log"
+    ruta.write_text("nueva 0\n", encoding="utf-8")
+
+    async def leer(respuesta):
+        return b"".join([trozo async for trozo in respuesta.body_iterator])
+
+    respuesta = app.stream_texto(str(ruta), 1000)
+    assert (respuesta.headers["x-desde"], respuesta.headers["x-hasta"]) == ("0", str(ruta.stat().st_size))
+    assert asyncio.run(leer(respuesta)) == b"nueva 0\n"
+
+    respuesta = app.stream_texto(str(ruta), 4)
+    assert respuesta.headers["x-desde"] == "4"
+    assert asyncio.run(leer(respuesta)) == b"a 0\n"
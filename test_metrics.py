@@ -0,0 +1,79 @@
+# test_metrics.py - Texto de Prometheus: buckets acumulados, +Inf, _sum/_count y etiquetas
+import threading
+
+from metrics import MetricsRegistry
+
+
+def lineas(registro):
+    return registro.exponer().splitlines()
+
+
+def test_histograma_acumula_buckets_y_termina_en_inf():
+    registro = MetricsRegistry(prefijo="t_")
+    histograma = registro.histograma("latencia", "Latencia", ("etapa",), buckets=(0.1, 1.0))
+    for valor in (0.05, 0.1, 0.5, 3.0):
+        histograma.observar(valor, etapa="paso")
+
+    assert lineas(registro) == [
+        "# HELP t_latencia Latencia",
+        "# TYPE t_latencia histogram",
+        't_latencia_bucket{etapa="paso",le="0.1"} 2',
+        't_latencia_bucket{etapa="paso",le="1.0"} 3',
+        't_latencia_bucket{etapa="paso",le="+Inf"} 4',
+        't_latencia_sum{etapa="paso"} 3.65',
+        't_latencia_count{etapa="paso"} 4',
+    ]
+    assert histograma.total(etapa="paso") == 4
+
+
+def test_contador_sin_etiquetas_y_series_ordenadas():
+    registro = MetricsRegistry(prefijo="t_")
+    total = registro.contador("tokens_total", "Tokens")
+    peticiones = registro.contador("peticiones_total", "Peticiones", ("endpoint", "resultado"))
+    total.inc(3)
+    peticiones.inc(endpoint="/chat/stream", resultado="ok")
+    peticiones.inc(endpoint="/chat", resultado="timeout")
+    peticiones.inc(endpoint="/chat", resultado="timeout")
+
+    assert lineas(registro)[2] == "t_tokens_total 3"
+    assert lineas(registro)[5:] == [
+        't_peticiones_total{endpoint="/chat",resultado="timeout"} 2',
+        't_peticiones_total{endpoint="/chat/stream",resultado="ok"} 1',
+    ]
+
+
+def test_etiquetas_con_comillas_y_saltos_se_escapan():
+    registro = MetricsRegistry(prefijo="t_")
+    registro.contador("errores_total", "Errores", ("error",)).inc(error='dijo "no"\\\nfin')
+    assert lineas(registro)[-1] == 't_errores_total{error="dijo \\"no\\"\\\\\\nfin"} 1'
+
+
+def test_medidor_con_funcion_se_lee_al_exponer():
+    registro = MetricsRegistry(prefijo="t_")
+    valores = iter([1.5, None])
+    registro.medidor("cola", "Cola", funcion=lambda: next(valores))
+    assert lineas(registro)[-1] == "t_cola 1.5"
+    # Sin valor nuevo se conserva el último
+    assert lineas(registro)[-1] == "t_cola 1.5"
+
+
+def test_exponer_mientras_se_observa_es_coherente():
+    registro = MetricsRegistry(prefijo="t_")
+    histograma = registro.histograma("carga", "Carga", buckets=(0.5,))
+    parar = threading.Event()
+
+    def observar():
+        while not parar.is_set():
+            histograma.observar(0.1)
+
+    hilo = threading.Thread(target=observar)
+    hilo.start()
+    try:
+        for _ in range(200):
+            cuentas = {linea.split(" ")[0]: int(float(linea.split(" ")[1]))
+                       for linea in lineas(registro) if not linea.startswith("#")}
+            # El +Inf acumulado y _count salen de la misma copia
+            assert cuentas['t_carga_bucket{le="+Inf"}'] == cuentas["t_carga_count"]
+    finally:
+        parar.set()
+        hilo.join()
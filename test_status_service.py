@@ -0,0 +1,97 @@
+# test_status_service.py - Instantánea de /estado: sumas incrementales, recálculo y ETag
+import json
+
+import pytest
+from starlette.requests import Request
+
+from checkpoint_store import CheckpointStore
+from conversation_store import ConversationStore, PENDIENTE, DATASET
+from status_service import StatusService
+
+
+class StoreContado(ConversationStore):
+    """Almacén que cuenta las consultas de estadísticas"""
+    def __init__(self, ruta):
+        super().__init__(ruta)
+        self.consultas = 0
+
+    def estadisticas(self, estado):
+        self.consultas += 1
+        return super().estadisticas(estado)
+
+
+@pytest.fixture
+def servicio(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = StoreContado(str(tmp_path / "conversaciones.db"))
+    store.agregar([("hola", "que tal"), ("como te llamas", "me llamo artur")], estado=DATASET)
+    almacen = CheckpointStore(str(tmp_path / "checkpoints"), legado=str(tmp_path / "model.pth"))
+    return StatusService(store=store, almacen=almacen)
+
+
+def cuerpo(servicio, dinamico=None):
+    datos, etag = servicio.instantanea(dinamico or {})
+    return json.loads(datos), etag
+
+
+def test_agregar_suma_sin_consultar_el_almacen(servicio):
+    antes, _ = cuerpo(servicio)
+    assert servicio.store.consultas == 2
+    assert antes["conversaciones_chat"] == 0
+
+    pares = [("una pregunta bastante larga hoy", "si"), ("ok", "vale")]
+    servicio.store.agregar(pares)
+    servicio.agregar(PENDIENTE, pares)
+    despues, _ = cuerpo(servicio)
+    assert servicio.store.consultas == 2
+
+    # Las sumas coinciden con lo que calcularía el almacén
+    esperado = servicio.store.estadisticas(PENDIENTE)
+    assert despues["conversaciones_chat"] == esperado["pares"] == 2
+    assert despues["lineas_chat_logs"] == esperado["lineas"]
+    assert despues["lineas_validas_chat"] == esperado["lineas_hasta_8"]
+    assert servicio.stats[PENDIENTE]["max_palabras"] == esperado["max_palabras"] == 5
+    assert servicio.stats[PENDIENTE]["promedio_palabras"] == esperado["promedio_palabras"]
+
+
+def test_invalidar_recalcula_una_sola_vez(servicio):
+    cuerpo(servicio)
+    servicio.store.borrar(DATASET, contiene="artur")
+    servicio.invalidar(DATASET)
+    consultas = servicio.store.consultas
+
+    assert cuerpo(servicio)[0]["lineas_data_txt"] == 2
+    cuerpo(servicio)
+    assert servicio.store.consultas == consultas + 1
+
+
+def test_misma_instantanea_mientras_nada_cambia(servicio):
+    primero = servicio.instantanea({"motor": "listo"})
+    assert servicio.instantanea({"motor": "listo"}) == primero
+    assert servicio.metricas()["reutilizadas"] == 1
+
+    # Un valor dinámico distinto o un cambio en las estadísticas dan otro ETag
+    cargando = servicio.instantanea({"motor": "cargando"})[1]
+    assert cargando != primero[1]
+    servicio.agregar(PENDIENTE, [("hola", "adios")])
+    assert servicio.instantanea({"motor": "cargando"})[1] != cargando
+
+
+def pedir_estado(app, if_none_match=None):
+    cabeceras = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return app.get_estado(Request({"type": "http", "method": "GET", "path": "/estado", "headers": cabeceras}))
+
+
+def test_estado_responde_304_si_el_etag_coincide(servicio, monkeypatch):
+    import app
+    monkeypatch.setattr(app, "servicio_estado", servicio)
+    monkeypatch.setattr(app, "estado_dinamico", lambda: {"motor": "listo"})
+
+    primera = pedir_estado(app)
+    assert primera.status_code == 200
+    assert json.loads(primera.body)["conversaciones_chat"] == 0
+
+    segunda = pedir_estado(app, primera.headers["etag"])
+    assert (segunda.status_code, segunda.body) == (304, b"")
+    assert segunda.headers["etag"] == primera.headers["etag"]
+    assert pedir_estado(app, '"otro"').status_code == 200
@@ -0,0 +1,81 @@
+# test_tokenizer.py - Tokenizador BPE: ida y vuelta, palabras y ampliación sin re-segmentar
+from tokenizer import Tokenizer, trozos, ESPACIO
+
+TEXTOS = ["hola", "Buenos días", "Hola", "Que Tal?", "Como te llamas", "Me llamo Artur"]
+
+
+def entrenado(textos=TEXTOS, **opciones):
+    tokenizer = Tokenizer(**opciones)
+    tokenizer.entrenar(textos)
+    return tokenizer
+
+
+def test_ida_y_vuelta():
+    tokenizer = entrenado()
+    # Los signos de fin se separan al codificar y vuelven pegados al decodificar
+    for texto in TEXTOS + ["que tal? me llamo artur", "como te llamas?"]:
+        assert tokenizer.decode(tokenizer.encode(texto)) == texto.lower()
+
+
+def test_los_signos_de_fin_son_palabra_propia():
+    assert trozos("que tal???") == ["▁que", "▁tal", "▁?", "▁?", "▁?"]
+    assert trozos("hola, bien.") == ["▁hola", ",", "▁bien", "▁."]
+
+
+def test_espacio_suelto_empieza_palabra_sin_terminar():
+    tokenizer = entrenado()
+    espacio = tokenizer.stoi[ESPACIO]
+    assert tokenizer.inicia_palabra(espacio)
+    assert tokenizer.es_espacio(espacio)
+    assert not tokenizer.termina(espacio)
+    assert not tokenizer.penalizables()[espacio]
+    # El desconocido sí termina la secuencia
+    assert tokenizer.termina(0)
+
+
+def test_caracteres_nuevos_son_desconocidos():
+    tokenizer = entrenado()
+    assert tokenizer.encode("hola!")[-1] == 0
+    assert tokenizer.decode(tokenizer.encode("hola!")) == "hola"
+
+
+def test_desconocidos_con_vocabulario_lleno():
+    tokenizer = entrenado(max_vocab=12)
+    assert len(tokenizer) == 12
+    assert 0 in tokenizer.encode("zzz")
+
+
+def test_ampliar_no_cambia_los_ids_ni_la_huella_previa():
+    tokenizer = entrenado()
+    estado = tokenizer.estado()
+    huella = tokenizer.huella()
+    tokens, merges = len(tokenizer), len(tokenizer.merges)
+
+    assert tokenizer.entrenar(["perro perro gato gato", "perro gato"])
+    assert tokenizer.es_ampliacion_de(estado)
+    assert tokenizer.huella(tokens, merges) == huella
+    assert tokenizer.huella() != huella
+
+
+def test_pares_fijos_mantienen_la_segmentacion():
+    tokenizer = entrenado()
+    antes = {texto: tokenizer.encode(texto) for texto in TEXTOS}
+    # Todos los pares que ya aparecen dentro de una palabra quedan prohibidos
+    fijos = set()
+    for ids in antes.values():
+        for a, b in zip(ids, ids[1:]):
+            if not tokenizer.inicia_palabra(b):
+                fijos.add((tokenizer.itos[a], tokenizer.itos[b]))
+
+    tokenizer.entrenar(["buenos buenos días días llamas llamas", "tal tal"] * 5, fijos=fijos)
+    assert {texto: tokenizer.encode(texto) for texto in TEXTOS} == antes
+
+
+def test_estado_y_cargar(tmp_path):
+    tokenizer = entrenado()
+    ruta = str(tmp_path / "vocab.json")
+    tokenizer.guardar(ruta)
+    cargado = Tokenizer.cargar(ruta)
+    assert cargado.estado() == tokenizer.estado()
+    assert cargado.encode("como te llamas") == tokenizer.encode("como te llamas")
+    assert Tokenizer.cargar(str(tmp_path / "no_existe.json")) is None
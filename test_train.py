@@ -0,0 +1,43 @@
+# test_train.py - Modos de entrenamiento sobre un almacén y un corpus temporales
+import pytest
+
+import train
+from checkpoint_store import CheckpointStore
+from conversation_store import ConversationStore, DATASET
+from corpus_cache import CorpusCache
+
+PARES = [("hola", "buenos días"), ("como te llamas", "me llamo artur"), ("que tal", "muy bien")]
+
+
+@pytest.fixture
+def entorno(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = ConversationStore(str(tmp_path / "conversaciones.db"))
+    store.agregar(PARES, estado=DATASET)
+    monkeypatch.setattr(train, "store", store)
+    monkeypatch.setattr(train, "corpus", CorpusCache(str(tmp_path / "corpus"), store=store))
+    return store
+
+
+def entrenar(tmp_path, modo):
+    almacen = CheckpointStore(str(tmp_path / "checkpoints"), legado=str(tmp_path / "model.pth"))
+    return train.entrenar(almacen=almacen, ruta_vocab=str(tmp_path / "vocab.json"), epochs=2, modo=modo)
+
+
+def test_ajuste_sin_pares_nuevos_no_publica_modelo(entorno, tmp_path):
+    # Sin modelo previo el ajuste entrena con todo el corpus
+    assert entrenar(tmp_path, "ajuste")["modo"] == "completo"
+    almacen = CheckpointStore(str(tmp_path / "checkpoints"))
+    assert almacen.nombres() == ["v000001"]
+
+    resumen = entrenar(tmp_path, "ajuste")
+    assert (resumen["modo"], resumen["parada"], resumen["epocas"]) == ("ajuste", "sin_pares_nuevos", 0)
+    assert almacen.nombres() == ["v000001"]
+
+
+def test_ajuste_con_pares_nuevos(entorno, tmp_path):
+    entrenar(tmp_path, "completo")
+    entorno.agregar([("adios", "hasta luego")], estado=DATASET)
+
+    resumen = entrenar(tmp_path, "ajuste")
+    assert (resumen["modo"], resumen["pares_nuevos"]) == ("ajuste", 1)
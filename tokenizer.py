@@ -1,4 +1,30 @@
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+
+# Vocabulario persistente: solo crece, los ids existentes nunca cambian
+VOCAB_PATH = os.environ.get("VOCAB_PATH", "vocab.json")
+# Tamaño máximo del vocabulario de subpalabras (acota embedding y softmax)
+VOCAB_MAX = int(os.environ.get("TOKENIZER_VOCAB_MAX", "2000"))
+# Un par de símbolos tiene que aparecer al menos estas veces para fusionarse
+FRECUENCIA_MINIMA = 2
+# Palabras ya segmentadas que se guardan en memoria
+MAX_CACHE = 50000
+
+ESPACIO = "▁"  # Marca de inicio de palabra (el espacio que la precede)
+UNK = "<unk>"  # Id 0: símbolos que no están en el vocabulario
+
+# Palabras y signos de puntuación por separado: "tal?" → "tal", "?"
+PATRON = re.compile(r"(\s*)(\w+|[^\w\s])")
+# Signos que cierran frase: son palabra propia aunque vayan pegados ("tal?" → "▁tal", "▁?")
+SIGNOS_FIN = frozenset(".!?")
+# Versión de trozos(): si cambia, lo ya tokenizado deja de valer (va en la huella)
+PRETOKENIZADOR = 2
+
 def tokenize(text):
+    """Palabras separadas por espacios (para contar palabras, no para el modelo)"""
     return text.lower().split()
 
 def build_vocab(text):
@@ -7,3 +33,227 @@ def build_vocab(text):
     stoi = {w: i for i, w in enumerate(vocab)}
     itos = {i: w for w, i in stoi.items()}
     return stoi, itos
+
+def trozos(text):
+    """Pre-tokenizar: trozos con ▁ delante cuando van precedidos de espacio (y los signos de fin)"""
+    return [
+        (ESPACIO if espacio or m.start() == 0 or trozo in SIGNOS_FIN else "") + trozo
+        for m in PATRON.finditer(text.lower())
+        for espacio, trozo in [m.groups()]
+    ]
+
+class Tokenizer:
+    """
+    Tokenizador de subpalabras (BPE) con vocabulario persistente
+    - entrenar() aprende fusiones nuevas a partir de textos nuevos hasta VOCAB_MAX;
+      las fusiones y los ids existentes no cambian nunca (el modelo se amplía)
+    - encode_lote()/decode_lote() trabajan con varios textos a la vez
+    - Cada trozo ya segmentado se guarda en caché: el BPE solo corre para
+      palabras que no se habían visto
+    - modo "palabras": compatibilidad con los checkpoints de vocabulario por palabras
+    """
+    def __init__(self, tokens=None, merges=None, modo="bpe", max_vocab=VOCAB_MAX):
+        self.modo = modo
+        self.max_vocab = max_vocab
+        self.itos = {}
+        self.stoi = {}
+        self.merges = []
+        self.rangos = {}
+        self.cache = {}
+        self._inicios = None
+        self._penalizables = None
+        for token in tokens or ([UNK] if modo == "bpe" else []):
+            self._agregar_token(token)
+        for a, b in merges or []:
+            self._agregar_merge(a, b)
+
+    @classmethod
+    def por_palabras(cls, stoi):
+        """Tokenizador de un checkpoint antiguo (una palabra por id)"""
+        return cls(tokens=[w for w, _ in sorted(stoi.items(), key=lambda x: x[1])], modo="palabras")
+
+    @classmethod
+    def desde_estado(cls, estado):
+        return cls(tokens=estado["tokens"], merges=estado["merges"], modo=estado.get("modo", "bpe"))
+
+    def estado(self):
+        """Lo necesario para reconstruir el tokenizador (va en el checkpoint y en vocab.json)"""
+        return {
+            "modo": self.modo,
+            "tokens": [self.itos[i] for i in range(len(self.itos))],
+            "merges": [list(par) for par in self.merges],
+        }
+
+    @classmethod
+    def cargar(cls, ruta=VOCAB_PATH):
+        """Leer vocab.json; None si no existe o es el formato antiguo por palabras"""
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                estado = json.load(f)
+        except FileNotFoundError:
+            return None
+        if not isinstance(estado, dict):
+            print("Vocabulario por palabras encontrado, se reemplaza por subpalabras")
+            return None
+        return cls.desde_estado(estado)
+
+    def guardar(self, ruta=VOCAB_PATH):
+        """Escribir el vocabulario de forma atómica"""
+        temporal = ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(self.estado(), f, ensure_ascii=False)
+        os.replace(temporal, ruta)
+
+    def huella(self, tokens=None, merges=None):
+        """
+        Cambia si cambia cualquier token o fusión (invalida lo ya tokenizado)
+        - tokens/merges: huella de los primeros tokens/fusiones (el tokenizador antes de ampliarse)
+        """
+        estado = self.estado()
+        estado["tokens"] = estado["tokens"][:tokens]
+        estado["merges"] = estado["merges"][:merges]
+        estado["pretokenizador"] = PRETOKENIZADOR
+        return hashlib.sha1(json.dumps(estado, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+    def es_ampliacion_de(self, estado):
+        """¿Los ids de `estado` siguen igual en este tokenizador?"""
+        tokens = estado["tokens"]
+        return (estado.get("modo", "bpe") == self.modo
+                and len(tokens) <= len(self.itos)
+                and all(self.itos[i] == t for i, t in enumerate(tokens)))
+
+    def __len__(self):
+        return len(self.itos)
+
+    def _agregar_token(self, token):
+        if token not in self.stoi:
+            self.stoi[token] = len(self.itos)
+            self.itos[self.stoi[token]] = token
+
+    def _agregar_merge(self, a, b):
+        self.rangos[(a, b)] = len(self.merges)
+        self.merges.append((a, b))
+        self._agregar_token(a + b)
+
+    # --- Entrenamiento ---
+
+    def entrenar(self, textos, fijos=()):
+        """
+        Aprender fusiones nuevas de estos textos; devuelve cuántos tokens se añadieron
+        - fijos: pares de símbolos que no se pueden fusionar (los que ya aparecen juntos
+          en lo tokenizado): así las fusiones nuevas no cambian ninguna segmentación anterior
+        """
+        if self.modo != "bpe":
+            return 0
+        antes = len(self.itos)
+
+        frecuencias = Counter(t for texto in textos for t in trozos(texto))
+        # Símbolos base: caracteres nuevos (mientras quepan)
+        for caracter in sorted({c for trozo in frecuencias for c in trozo}):
+            if len(self.itos) < self.max_vocab:
+                self._agregar_token(caracter)
+
+        # Cada trozo segmentado con las fusiones que ya existían
+        palabras = {tuple(self._segmentar(trozo)): n for trozo, n in frecuencias.items()}
+        while len(self.itos) < self.max_vocab:
+            pares = Counter()
+            for simbolos, n in palabras.items():
+                for par in zip(simbolos, simbolos[1:]):
+                    if par not in fijos:
+                        pares[par] += n
+            if not pares:
+                break
+            # Más frecuente; en empate el menor, para que sea determinista
+            par, n = min(pares.items(), key=lambda x: (-x[1], x[0]))
+            if n < FRECUENCIA_MINIMA:
+                break
+            self._agregar_merge(*par)
+            palabras = {self._fusionar(simbolos, par): n for simbolos, n in palabras.items()}
+
+        if len(self.itos) != antes:
+            self.cache.clear()
+        return len(self.itos) - antes
+
+    @staticmethod
+    def _fusionar(simbolos, par):
+        resultado = []
+        i = 0
+        while i < len(simbolos):
+            if i < len(simbolos) - 1 and (simbolos[i], simbolos[i + 1]) == par:
+                resultado.append(simbolos[i] + simbolos[i + 1])
+                i += 2
+            else:
+                resultado.append(simbolos[i])
+                i += 1
+        return tuple(resultado)
+
+    # --- Codificación ---
+
+    def _segmentar(self, trozo):
+        """Aplicar las fusiones a un trozo, de la más antigua a la más nueva"""
+        simbolos = tuple(trozo)
+        while len(simbolos) > 1:
+            par = min(zip(simbolos, simbolos[1:]), key=lambda p: self.rangos.get(p, float("inf")))
+            if par not in self.rangos:
+                break
+            simbolos = self._fusionar(simbolos, par)
+        return simbolos
+
+    def _ids_trozo(self, trozo):
+        ids = self.cache.get(trozo)
+        if ids is None:
+            ids = [self.stoi.get(s, 0) for s in self._segmentar(trozo)]
+            if len(self.cache) >= MAX_CACHE:
+                self.cache.clear()
+            self.cache[trozo] = ids
+        return ids
+
+    def encode(self, texto):
+        if self.modo == "palabras":
+            return [self.stoi.get(w, 0) for w in tokenize(texto)]
+        return [i for trozo in trozos(texto) for i in self._ids_trozo(trozo)]
+
+    def encode_lote(self, textos):
+        return [self.encode(texto) for texto in textos]
+
+    def pieza(self, i):
+        """Texto del token i sin la marca de espacio ('' si es desconocido)"""
+        token = self.itos.get(i, "")
+        if token == UNK:
+            return ""
+        return token.replace(ESPACIO, "")
+
+    def inicia_palabra(self, i):
+        """¿El token i empieza una palabra nueva?"""
+        return self.modo == "palabras" or self.itos.get(i, "").startswith(ESPACIO)
+
+    def es_espacio(self, i):
+        """¿El token i es un ▁ suelto? (empieza palabra; el texto llega en las piezas siguientes)"""
+        return self.modo == "bpe" and self.itos.get(i) == ESPACIO
+
+    def termina(self, i):
+        """¿El token i termina la secuencia? (desconocido o sin texto, salvo el ▁ suelto)"""
+        return not self.pieza(i) and not self.es_espacio(i)
+
+    def inicios(self):
+        """Lista (por id) de qué tokens empiezan palabra"""
+        if self._inicios is None or len(self._inicios) != len(self.itos):
+            self._inicios = [self.inicia_palabra(i) for i in range(len(self.itos))]
+        return self._inicios
+
+    def penalizables(self):
+        """Lista (por id) de tokens que cuentan como palabra usada: los que la empiezan, sin el ▁ suelto"""
+        if self._penalizables is None or len(self._penalizables) != len(self.itos):
+            self._penalizables = [inicia and not self.es_espacio(i) for i, inicia in enumerate(self.inicios())]
+        return self._penalizables
+
+    def decode(self, ids):
+        if self.modo == "palabras":
+            return " ".join(self.itos.get(i, "") for i in ids)
+        texto = "".join(self.itos.get(i, "") for i in ids if self.itos.get(i) != UNK)
+        # Los signos de fin van pegados a la palabra anterior
+        texto = re.sub(ESPACIO + "([.!?])", r"\1", texto)
+        return texto.replace(ESPACIO, " ").strip()
+
+    def decode_lote(self, lista_ids):
+        return [self.decode(ids) for ids in lista_ids]
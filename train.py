@@ -1,168 +1,326 @@
 import torch
+import os
+import random
 import time
 from model import NeuralChat
-from tokenizer import tokenize, build_vocab
+from tokenizer import Tokenizer, VOCAB_PATH
+from sampler import Sampler
+from conversation_store import store, DATASET
+from corpus_cache import corpus
+from checkpoint_store import checkpoints
 
-print("🔧 ENTRENAMIENTO CORREGIDO - Pares Pregunta-Respuesta")
-print("=" * 60)
+# Configuración del entrenamiento (sobrescribible por variables de entorno)
+BATCH_SIZE = int(os.environ.get("TRAIN_BATCH_SIZE", "32"))
+EPOCHS = int(os.environ.get("TRAIN_EPOCHS", "500"))
+# auto_train corta a los 300 s: dejamos margen para cargar datos y guardar
+TIEMPO_MAX = float(os.environ.get("TRAIN_TIEMPO_MAX", "240"))
+PAD_Y = -100  # Índice ignorado por CrossEntropyLoss en las posiciones de relleno
 
-# Cargar datos con estructura pregunta\trespuesta
-try:
-    with open("data.txt", encoding="utf-8") as f:
-        lines = [line.strip() for line in f if line.strip()]
-    
-    # Separar en pares (líneas alternas: pregunta, respuesta, pregunta, respuesta)
-    preguntas = []
-    respuestas = []
-    
-    for i in range(0, len(lines) - 1, 2):
-        pregunta = lines[i]
-        respuesta = lines[i + 1] if i + 1 < len(lines) else ""
-        
-        if pregunta and respuesta:
-            preguntas.append(pregunta)
-            respuestas.append(respuesta)
-    
-    print(f"📊 Pares de entrenamiento: {len(preguntas)}")
-    
-    if len(preguntas) < 3:
-        print("❌ Error: Necesitas al menos 3 pares de conversación")
-        print("   Formato en data.txt debe ser:")
-        print("   línea 1: pregunta")
-        print("   línea 2: respuesta")
-        print("   línea 3: pregunta")
-        print("   línea 4: respuesta")
-        exit(1)
-    
-    # Construir vocabulario de TODAS las palabras
-    all_text = " ".join(preguntas + respuestas)
-    stoi, itos = build_vocab(all_text)
-    print(f"📖 Vocabulario: {len(stoi)} palabras únicas")
-    
-    # Preparar datos de entrenamiento
-    X_data = []
-    Y_data = []
+# Modo "ajuste": entrenar sobre los pares añadidos desde el último checkpoint
+# más una muestra de repaso del corpus anterior; "completo": todo el corpus
+MODO = os.environ.get("TRAIN_MODO", "ajuste")
+REPLAY = float(os.environ.get("TRAIN_REPLAY", "1.0"))  # Pares de repaso por cada par nuevo
+AJUSTE_EPOCHS = int(os.environ.get("TRAIN_AJUSTE_EPOCHS", "100"))
+AJUSTE_TIEMPO_MAX = float(os.environ.get("TRAIN_AJUSTE_TIEMPO_MAX", "60"))
+AJUSTE_PACIENCIA = int(os.environ.get("TRAIN_AJUSTE_PACIENCIA", "10"))  # Épocas sin mejorar antes de parar
+AJUSTE_LR = float(os.environ.get("TRAIN_AJUSTE_LR", "0.002"))
+MEJORA_MINIMA = 1e-3
+
+def crear_lotes(tokens, offsets, batch_size, indices=None):
+    """
+    Agrupar secuencias de longitud parecida en minibatches rellenados
+    - tokens/offsets: corpus pre-tokenizado (corpus_cache), leído sin copias
+    - indices: secuencias a usar (por defecto todas)
+    - Se ordena por longitud para que el relleno sea mínimo
+    - Devuelve tuplas (X, Y, longitudes, tokens) listas para el modelo
+    """
+    limites = offsets.tolist()
+    largos = [limites[i + 1] - limites[i] - 1 for i in range(len(limites) - 1)]
+    # Una secuencia de un solo token no tiene nada que predecir
+    if indices is None:
+        indices = range(len(largos))
+    orden = sorted((i for i in indices if largos[i] > 0), key=lambda i: largos[i])
+    lotes = []
     
-    for pregunta, respuesta in zip(preguntas, respuestas):
-        # Tokenizar pregunta y respuesta
-        pregunta_tokens = tokenize(pregunta)
-        respuesta_tokens = tokenize(respuesta)
+    for inicio in range(0, len(orden), batch_size):
+        indices = orden[inicio:inicio + batch_size]
+        longitudes = [largos[i] for i in indices]
+        largo = max(longitudes)
         
-        # Convertir a IDs
-        pregunta_ids = [stoi.get(t, 0) for t in pregunta_tokens]
-        respuesta_ids = [stoi.get(t, 0) for t in respuesta_tokens]
+        X = torch.zeros(len(indices), largo, dtype=torch.long)
+        Y = torch.full((len(indices), largo), PAD_Y, dtype=torch.long)
+        for fila, i in enumerate(indices):
+            secuencia = tokens[limites[i]:limites[i + 1]]
+            X[fila, :longitudes[fila]] = secuencia[:-1]
+            Y[fila, :longitudes[fila]] = secuencia[1:]
         
-        # Crear secuencia: pregunta + respuesta
-        # El modelo aprenderá: dada la pregunta, predecir la respuesta
-        secuencia_completa = pregunta_ids + respuesta_ids
+        # Sin relleno no hace falta empaquetar
+        if len(set(longitudes)) == 1:
+            longitudes = None
         
-        if len(secuencia_completa) > 1:
-            X_data.append(secuencia_completa[:-1])
-            Y_data.append(secuencia_completa[1:])
+        lotes.append((X, Y, longitudes, sum(largos[i] for i in indices)))
     
-    print(f"✅ Secuencias de entrenamiento: {len(X_data)}")
+    return lotes
+
+def cargar_checkpoint_previo(almacen):
+    """Leer el checkpoint activo como dict (o None si no hay uno utilizable)"""
+    try:
+        checkpoint = almacen.cargar()
+    except Exception as e:
+        print(f"⚠️ Error: {e}, entrenando desde cero")
+        return None
+    
+    if checkpoint is None:
+        print("🧪 Entrenando desde cero (no hay modelo previo)")
+    return checkpoint
+
+def vista_previa(model, tokenizer, pregunta):
+    """Generar una respuesta corta de ejemplo durante el entrenamiento"""
+    test_ids = tokenizer.encode(pregunta)
+    
+    model.eval()
+    with torch.no_grad():
+        test_input = torch.tensor([test_ids], dtype=torch.long)
+        logits, h = model.paso(test_input)
+        sampler = Sampler(len(tokenizer))
+        
+        # Generar respuesta (máximo 12 subpalabras)
+        generated = []
+        for _ in range(12):
+            next_id = sampler.muestrear(logits).item()
+            
+            # Un ▁ suelto solo separa palabras: no termina la vista previa
+            if tokenizer.termina(next_id) or tokenizer.pieza(next_id) in [".", "!", "?"]:
+                break
+            
+            generated.append(next_id)
+            logits, h = model.paso(torch.tensor([[next_id]]), h=h)
+    model.train()
     
-except Exception as e:
-    print(f"❌ Error cargando datos: {e}")
-    exit(1)
+    return tokenizer.decode(generated)
 
-# Crear modelo
-model = NeuralChat(len(stoi))
+def seleccionar_ajuste(ids, desde_id, replay):
+    """
+    Secuencias para el modo ajuste
+    - Nuevas: pares con id > desde_id (los ids del corpus están ordenados)
+    - Repaso: muestra aleatoria de las anteriores, `replay` por cada nueva
+    """
+    inicio = torch.searchsorted(ids, torch.tensor([desde_id]), right=True).item()
+    nuevas = list(range(inicio, len(ids)))
+    repaso = random.sample(range(inicio), min(inicio, round(len(nuevas) * replay)))
+    return nuevas, repaso
 
-# Intentar cargar modelo existente
-try:
-    checkpoint = torch.load("model.pth", map_location="cpu", weights_only=False)
+def entrenar(almacen=None, epochs=None, batch_size=BATCH_SIZE,
+             tiempo_max=None, progreso=None, ruta_vocab=VOCAB_PATH,
+             modo=MODO, replay=REPLAY):
+    """
+    Entrenar el modelo con los pares del corpus y publicarlo como versión nueva en el almacén de checkpoints
+    - modo "ajuste": pares nuevos + repaso, con parada temprana (necesita modelo previo);
+      sin pares nuevos no entrena ni publica nada (parada "sin_pares_nuevos")
+    - modo "completo": todo el corpus durante `epochs` épocas
+    - epochs/tiempo_max: por defecto los del modo
+    - progreso: función opcional que recibe eventos (dict) por época
+    - Devuelve un resumen del entrenamiento
+    """
+    emitir = progreso or (lambda evento: None)
+    
+    print("🔧 ENTRENAMIENTO CORREGIDO - Pares Pregunta-Respuesta")
+    print("=" * 60)
+    
+    # Pares del corpus (el texto ya está pre-tokenizado en corpus/)
+    total_pares = store.contar(DATASET)
+    print(f"📊 Pares de entrenamiento: {total_pares}")
     
-    if isinstance(checkpoint, dict):
-        if 'vocab_size' in checkpoint and checkpoint['vocab_size'] == len(stoi):
+    if total_pares < 3:
+        raise ValueError(f"Necesitas al menos 3 pares de conversación (hay {total_pares})")
+    
+    almacen = almacen or checkpoints
+    checkpoint = cargar_checkpoint_previo(almacen)
+    
+    # Tokenizador persistente: los ids existentes no cambian, las subpalabras nuevas van al final
+    tokenizer = Tokenizer.cargar(ruta_vocab)
+    if tokenizer is None:
+        if checkpoint is not None and checkpoint['tokenizer']['modo'] == "bpe":
+            tokenizer = Tokenizer.desde_estado(checkpoint['tokenizer'])
+        else:
+            tokenizer = Tokenizer()
+    tamano_anterior = len(tokenizer)
+    
+    # Corpus pre-tokenizado: el tokenizador aprende de los pares nuevos y solo se codifican esos
+    meta, nuevos = corpus.sincronizar(tokenizer)
+    tokens_corpus, offsets, ids = corpus.cargar()
+    if len(tokenizer) != tamano_anterior or not os.path.exists(ruta_vocab):
+        tokenizer.guardar(ruta_vocab)
+    print(f"📖 Vocabulario: {len(tokenizer)} subpalabras "
+          f"({len(tokenizer) - tamano_anterior} nuevas, máximo {tokenizer.max_vocab})")
+    print(f"✅ Secuencias de entrenamiento: {meta['pares']} ({nuevos} tokenizadas ahora)")
+    
+    # Crear modelo
+    model = NeuralChat(len(tokenizer))
+    continua = False
+    
+    # Continuar desde el modelo anterior si su vocabulario es un prefijo del actual
+    if checkpoint is not None:
+        anterior = len(checkpoint['tokenizer']['tokens'])
+        if tokenizer.es_ampliacion_de(checkpoint['tokenizer']):
+            model = NeuralChat(anterior)
             model.load_state_dict(checkpoint['model_state_dict'])
-            print("✅ Modelo anterior cargado (vocabulario compatible)")
+            model.redimensionar_vocab(len(tokenizer))
+            print(f"✅ Modelo anterior cargado ({len(tokenizer) - anterior} subpalabras nuevas en embedding/fc)")
+            continua = True
+        else:
+            print("⚠️ Vocabulario incompatible con el modelo anterior, entrenando desde cero")
+    
+    # Elegir qué secuencias entrenar según el modo
+    indices = None
+    nuevas, repaso = [], []
+    if modo == "ajuste":
+        desde_id = checkpoint['manifest'].get('ultimo_id') if continua else None
+        if desde_id is None:
+            print("🧪 Sin modelo previo compatible: modo completo")
+            modo = "completo"
         else:
-            print(f"⚠️ Vocabulario cambió, entrenando desde cero")
+            nuevas, repaso = seleccionar_ajuste(ids, desde_id, replay)
+            if not nuevas:
+                # Sin pares nuevos no hay nada que ajustar: el modelo actual sigue vigente
+                print("🧪 No hay pares nuevos desde el último modelo: nada que ajustar")
+                return {
+                    "epocas": 0, "loss": None, "tokens_s": 0, "segundos": 0.0,
+                    "vocabulario": len(tokenizer), "pares": total_pares, "modo": modo,
+                    "pares_nuevos": 0, "pares_repaso": 0, "parada": "sin_pares_nuevos",
+                }
+            indices = nuevas + repaso
+            print(f"🎯 Modo ajuste: {len(nuevas)} pares nuevos + {len(repaso)} de repaso")
+    
+    if modo == "ajuste":
+        epochs = epochs or AJUSTE_EPOCHS
+        tiempo_max = tiempo_max or AJUSTE_TIEMPO_MAX
+        paciencia = AJUSTE_PACIENCIA
+        lr = AJUSTE_LR
     else:
-        print("🧪 Formato antiguo, entrenando desde cero")
-        
-except FileNotFoundError:
-    print("🧪 Entrenando desde cero (no hay modelo previo)")
-except Exception as e:
-    print(f"⚠️ Error: {e}, entrenando desde cero")
-
-loss_fn = torch.nn.CrossEntropyLoss()
-optimizer = torch.optim.Adam(model.parameters(), lr=0.005)
-
-print("\n🚀 Comenzando entrenamiento...")
-print("=" * 60)
-start_time = time.time()
-
-# Entrenar con cada par pregunta-respuesta
-epochs = 500
-for epoch in range(epochs):
-    total_loss = 0
+        epochs = epochs or EPOCHS
+        tiempo_max = tiempo_max or TIEMPO_MAX
+        paciencia = None
+        lr = 0.005
+    
+    loss_fn = torch.nn.CrossEntropyLoss(ignore_index=PAD_Y)
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
     
-    for X_seq, Y_seq in zip(X_data, Y_data):
-        optimizer.zero_grad()
+    # Minibatches agrupados por longitud (se construyen una sola vez)
+    lotes = crear_lotes(tokens_corpus, offsets, batch_size, indices)
+    tokens_por_epoca = sum(tokens for _, _, _, tokens in lotes)
+    print(f"📦 Minibatches: {len(lotes)} (batch size {batch_size}, {tokens_por_epoca} tokens por época)")
+    
+    ejemplo = store.pares(DATASET, limite=1)
+    
+    print("\n🚀 Comenzando entrenamiento...")
+    print("=" * 60)
+    start_time = time.time()
+    
+    # Entrenar por minibatches de pares pregunta-respuesta
+    tokens_procesados = 0
+    avg_loss = 0.0
+    mejor_loss = float("inf")
+    sin_mejora = 0
+    parada = "epocas"
+    for epoch in range(epochs):
+        total_loss = 0
+        random.shuffle(lotes)
+        
+        for X, Y, longitudes, tokens in lotes:
+            optimizer.zero_grad()
+            
+            # Forward pass (empaquetado si el lote tiene relleno)
+            out = model(X, longitudes=longitudes)
+            
+            # Calcular loss (las posiciones de relleno se ignoran)
+            loss = loss_fn(out.reshape(-1, len(tokenizer)), Y.reshape(-1))
+            
+            # Backward pass
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+            optimizer.step()
+            
+            total_loss += loss.item() * tokens
+            tokens_procesados += tokens
         
-        # Convertir a tensores
-        X = torch.tensor([X_seq], dtype=torch.long)
-        Y = torch.tensor([Y_seq], dtype=torch.long)
+        avg_loss = total_loss / tokens_por_epoca
+        transcurrido = time.time() - start_time
+        tokens_s = tokens_procesados / max(transcurrido, 1e-9)
         
-        # Forward pass
-        out = model(X)
+        if epoch % 10 == 0 or epoch == epochs - 1:
+            emitir({"tipo": "epoca", "epoca": epoch, "epocas": epochs,
+                    "loss": round(avg_loss, 4), "tokens_s": round(tokens_s)})
         
-        # Calcular loss
-        loss = loss_fn(out.view(-1, len(stoi)), Y.view(-1))
+        # Presupuesto de tiempo: terminar antes del timeout de auto_train
+        if transcurrido > tiempo_max and epoch < epochs - 1:
+            print(f"⏰ Presupuesto de {tiempo_max:.0f} s agotado en la época {epoch}")
+            print(f"📈 Época {epoch}/{epochs}: Loss = {avg_loss:.4f}")
+            parada = "tiempo"
+            break
         
-        # Backward pass
-        loss.backward()
-        torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
-        optimizer.step()
+        # Parada temprana (modo ajuste): el loss dejó de bajar
+        if paciencia:
+            if avg_loss < mejor_loss - MEJORA_MINIMA:
+                mejor_loss = avg_loss
+                sin_mejora = 0
+            else:
+                sin_mejora += 1
+            if sin_mejora >= paciencia and epoch < epochs - 1:
+                print(f"🛑 Sin mejora en {paciencia} épocas, parando en la época {epoch}")
+                print(f"📈 Época {epoch}/{epochs}: Loss = {avg_loss:.4f}")
+                parada = "sin_mejora"
+                break
         
-        total_loss += loss.item()
+        if epoch % 100 == 0 or epoch == epochs - 1:
+            print(f"📈 Época {epoch}/{epochs}: Loss = {avg_loss:.4f} ({tokens_s:.0f} tokens/s)")
+            
+            # Mostrar ejemplo de generación
+            if ejemplo:
+                test_pregunta = ejemplo[0][1]  # "hola"
+                print(f"   📝 '{test_pregunta}' → '{vista_previa(model, tokenizer, test_pregunta)}'")
     
-    avg_loss = total_loss / len(X_data)
+    # Guardar modelo (versión nueva; escritura atómica, el servidor no ve nada a medias)
+    manifiesto = almacen.guardar(
+        model.state_dict(),
+        tokenizer.estado(),
+        ultimo_id=meta['ultimo_id'],  # Último par del corpus que vio el modelo
+        loss=round(avg_loss, 4),
+    )
+    print(f"\n✅ Modelo guardado correctamente: {manifiesto['nombre']} (versión {manifiesto['version']})")
     
-    if epoch % 100 == 0 or epoch == epochs - 1:
-        print(f"📈 Época {epoch}/{epochs}: Loss = {avg_loss:.4f}")
-        
-        # Mostrar ejemplo de generación
-        if preguntas:
-            test_pregunta = preguntas[0]  # "hola"
-            test_tokens = tokenize(test_pregunta)
-            test_ids = [stoi.get(t, 0) for t in test_tokens]
-            
-            with torch.no_grad():
-                test_input = torch.tensor([test_ids], dtype=torch.long)
-                
-                # Generar respuesta (máximo 5 palabras)
-                generated = []
-                for _ in range(5):
-                    out_test = model(test_input)
-                    probs = torch.softmax(out_test[0, -1], dim=0)
-                    next_id = torch.multinomial(probs, 1).item()
-                    
-                    palabra = itos.get(next_id, "")
-                    if not palabra or palabra in [".", "!", "?"]:
-                        break
-                    
-                    generated.append(palabra)
-                    test_input = torch.cat([test_input, torch.tensor([[next_id]])], dim=1)
-                
-                print(f"   📝 '{test_pregunta}' → '{' '.join(generated)}'")
-
-# Guardar modelo
-try:
-    torch.save({
-        'model_state_dict': model.state_dict(),
-        'stoi': stoi,
-        'itos': itos,
-        'vocab_size': len(stoi)
-    }, "model.pth")
-    print("\n✅ Modelo guardado correctamente en model.pth")
-except Exception as e:
-    print(f"\n❌ Error guardando modelo: {e}")
+    tiempo_total = time.time() - start_time
+    resumen = {
+        "epocas": epoch + 1,
+        "loss": round(avg_loss, 4),
+        "tokens_s": round(tokens_procesados / max(tiempo_total, 1e-9)),
+        "segundos": round(tiempo_total, 1),
+        "vocabulario": len(tokenizer),
+        "pares": total_pares,
+        "modo": modo,
+        "pares_nuevos": len(nuevas),
+        "pares_repaso": len(repaso),
+        "parada": parada,
+        "version": manifiesto['version'],
+    }
+    
+    print(f"✅ Entrenamiento completado en {tiempo_total:.1f} segundos")
+    print(f"⚡ Throughput: {resumen['tokens_s']} tokens/s")
+    print(f"🔤 Vocabulario: {len(tokenizer)} subpalabras")
+    print(f"💾 Pares entrenados: {total_pares}")
+    print("=" * 60)
+    
+    return resumen
 
-tiempo_total = time.time() - start_time
-print(f"✅ Entrenamiento completado en {tiempo_total:.1f} segundos")
-print(f"🔤 Vocabulario: {len(stoi)} palabras")
-print(f"💾 Pares entrenados: {len(preguntas)}")
-print("=" * 60)
\ No newline at end of file
+if __name__ == "__main__":
+    import sys
+    try:
+        # python train.py completo → reentrenar con todo el corpus
+        entrenar(modo=sys.argv[1] if len(sys.argv) > 1 else MODO)
+    except ValueError as e:
+        print(f"❌ Error: {e}")
+        print("   Chatea un poco o importa pares al almacén de conversaciones")
+        exit(1)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        exit(1)
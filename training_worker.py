@@ -0,0 +1,182 @@
+# training_worker.py - Proceso de entrenamiento persistente
+import datetime
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+
+from auto_train import LOCK_FILE, TIMEOUT_ENTRENAMIENTO
+
+
+def _proceso_entrenamiento(trabajos, eventos):
+    """
+    Bucle del proceso hijo
+    - torch y los módulos de entrenamiento se importan una sola vez
+    - Cada trabajo ejecuta auto_train en este mismo proceso
+    """
+    from auto_train import auto_train
+
+    eventos.put({"tipo": "listo"})
+    while True:
+        trabajo = trabajos.get()
+        if trabajo is None:
+            break
+
+        def emitir(evento, job=trabajo["id"]):
+            eventos.put({"job": job, "timestamp": time.time(), **evento})
+
+        emitir({"tipo": "inicio"})
+        try:
+            resumen = auto_train(progreso=emitir)
+            emitir({"tipo": "fin", "ok": resumen is not None, "resumen": resumen})
+        except Exception as e:
+            emitir({"tipo": "fin", "ok": False, "error": str(e)})
+
+
+class TrainingWorker:
+    """
+    Worker de entrenamiento en un proceso dedicado, arrancado una vez y reutilizado
+    - enviar() encola un trabajo de auto_train
+    - Los eventos (paso, época, loss, tokens/s) vuelven por una cola y
+      actualizan `progreso`; los suscriptores reciben cada evento
+    - Si un trabajo pasa de TIMEOUT_ENTRENAMIENTO se reinicia el proceso
+    """
+    def __init__(self, timeout=TIMEOUT_ENTRENAMIENTO):
+        self.timeout = timeout
+        self.ctx = mp.get_context("spawn")
+        self.proceso = None
+        self.trabajos = None
+        self.eventos = None
+        self.lector = None
+        self.lock = threading.Lock()
+        self.contador = itertools.count(1)
+        self.trabajo_actual = None
+        self.inicio_trabajo = None
+        self.suscriptores = []
+        self.progreso = {"activo": False}
+
+    @property
+    def ocupado(self):
+        return self.trabajo_actual is not None
+
+    def suscribir(self, funcion):
+        """Registrar una función que recibe cada evento del worker"""
+        self.suscriptores.append(funcion)
+
+    def iniciar(self):
+        with self.lock:
+            if self.proceso is not None and self.proceso.is_alive():
+                return
+            self.trabajos = self.ctx.Queue()
+            self.eventos = self.ctx.Queue()
+            self.proceso = self.ctx.Process(
+                target=_proceso_entrenamiento,
+                args=(self.trabajos, self.eventos),
+                name="training-worker",
+                daemon=True,
+            )
+            self.proceso.start()
+
+            if self.lector is None or not self.lector.is_alive():
+                self.lector = threading.Thread(target=self._leer_eventos, name="training-events", daemon=True)
+                self.lector.start()
+
+    def enviar(self):
+        """Encolar un trabajo de entrenamiento; devuelve su id o None si ya hay uno en curso"""
+        self.iniciar()
+        with self.lock:
+            if self.trabajo_actual is not None:
+                return None
+            job = next(self.contador)
+            self.trabajo_actual = job
+            self.inicio_trabajo = time.monotonic()
+            self.progreso = {
+                "activo": True,
+                "job": job,
+                "encolado_en": datetime.datetime.now().isoformat(),
+            }
+            self.trabajos.put({"id": job})
+        return job
+
+    def detener(self):
+        with self.lock:
+            if self.proceso is not None and self.proceso.is_alive():
+                self.trabajos.put(None)
+                self.proceso.join(timeout=5)
+                if self.proceso.is_alive():
+                    self.proceso.terminate()
+                    if os.path.exists(LOCK_FILE):
+                        os.remove(LOCK_FILE)
+
+    def _leer_eventos(self):
+        while True:
+            try:
+                evento = self.eventos.get(timeout=1)
+            except queue.Empty:
+                evento = None
+            except (EOFError, OSError):
+                time.sleep(1)
+                continue
+
+            if evento is not None:
+                self._despachar(evento)
+            self._revisar_timeout()
+
+    def _despachar(self, evento):
+        self._aplicar(evento)
+        for funcion in list(self.suscriptores):
+            try:
+                funcion(evento)
+            except Exception as e:
+                print(f"Error en suscriptor de entrenamiento: {e}")
+
+    def _aplicar(self, evento):
+        """Actualizar la instantánea de progreso con un evento"""
+        tipo = evento.get("tipo")
+        if tipo == "listo":
+            return
+
+        progreso = dict(self.progreso)
+        if tipo == "paso":
+            progreso["paso"] = evento["paso"]
+        elif tipo == "epoca":
+            for clave in ("epoca", "epocas", "loss", "tokens_s"):
+                progreso[clave] = evento[clave]
+        elif tipo == "inicio":
+            progreso["iniciado_en"] = datetime.datetime.now().isoformat()
+        elif tipo == "fin":
+            progreso.update({
+                "activo": False,
+                "ok": evento.get("ok", False),
+                "resumen": evento.get("resumen"),
+                "error": evento.get("error"),
+                "terminado_en": datetime.datetime.now().isoformat(),
+            })
+            with self.lock:
+                self.trabajo_actual = None
+        self.progreso = progreso
+
+    def _revisar_timeout(self):
+        """Reiniciar el proceso si el trabajo actual excede el tiempo máximo"""
+        job = self.trabajo_actual
+        if job is None or time.monotonic() - self.inicio_trabajo < self.timeout:
+            return
+
+        print(f"Entrenamiento {job} excedió {self.timeout} s, reiniciando worker")
+        with self.lock:
+            self.proceso.terminate()
+            self.proceso.join(timeout=5)
+            self.proceso = None
+
+        # El finally de auto_train no llegó a ejecutarse
+        if os.path.exists(LOCK_FILE):
+            os.remove(LOCK_FILE)
+        self.iniciar()
+
+        self._despachar({"job": job, "tipo": "fin", "ok": False, "timestamp": time.time(),
+                         "error": f"Entrenamiento excedió el tiempo límite ({self.timeout} s)"})
+
+
+worker = TrainingWorker()